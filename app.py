@@ -1,222 +1,108 @@
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, make_response
-from flask_wtf import FlaskForm
-from wtforms import StringField, TextAreaField, SelectField, EmailField, TelField
-from wtforms.validators import DataRequired, Email, Length
-from datetime import datetime, timedelta
+from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, make_response, abort
+from datetime import datetime, timedelta, timezone
+import click
 import os
-import json
 from functools import wraps
 
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
+from werkzeug.utils import import_string
+
+from assets import AssetManifest
+from auth import require_token
+import cache_policy
+from cache_policy import cache_control, no_store, private, public
+import compress
+import metrics
+from images import ImageService
+import page_cache
+import templating
+from search import get_index as get_search_index
+from quotes import QueueFull, quote_store, validate_quote
+from catalog import get_catalog, on_change as on_catalog_change, slugify
+from sitemaps import STATIC_PAGES, get_sitemaps
+from seo import SEO_CONFIG, generate_page_seo, generate_structured_data, page_seo, schema_payload
+
 app = Flask(__name__)
+templating.configure(app)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here-change-in-production')
 
+# Phase timing, Server-Timing and /metrics (METRICS=1 / SERVER_TIMING=1); registered
+# before the other after_request hooks so its total includes them
+metrics.init_app(app)
+
 # Performance optimizations
 @app.after_request
 def after_request(response):
     """Add performance and security headers"""
-    # Cache static resources
-    if request.endpoint == 'static':
-        response.cache_control.max_age = 31536000  # 1 year
-        response.cache_control.public = True
-    else:
-        # Cache dynamic content for a short time
-        response.cache_control.max_age = 300  # 5 minutes
-        response.cache_control.public = True
-    
-    # Security headers
-    response.headers['X-Content-Type-Options'] = 'nosniff'
-    response.headers['X-Frame-Options'] = 'DENY'
-    response.headers['X-XSS-Protection'] = '1; mode=block'
-    response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
-    
-    # Performance headers
-    response.headers['Vary'] = 'Accept-Encoding'
-    
-    return response
+    with metrics.phase('after_request'):
+        # Cache-Control from the route's declared policy; static files keep the TTL from
+        # the asset manifest. Anything that touched the session is never shared.
+        cache_policy.apply(app, response)
+
+        # Security headers
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        response.headers['X-Frame-Options'] = 'DENY'
+        response.headers['X-XSS-Protection'] = '1; mode=block'
+        response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
+
+        # Performance headers: negotiate Content-Encoding (sets Vary: Accept-Encoding)
+        static_path = None
+        if request.endpoint == 'static' and response.direct_passthrough:
+            static_path = safe_join(app.static_folder, asset_manifest.resolve(request.view_args['filename'])[0])
+        return compress.compress_response(response, static_path)
 
-def add_cache_headers(max_age=300):
-    """Decorator to add cache headers to routes"""
+def lazy_view(import_name):
+    """View that imports its module on the first request, for endpoints most workers never serve"""
+    view = None
+    def load_view(*args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(import_name)
+        return view(*args, **kwargs)
+    return load_view
+
+def add_cache_headers(max_age=300, vary_args=(), keys=(), stale_while_revalidate=None):
+    """Decorator to mark routes public and serve them from the page cache.
+
+    Rendered bodies are kept for max_age seconds, keyed by endpoint, view args
+    and the query args listed in vary_args, and revalidated with ETags. keys
+    are surrogate keys ('{arg}' is filled from the view args) for purging.
+    """
+    policy = public(max_age, stale_while_revalidate=stale_while_revalidate, keys=keys)
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            response = make_response(f(*args, **kwargs))
-            response.cache_control.max_age = max_age
-            response.cache_control.public = True
-            return response
+            return page_cache.serve(f, args, kwargs, policy, vary_args)
+        decorated_function.cache_policy = policy
         return decorated_function
     return decorator
 
-# SEO Configuration
-SEO_CONFIG = {
-    'site_name': 'GreenFarm - Premium Organic Solutions',
-    'site_description': 'Leading provider of premium organic farming solutions, fertilizers, and sustainable agriculture products. Transform your farm with our eco-friendly, scientifically-proven organic solutions.',
-    'site_url': 'https://greenfarm.com',
-    'site_author': 'GreenFarm Team',
-    'site_keywords': 'organic farming, organic fertilizer, sustainable agriculture, bio pesticides, soil conditioner, farm solutions, eco-friendly farming, organic products, agricultural supplies, green farming',
-    'twitter_handle': '@greenfarm',
-    'facebook_page': 'GreenFarmOfficial',
-    'company_address': '123 Farm Road, Green Valley, CA 90210',
-    'company_phone': '+1 (555) 123-4567',
-    'company_email': 'info@greenfarm.com'
-}
-
-# SEO Helper Functions
-def generate_page_seo(page_type, **kwargs):
-    """Generate SEO metadata for different page types"""
-    seo_data = {
-        'site_name': SEO_CONFIG['site_name'],
-        'site_url': SEO_CONFIG['site_url'],
-        'twitter_handle': SEO_CONFIG['twitter_handle'],
-        'facebook_page': SEO_CONFIG['facebook_page']
-    }
-    
-    if page_type == 'home':
-        seo_data.update({
-            'title': 'GreenFarm - Premium Organic Farming Solutions | Sustainable Agriculture',
-            'description': 'Transform your farm with GreenFarm\'s premium organic fertilizers, bio pesticides, and sustainable agriculture solutions. Trusted by farmers worldwide for eco-friendly, high-yield farming.',
-            'keywords': 'organic farming, organic fertilizer, sustainable agriculture, bio pesticides, soil conditioner, eco-friendly farming, premium organic solutions',
-            'canonical_url': SEO_CONFIG['site_url'],
-            'og_image': f"{SEO_CONFIG['site_url']}/static/images/greenfarm-hero.jpg",
-            'page_type': 'website'
-        })
-    elif page_type == 'about':
-        seo_data.update({
-            'title': 'About GreenFarm - Leading Organic Agriculture Company | Our Story',
-            'description': 'Learn about GreenFarm\'s mission to revolutionize agriculture through sustainable, organic farming solutions. Discover our commitment to environmental stewardship and farmer success.',
-            'keywords': 'about greenfarm, organic agriculture company, sustainable farming mission, agricultural innovation, environmental stewardship',
-            'canonical_url': f"{SEO_CONFIG['site_url']}/about",
-            'og_image': f"{SEO_CONFIG['site_url']}/static/images/greenfarm-about.jpg",
-            'page_type': 'article'
-        })
-    elif page_type == 'products':
-        seo_data.update({
-            'title': 'Organic Farming Products | Premium Fertilizers & Bio Pesticides - GreenFarm',
-            'description': 'Explore GreenFarm\'s comprehensive range of organic farming products including premium fertilizers, bio pesticides, and soil conditioners. Boost your crop yield naturally.',
-            'keywords': 'organic farming products, organic fertilizers, bio pesticides, soil conditioners, natural farming solutions, agricultural products',
-            'canonical_url': f"{SEO_CONFIG['site_url']}/products",
-            'og_image': f"{SEO_CONFIG['site_url']}/static/images/greenfarm-products.jpg",
-            'page_type': 'product'
-        })
-    elif page_type == 'contact':
-        seo_data.update({
-            'title': 'Contact GreenFarm - Get Expert Agricultural Consultation | Organic Farming Support',
-            'description': 'Contact GreenFarm for expert agricultural consultation and support. Get personalized organic farming solutions and technical guidance from our experienced team.',
-            'keywords': 'contact greenfarm, agricultural consultation, organic farming support, expert advice, farming guidance',
-            'canonical_url': f"{SEO_CONFIG['site_url']}/contact",
-            'og_image': f"{SEO_CONFIG['site_url']}/static/images/greenfarm-contact.jpg",
-            'page_type': 'article'
-        })
-    elif page_type == 'product_detail':
-        product = kwargs.get('product')
-        if product:
-            seo_data.update({
-                'title': f"{product['name']} - Premium {product['category']} | GreenFarm Organic Solutions",
-                'description': f"{product['description']} Premium {product['category'].lower()} from GreenFarm. {', '.join(product['features'])}. Order now for sustainable farming success.",
-                'keywords': f"{product['name'].lower()}, {product['category'].lower()}, organic {product['category'].lower()}, {', '.join([f.lower() for f in product['features']])}",
-                'canonical_url': f"{SEO_CONFIG['site_url']}/products/{product['id']}",
-                'og_image': f"{SEO_CONFIG['site_url']}/static/images/products/{product['id']}.jpg",
-                'page_type': 'product',
-                'product_price': product['price'],
-                'product_currency': 'USD'
-            })
-    
-    return seo_data
-
-def generate_structured_data(page_type, **kwargs):
-    """Generate JSON-LD structured data for SEO"""
-    base_organization = {
-        "@context": "https://schema.org",
-        "@type": "Organization",
-        "name": "GreenFarm",
-        "url": SEO_CONFIG['site_url'],
-        "logo": f"{SEO_CONFIG['site_url']}/static/images/greenfarm-logo.png",
-        "description": SEO_CONFIG['site_description'],
-        "address": {
-            "@type": "PostalAddress",
-            "streetAddress": "123 Farm Road",
-            "addressLocality": "Green Valley",
-            "addressRegion": "CA",
-            "postalCode": "90210",
-            "addressCountry": "US"
-        },
-        "contactPoint": {
-            "@type": "ContactPoint",
-            "telephone": SEO_CONFIG['company_phone'],
-            "contactType": "customer service",
-            "email": SEO_CONFIG['company_email']
-        },
-        "sameAs": [
-            f"https://twitter.com/{SEO_CONFIG['twitter_handle']}",
-            f"https://facebook.com/{SEO_CONFIG['facebook_page']}"
-        ]
-    }
-    
-    if page_type == 'home':
-        return {
-            "@context": "https://schema.org",
-            "@type": "WebSite",
-            "name": SEO_CONFIG['site_name'],
-            "url": SEO_CONFIG['site_url'],
-            "description": SEO_CONFIG['site_description'],
-            "publisher": base_organization,
-            "potentialAction": {
-                "@type": "SearchAction",
-                "target": f"{SEO_CONFIG['site_url']}/search?q={{search_term_string}}",
-                "query-input": "required name=search_term_string"
-            }
-        }
-    elif page_type == 'products':
-        products = kwargs.get('products', [])
-        products_data = []
-        for product in products:
-            products_data.append({
-                "@type": "Product",
-                "name": product['name'],
-                "description": product['description'],
-                "category": product['category'],
-                "offers": {
-                    "@type": "Offer",
-                    "price": product['price'],
-                    "priceCurrency": "USD",
-                    "availability": "https://schema.org/InStock",
-                    "seller": base_organization
-                }
-            })
-        
-        return {
-            "@context": "https://schema.org",
-            "@type": "ItemList",
-            "itemListElement": products_data
-        }
-    elif page_type == 'product_detail':
-        product = kwargs.get('product')
-        if product:
-            return {
-                "@context": "https://schema.org",
-                "@type": "Product",
-                "name": product['name'],
-                "description": product['description'],
-                "category": product['category'],
-                "brand": {
-                    "@type": "Brand",
-                    "name": "GreenFarm"
-                },
-                "offers": {
-                    "@type": "Offer",
-                    "price": product['price'],
-                    "priceCurrency": "USD",
-                    "availability": "https://schema.org/InStock",
-                    "seller": base_organization
-                }
-            }
-    elif page_type == 'contact':
-        return {
-            "@context": "https://schema.org",
-            "@type": "ContactPage",
-            "mainEntity": base_organization
-        }
-    
-    return base_organization
+# Purges reach the page and fragment caches of every worker, whichever one handled them
+cache_policy.share_purges(os.environ.get('PURGE_STATE_PATH') or os.path.join(app.instance_path, 'purges'))
+
+# Forward surrogate-key purges to a CDN, e.g. https://api.fastly.com/service/<id>/purge/{key}
+if os.environ.get('SURROGATE_PURGE_URL'):
+    header = os.environ.get('SURROGATE_PURGE_HEADER', '')
+    cache_policy.on_purge(cache_policy.http_purger(
+        os.environ['SURROGATE_PURGE_URL'],
+        dict([map(str.strip, header.split(':', 1))]) if ':' in header else None,
+    ))
+
+app.add_template_filter(slugify)
+
+# Precompressed siblings let static files skip compression on the request path
+compress.precompress_static(app.static_folder)
+
+# Fingerprinted static URLs, safe to cache for a year
+asset_manifest = AssetManifest(app.static_folder).init_app(app)
+
+# Width-bucketed WebP/JPEG derivatives at /img/<width>/<path>, plus srcset helpers for templates
+images = ImageService(
+    app.static_folder,
+    os.environ.get('IMAGE_CACHE_DIR') or os.path.join(app.instance_path, 'img_cache'),
+    asset_manifest,
+).init_app(app)
 
 # Make SEO functions available in templates
 @app.context_processor
@@ -226,132 +112,153 @@ def inject_seo():
         'generate_structured_data': generate_structured_data,
         'seo_config': SEO_CONFIG
     }
-class ContactForm(FlaskForm):
-    name = StringField('Full Name', validators=[DataRequired(), Length(min=2, max=100)])
-    email = EmailField('Email Address', validators=[DataRequired(), Email()])
-    phone = TelField('Phone Number', validators=[Length(min=10, max=15)])
-    subject = SelectField('Subject', choices=[
-        ('general', 'General Inquiry'),
-        ('quote', 'Request Quote'),
-        ('support', 'Technical Support'),
-        ('partnership', 'Partnership Opportunity')
-    ], validators=[DataRequired()])
-    message = TextAreaField('Message', validators=[DataRequired(), Length(min=10, max=1000)])
 
 @app.route('/')
-@add_cache_headers(600)  # Cache homepage for 10 minutes
+@add_cache_headers(600, keys=('pages',), stale_while_revalidate=60)  # Cache homepage for 10 minutes
 def home():
-    seo_data = generate_page_seo('home')
-    structured_data = generate_structured_data('home')
-    return render_template('index.html', seo=seo_data, structured_data=json.dumps(structured_data))
+    page = page_seo('home')
+    return render_template('index.html', seo=page.seo, structured_data=page.structured_data)
 
 @app.route('/about')
+@add_cache_headers(keys=('pages',), stale_while_revalidate=60)
 def about():
-    seo_data = generate_page_seo('about')
-    structured_data = generate_structured_data('about')
-    return render_template('about.html', seo=seo_data, structured_data=json.dumps(structured_data))
+    page = page_seo('about')
+    return render_template('about.html', seo=page.seo, structured_data=page.structured_data)
 
 @app.route('/products')
+@add_cache_headers(vary_args=('category', 'page'), keys=('products',), stale_while_revalidate=60)
 def products():
-    # Sample product data - in a real app, this would come from a database
-    products = [
-        {
-            'id': 1,
-            'name': 'Organic Fertilizer',
-            'description': 'Premium blend of natural nutrients to enhance soil fertility and plant growth.',
-            'price': 49.99,
-            'category': 'Fertilizers',
-            'features': ['100% Organic', 'Slow Release', 'NPK Balanced']
-        },
-        {
-            'id': 2,
-            'name': 'Soil Conditioner',
-            'description': 'Advanced formula to improve soil structure and water retention capacity.',
-            'price': 39.99,
-            'category': 'Soil Care',
-            'features': ['Improves Drainage', 'Enhances Structure', 'Organic Matter']
-        },
-        {
-            'id': 3,
-            'name': 'Bio Pesticide',
-            'description': 'Natural pest control solution that\'s safe for crops and environment.',
-            'price': 59.99,
-            'category': 'Pest Control',
-            'features': ['Chemical-Free', 'Safe for Beneficial Insects', 'Fast Acting']
-        }
-    ]
-    seo_data = generate_page_seo('products')
-    structured_data = generate_structured_data('products', products=products)
-    return render_template('products.html', products=products, seo=seo_data, structured_data=json.dumps(structured_data))
+    catalog = get_catalog()
+    category = request.args.get('category')
+    if category and category not in catalog.by_category:
+        abort(404)
+    listing = catalog.page(category, request.args.get('page', 1, type=int))
+    page = page_seo(('products', category, listing.page))
+    return render_template('products.html', products=listing.items, listing=listing, categories=catalog.categories,
+                           seo=page.seo, structured_data=page.structured_data)
+
+@app.route('/products/<int:product_id>')
+@add_cache_headers(keys=('product-{product_id}',), stale_while_revalidate=60)
+def product_detail(product_id):
+    product = get_catalog().get(product_id)
+    if product is None:
+        abort(404)
+    page = page_seo(('product_detail', product_id))
+    return render_template('product_detail.html', product=product, seo=page.seo, structured_data=page.structured_data)
+
+def _search():
+    with metrics.phase('search'):
+        return get_search_index().search(request.args.get('q', '').strip(), request.args.get('category') or None,
+                                         request.args.get('page', 1, type=int))
+
+@app.route('/search')
+@cache_control(public(60, stale_while_revalidate=60, keys=('products',)))
+def search():
+    result = _search()
+    return render_template('search.html', result=result, seo=generate_page_seo('search', query=result.query))
+
+@app.route('/api/search')
+@cache_control(public(60, stale_while_revalidate=60, keys=('products',)))
+def api_search():
+    """JSON product search, the same ranking as /search"""
+    result = _search()
+    return jsonify({
+        'query': result.query,
+        'total': result.total,
+        'page': result.page,
+        'pages': result.pages,
+        'facets': [{'slug': slug, 'name': name, 'count': count} for slug, name, count in result.facets],
+        'results': [
+            {
+                'id': p.id,
+                'name': p.name,
+                'description': p.description,
+                'price': p.price,
+                'category': p.category,
+                'features': list(p.features),
+                'url': url_for('product_detail', product_id=p.id)
+            }
+            for p in result.items
+        ]
+    })
 
 @app.route('/contact', methods=['GET', 'POST'])
+@cache_control(private())  # CSRF token and flashed messages are per session
 def contact():
+    # flask_wtf and wtforms load on the first /contact request, not at startup
+    from forms import ContactForm
     form = ContactForm()
+    status = 200
     if form.validate_on_submit():
-        # In a real application, you would process the form data here
-        # (save to database, send email, etc.)
-        flash('Thank you for your message! We\'ll get back to you soon.', 'success')
-        return redirect(url_for('contact'))
-    seo_data = generate_page_seo('contact')
-    structured_data = generate_structured_data('contact')
-    return render_template('contact.html', form=form, seo=seo_data, structured_data=json.dumps(structured_data))
+        message = {k: v for k, v in form.data.items() if k != 'csrf_token'}
+        try:
+            with metrics.phase('db'):
+                quote_store.submit('contact', message).wait()
+        except QueueFull:
+            flash('We are receiving a high volume of messages. Please try again in a moment.', 'error')
+            status = 503
+        except Exception:
+            # Timeouts and store errors: keep the visitor's message in the form
+            flash('An error occurred while processing your request. Please try again.', 'error')
+            status = 500
+        else:
+            flash('Thank you for your message! We\'ll get back to you soon.', 'success')
+            return redirect(url_for('contact'))
+    page = page_seo('contact')
+    return render_template('contact.html', form=form, seo=page.seo, structured_data=page.structured_data), status
 
 @app.route('/privacy-policy')
+@add_cache_headers(keys=('pages',), stale_while_revalidate=60)
 def privacy_policy():
-    seo_data = {
-        'title': 'Privacy Policy - GreenFarm | Data Protection & Privacy',
-        'description': 'Read GreenFarm\'s privacy policy to understand how we protect your personal information and data. Learn about our commitment to your privacy and security.',
-        'keywords': 'privacy policy, data protection, greenfarm privacy, personal information security',
-        'canonical_url': f"{SEO_CONFIG['site_url']}/privacy-policy"
-    }
-    return render_template('privacy_policy.html', seo=seo_data)
+    return render_template('privacy_policy.html', seo=page_seo('privacy_policy').seo)
 
 @app.route('/terms-of-service')
+@add_cache_headers(keys=('pages',), stale_while_revalidate=60)
 def terms_of_service():
-    seo_data = {
-        'title': 'Terms of Service - GreenFarm | User Agreement & Conditions',
-        'description': 'Read GreenFarm\'s terms of service and user agreement. Understand the terms and conditions for using our organic farming products and services.',
-        'keywords': 'terms of service, user agreement, greenfarm terms, service conditions',
-        'canonical_url': f"{SEO_CONFIG['site_url']}/terms-of-service"
-    }
-    return render_template('terms_of_service.html', seo=seo_data)
+    return render_template('terms_of_service.html', seo=page_seo('terms_of_service').seo)
 
-@app.route('/sitemap.xml')
-def sitemap():
-    """Generate dynamic sitemap.xml"""
-    pages = []
-    
-    # Static pages
-    static_pages = [
-        {'url': url_for('home', _external=True), 'lastmod': datetime.now().strftime('%Y-%m-%d'), 'changefreq': 'weekly', 'priority': '1.0'},
-        {'url': url_for('about', _external=True), 'lastmod': datetime.now().strftime('%Y-%m-%d'), 'changefreq': 'monthly', 'priority': '0.8'},
-        {'url': url_for('products', _external=True), 'lastmod': datetime.now().strftime('%Y-%m-%d'), 'changefreq': 'weekly', 'priority': '0.9'},
-        {'url': url_for('contact', _external=True), 'lastmod': datetime.now().strftime('%Y-%m-%d'), 'changefreq': 'monthly', 'priority': '0.7'},
-        {'url': url_for('privacy_policy', _external=True), 'lastmod': datetime.now().strftime('%Y-%m-%d'), 'changefreq': 'yearly', 'priority': '0.3'},
-        {'url': url_for('terms_of_service', _external=True), 'lastmod': datetime.now().strftime('%Y-%m-%d'), 'changefreq': 'yearly', 'priority': '0.3'},
-    ]
-    
-    pages.extend(static_pages)
-    
-    sitemap_xml = '''<?xml version="1.0" encoding="UTF-8"?>
-<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
-'''
-    
-    for page in pages:
-        sitemap_xml += f'''  <url>
-    <loc>{page['url']}</loc>
-    <lastmod>{page['lastmod']}</lastmod>
-    <changefreq>{page['changefreq']}</changefreq>
-    <priority>{page['priority']}</priority>
-  </url>
-'''
-    
-    sitemap_xml += '</urlset>'
-    
-    response = make_response(sitemap_xml)
-    response.headers['Content-Type'] = 'application/xml'
+def _sitemaps():
+    return get_sitemaps(get_catalog(), {page.endpoint: url_for(page.endpoint) for page in STATIC_PAGES})
+
+def _sitemap_response(name, chunks, gzipped=False):
+    """Stream a sitemap, or its cached gzip variant, with Last-Modified/ETag revalidation"""
+    sitemaps = _sitemaps()
+    if gzipped:
+        name += '.gz'
+    # Always the canonical host: the Host header is client-controlled
+    base_url = SEO_CONFIG['site_url'].rstrip('/')
+    etag = sitemaps.etag(base_url + name)
+    last_modified = datetime.fromtimestamp(int(sitemaps.last_modified), timezone.utc)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = app.response_class(status=304)
+    elif gzipped:
+        body = sitemaps.gzipped(name, chunks(sitemaps, base_url))
+        response = app.response_class(body, mimetype='application/gzip')
+    else:
+        response = app.response_class(chunks(sitemaps, base_url), mimetype='application/xml')
+    response.set_etag(etag)
+    response.last_modified = last_modified
     return response
 
+@app.route('/sitemap.xml')
+@app.route('/sitemap_index.xml')
+@app.route('/sitemap_index.xml.gz', defaults={'gzipped': True})
+@cache_control(public(3600, stale_while_revalidate=600, keys=('sitemap',)))
+def sitemap(gzipped=False):
+    """Sitemap index listing every numbered child sitemap"""
+    # Children are listed as .xml.gz: gzipped once per catalog instead of streaming ~8 MB of XML per fetch
+    return _sitemap_response('index.xml', lambda sitemaps, base_url: sitemaps.generate_index(base_url), gzipped)
+
+@app.route('/sitemap-<int:number>.xml')
+@app.route('/sitemap-<int:number>.xml.gz', defaults={'gzipped': True})
+@cache_control(public(3600, stale_while_revalidate=600, keys=('sitemap',)))
+def sitemap_part(number, gzipped=False):
+    """Child sitemap with up to MAX_URLS_PER_SITEMAP URLs"""
+    if not 1 <= number <= _sitemaps().count:
+        abort(404)
+    return _sitemap_response(f'{number}.xml', lambda sitemaps, base_url: sitemaps.generate_urlset(base_url, number),
+                             gzipped)
+
 @app.route('/robots.txt')
 def robots():
     """Generate robots.txt"""
@@ -382,67 +289,76 @@ Allow: /
     return response
 
 @app.route('/api/schema/<page_type>')
-@add_cache_headers(3600)  # Cache schema for 1 hour
+@add_cache_headers(3600, vary_args=('category', 'page'), keys=('schema-{page_type}',))  # Cache schema for 1 hour
 def api_schema(page_type):
-    """API endpoint for JSON-LD structured data"""
+    """API endpoint for JSON-LD structured data, served from precompiled bytes"""
     if page_type == 'organization':
-        schema_data = generate_structured_data('home')
+        payload = schema_payload('organization')
     elif page_type == 'products':
-        products = [
-            {
-                'id': 1,
-                'name': 'Organic Fertilizer',
-                'description': 'Premium blend of natural nutrients to enhance soil fertility and plant growth.',
-                'price': 49.99,
-                'category': 'Fertilizers',
-                'features': ['100% Organic', 'Slow Release', 'NPK Balanced']
-            },
-            {
-                'id': 2,
-                'name': 'Soil Conditioner',
-                'description': 'Advanced formula to improve soil structure and water retention capacity.',
-                'price': 39.99,
-                'category': 'Soil Care',
-                'features': ['Improves Drainage', 'Enhances Structure', 'Organic Matter']
-            },
-            {
-                'id': 3,
-                'name': 'Bio Pesticide',
-                'description': 'Natural pest control solution that\'s safe for crops and environment.',
-                'price': 59.99,
-                'category': 'Pest Control',
-                'features': ['Chemical-Free', 'Safe for Beneficial Insects', 'Fast Acting']
-            }
-        ]
-        schema_data = generate_structured_data('products', products=products)
+        catalog = get_catalog()
+        category = request.args.get('category')
+        listing = catalog.page(category if category in catalog.by_category else None,
+                               request.args.get('page', 1, type=int))
+        payload = schema_payload(('products', listing.category, listing.page))
     else:
         return jsonify({'error': 'Invalid schema type'}), 404
     
-    response = jsonify(schema_data)
-    response.headers['Content-Type'] = 'application/ld+json'
-    return response
+    return app.response_class(payload, mimetype='application/ld+json')
 
 @app.route('/api/quote', methods=['POST'])
+@cache_control(no_store())
 def api_quote():
     """API endpoint for quote requests"""
+    quote, errors = validate_quote(request.get_json(silent=True))
+    if errors:
+        return jsonify({
+            'success': False,
+            'message': 'Please correct the highlighted fields.',
+            'errors': errors
+        }), 400
     try:
-        data = request.get_json()
-        # In a real application, you would process the quote request here
-        # (save to database, send email notification, etc.)
-        
-        # Simulate processing
+        with metrics.phase('db'):
+            quote_id = quote_store.submit('quote', quote).wait()
         response = {
             'success': True,
             'message': 'Quote request received successfully! We\'ll contact you within 24 hours.',
-            'quote_id': 'QT-2025-001'
+            'quote_id': quote_id
         }
         return jsonify(response)
+    except QueueFull:
+        response = jsonify({
+            'success': False,
+            'message': 'We are receiving a high volume of requests. Please try again in a moment.'
+        })
+        response.headers['Retry-After'] = '5'
+        return response, 503
     except Exception as e:
         return jsonify({
             'success': False,
             'message': 'An error occurred while processing your request. Please try again.'
         }), 500
 
+@app.route('/admin/purge', methods=['POST'])
+@cache_control(no_store())
+@require_token('CACHE_PURGE_TOKEN')
+def purge_cache():
+    """Purge cached responses by surrogate key; needs Authorization: Bearer $CACHE_PURGE_TOKEN"""
+    keys = (request.get_json(silent=True) or {}).get('keys')
+    if not isinstance(keys, list) or not keys or not all(isinstance(key, str) for key in keys):
+        return jsonify({'success': False, 'message': 'Expected {"keys": ["<surrogate key>", ...]}'}), 400
+    return jsonify({'success': True, 'purged': sorted(cache_policy.purge(*keys))})
+
+# Surrogate keys of pages rendered from the whole catalog; detail pages use product-<id>
+CATALOG_SURROGATE_KEYS = ('products', 'schema-products', 'sitemap')
+
+@on_catalog_change
+def purge_catalog_pages(old, new):
+    """Purge cached pages, locally and in shared caches, that render catalog data"""
+    old_products = old.by_id if old is not None else {}
+    changed = {product_id for product_id in old_products.keys() | new.by_id.keys()
+               if old_products.get(product_id) != new.by_id.get(product_id)}
+    cache_policy.purge(*CATALOG_SURROGATE_KEYS, *(f'product-{product_id}' for product_id in changed))
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
@@ -451,6 +367,25 @@ def not_found_error(error):
 def internal_error(error):
     return render_template('500.html'), 500
 
+# NDJSON dealer sync: /api/bulk/products export and /api/bulk/quotes import
+app.add_url_rule('/api/bulk/products', 'bulk_products',
+                 cache_control(public(300, keys=('products',)))(lazy_view('bulk.export_products')))
+app.add_url_rule('/api/bulk/quotes', 'bulk_quotes',
+                 cache_control(no_store())(lazy_view('bulk.import_quotes')), methods=['POST'])
+
+@app.cli.command('freeze')
+@click.argument('out_dir', default='build')
+@click.option('--jobs', '-j', type=int, default=None, help='Render processes (default: CPU count).')
+@click.option('--force', is_flag=True, help='Ignore the previous build and render everything.')
+def freeze_command(out_dir, jobs, force):
+    """Render the public site into OUT_DIR for nginx, incrementally."""
+    # Only the command needs freeze.py (and the multiprocessing it starts)
+    import freeze
+    freeze.main(app, asset_manifest, out_dir, jobs, force, CATALOG_SURROGATE_KEYS)
+
+# Compile (or load from the bytecode cache) every template at boot
+templating.precompile(app)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""Content-hashed static asset URLs"""
+import hashlib
+import os
+
+# Precompressed siblings written by compress.precompress_static
+_SKIP_SUFFIXES = ('.gz', '.br', '.zst')
+
+# Fingerprinted URLs never change content, so they can be cached forever
+IMMUTABLE_MAX_AGE = 31536000  # 1 year
+# Unhashed paths are still served for old HTML and external links
+LEGACY_MAX_AGE = 300  # 5 minutes
+
+
+def fingerprint(path, length=10):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()[:length]
+
+
+def hashed_name(filename, digest):
+    """'css/style.css' -> 'css/style.<digest>.css'"""
+    root, ext = os.path.splitext(filename)
+    return f'{root}.{digest}{ext}'
+
+
+class AssetManifest:
+    """Maps static filenames to fingerprinted names and back"""
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.hashed = {}
+        self.original = {}
+        self.build()
+
+    def build(self):
+        hashed = {}
+        for root, _, files in os.walk(self.static_folder):
+            for name in files:
+                if name.endswith(_SKIP_SUFFIXES):
+                    continue
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                hashed[filename] = hashed_name(filename, fingerprint(path))
+        self.hashed = hashed
+        self.original = {v: k for k, v in hashed.items()}
+        return self
+
+    def url_filename(self, filename):
+        """Filename to put in URLs: the fingerprinted one when the file is known"""
+        return self.hashed.get(filename, filename)
+
+    def resolve(self, filename):
+        """(source filename, is_fingerprinted) for a requested static filename"""
+        original = self.original.get(filename)
+        if original is not None:
+            return original, True
+        return filename, False
+
+    def init_app(self, app):
+        """Emit fingerprinted url_for('static') URLs and serve them as immutable"""
+        manifest = self
+
+        @app.url_defaults
+        def fingerprint_static_urls(endpoint, values):
+            if endpoint == 'static' and 'filename' in values:
+                values['filename'] = manifest.url_filename(values['filename'])
+
+        def static(filename):
+            source, fingerprinted = manifest.resolve(filename)
+            response = app.send_static_file(source)
+            # send_file marks responses without a max_age as no-cache
+            response.cache_control.no_cache = None
+            if fingerprinted:
+                response.cache_control.max_age = IMMUTABLE_MAX_AGE
+                response.cache_control.immutable = True
+            else:
+                response.cache_control.max_age = LEGACY_MAX_AGE
+            response.cache_control.public = True
+            return response
+
+        app.view_functions['static'] = static
+        return self
@@ -0,0 +1,28 @@
+"""Bearer-token checks for machine endpoints (cache purge, bulk import, metrics)"""
+import hmac
+import os
+from functools import wraps
+
+from flask import abort, request
+
+
+def require_token(env_var):
+    """Decorator: the view needs Authorization: Bearer $<env_var>.
+
+    The endpoint is a 404 while the variable is unset and a 403 on a wrong or
+    missing token. The variable is read per request, so rotating it needs no
+    restart.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            token = os.environ.get(env_var)
+            if not token:
+                abort(404)
+            # Bytes: compare_digest rejects str with non-ASCII characters
+            supplied = request.headers.get('Authorization', '').encode('utf-8', 'surrogateescape')
+            if not hmac.compare_digest(supplied, f'Bearer {token}'.encode('utf-8', 'surrogateescape')):
+                abort(403)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
@@ -0,0 +1,45 @@
+"""Compression CPU cost against bytes saved, per encoding and per route.
+
+Each route is fetched cold (compressed on the request path) and then warm
+(served from the variant cache) for every supported encoding.
+
+    python bench/compression_report.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+import compress  # noqa: E402
+
+ROUTES = ('/', '/about', '/products', '/products/1', '/contact', '/privacy-policy', '/terms-of-service',
+          '/api/schema/products', '/static/css/style.css', '/static/manifest.json')
+
+
+def main():
+    client = app.test_client()
+    print(f'{"route":24} {"encoding":8} {"identity":>9} {"encoded":>8} {"ratio":>6} {"cold ms":>8} {"warm ms":>8}')
+    for route in ROUTES:
+        identity = len(client.get(route, headers={'Accept-Encoding': 'identity'}).data)
+        for encoding in compress.ENCODERS:
+            compress.variants.clear()
+            start = time.perf_counter()
+            cold = client.get(route, headers={'Accept-Encoding': encoding})
+            cold_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            client.get(route, headers={'Accept-Encoding': encoding})
+            warm_ms = (time.perf_counter() - start) * 1000
+            size = len(cold.data)
+            print(f'{route:24} {encoding:8} {identity:9,d} {size:8,d} {size / identity:6.2f} {cold_ms:8.2f} {warm_ms:8.2f}')
+
+    print()
+    print(f'{"encoding":8} {"responses":>9} {"hits":>6} {"cpu ms":>8} {"saved KB":>9} {"ms/MB saved":>12}')
+    for encoding, entry in compress.stats().items():
+        print(f'{encoding:8} {entry["responses"]:9d} {entry["cache_hits"]:6d} {entry["cpu_seconds"] * 1000:8.2f} '
+              f'{entry["bytes_saved"] / 1024:9.1f} {entry["ms_per_mb_saved"]:12.2f}')
+
+
+if __name__ == '__main__':
+    main()
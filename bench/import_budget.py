@@ -0,0 +1,97 @@
+"""Cold-start budget: time `import app` with -X importtime and fail when it gets slower.
+
+Each run is a fresh interpreter (bytecode already compiled, as after a deploy).
+Flask itself is measured the same way and subtracted, so the budget covers what
+this app adds (its modules, their dependencies and the work done at import) and
+does not depend on how fast the machine loads the framework. Modules that only
+some endpoints or the CLI need (DEFERRED) must not be imported at startup at all.
+tests/test_import_budget.py runs the same checks under pytest.
+
+    python bench/import_budget.py [--runs 5] [--budget-ms 100] [--top 15]
+
+Exits 1 when the budget is exceeded or a deferred module was imported.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Best `import app` minus best `import flask`, under -X importtime (which adds
+# its own overhead). Raise it deliberately, never just to make a run pass.
+DEFAULT_BUDGET_MS = 100
+
+FRAMEWORK = 'flask'
+
+
+# Never imported by `import app`: the form stack loads on the first /contact
+# request, bulk on the first /api/bulk request, freeze with `flask freeze`, and
+# multiprocessing with the first image resize or freeze
+DEFERRED = ('flask_wtf', 'wtforms', 'email_validator', 'dns', 'bulk', 'freeze', 'multiprocessing')
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def measure(module):
+    """(cumulative µs of `import module`, {top-level package: largest cumulative µs}) from a fresh interpreter"""
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                             cwd=ROOT, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise SystemExit(f'import {module} failed:\n{process.stderr[-2000:]}')
+    total = None
+    packages = {}
+    for line in process.stderr.splitlines():
+        match = _LINE.match(line)
+        if match is None:
+            continue
+        cumulative, name = int(match.group(2)), match.group(4)
+        if len(match.group(3)) == 1:  # top level: the module itself
+            total = cumulative if name == module else total
+            continue
+        root = name.split('.')[0]
+        packages[root] = max(packages.get(root, 0), cumulative)
+    return total, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--top', type=int, default=15, help='slowest packages to list')
+    args = parser.parse_args()
+
+    # The first run may compile bytecode; it is not a cold start
+    measure(args.module)
+    runs, framework = [], []
+    for _ in range(args.runs):
+        # Interleaved, so load on the machine affects both alike
+        runs.append(measure(args.module))
+        framework.append(measure(FRAMEWORK)[0] / 1000)
+    totals = [total / 1000 for total, _ in runs]
+    packages = min(runs, key=lambda run: run[0])[1]
+    own = min(totals) - min(framework)
+
+    print(f'import {args.module}: best {min(totals):.1f} ms, median {statistics.median(totals):.1f} ms '
+          f'over {args.runs} runs')
+    print(f'import {FRAMEWORK}: best {min(framework):.1f} ms')
+    print(f'{args.module} on top of {FRAMEWORK}: {own:.1f} ms (budget {args.budget_ms:.0f} ms)')
+    for name, micros in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'  {micros / 1000:8.1f} ms  {name}')
+
+    failures = []
+    imported = sorted(name for name in packages if name in DEFERRED)
+    if imported:
+        failures.append(f'deferred modules imported at startup: {", ".join(imported)}')
+    if own > args.budget_ms:
+        failures.append(f'import {args.module} added {own:.1f} ms, over the {args.budget_ms:.0f} ms budget')
+    for failure in failures:
+        print(f'FAIL {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
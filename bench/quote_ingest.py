@@ -0,0 +1,76 @@
+"""Quote ingestion throughput under concurrent load.
+
+Runs N client threads posting to /api/quote through the WSGI test client, once
+with group commit and once with one transaction per request (batch_size=1), each
+against a fresh database in a temporary directory.
+
+    python bench/quote_ingest.py [--threads 32] [--requests 4000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as site  # noqa: E402
+import quotes  # noqa: E402
+
+QUOTE = {'name': 'Load Test', 'email': 'load@example.com', 'phone': '5551234567', 'message': 'Bulk order'}
+
+
+def run(store, threads, total):
+    site.quote_store = store
+    per_thread = total // threads
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def client():
+        c = site.app.test_client()
+        local = []
+        local_status = {}
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            status = c.post('/api/quote', json=QUOTE).status_code
+            local.append(time.perf_counter() - start)
+            local_status[status] = local_status.get(status, 0) + 1
+        with lock:
+            latencies.extend(local)
+            for status, count in local_status.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    store.close()
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    return {
+        'requests': len(latencies), 'seconds': elapsed, 'rps': len(latencies) / elapsed,
+        'p50_ms': pct(0.50), 'p99_ms': pct(0.99), 'batches': store.batches, 'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=4000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, batch_size in (('per-request commit', 1), ('group commit', 500)):
+            store = quotes.QuoteStore(os.path.join(tmp, f'{batch_size}.db'), batch_size=batch_size)
+            result = run(store, args.threads, args.requests)
+            print(f'{label:20} {result["rps"]:8.0f} req/s  p50 {result["p50_ms"]:6.2f} ms  '
+                  f'p99 {result["p99_ms"]:6.2f} ms  {result["batches"]} commits  {result["statuses"]}')
+
+
+if __name__ == '__main__':
+    main()
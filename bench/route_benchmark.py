@@ -0,0 +1,418 @@
+"""Per-route latency, throughput, allocations and response size, with baseline regression checks.
+
+Micro mode drives every route in-process through the WSGI test client; macro
+mode spawns gunicorn on a free local port and loads it over HTTP with keep-alive
+client threads. Both run against a synthetic catalog (so /sitemap.xml and the
+listings see realistic sizes) and a throwaway quote database.
+
+    python bench/route_benchmark.py [--mode micro|macro|both] [--products 50000]
+        [--output results.json] [--baseline bench/baseline.json] [--threshold 0.25]
+    python bench/route_benchmark.py --save-baseline    # record the current numbers
+    python bench/route_benchmark.py --no-baseline      # just report
+
+Exits 1 when a route's p50 latency, allocations or response size regress past
+the threshold relative to the baseline (p95 gets NOISE_MARGIN on top of it)
+and still do when the route is measured again, and 2 when there is no baseline
+to compare with (unless --no-baseline).
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import synthetic_catalog  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+QUOTE = {'name': 'Load Test', 'email': 'load@example.com', 'phone': '5551234567', 'message': 'Bulk order'}
+
+# (name, method, path); paths are filled in from the catalog by routes()
+ROUTES = (
+    ('home', 'GET', '/'),
+    ('about', 'GET', '/about'),
+    ('products', 'GET', '/products'),
+    ('products_category_page', 'GET', '/products?category={category}&page=2'),
+    ('product_detail', 'GET', '/products/{product_id}'),
+    ('search', 'GET', '/search?q=organic+fert'),
+    ('api_search', 'GET', '/api/search?q=neem+spray'),
+    ('contact', 'GET', '/contact'),
+    ('privacy_policy', 'GET', '/privacy-policy'),
+    ('terms_of_service', 'GET', '/terms-of-service'),
+    ('sitemap_index', 'GET', '/sitemap.xml'),
+    ('sitemap_part', 'GET', '/sitemap-1.xml'),
+    ('sitemap_part_gz', 'GET', '/sitemap-1.xml.gz'),
+    ('robots', 'GET', '/robots.txt'),
+    ('schema_organization', 'GET', '/api/schema/organization'),
+    ('schema_products', 'GET', '/api/schema/products?category={category}'),
+    ('bulk_products', 'GET', '/api/bulk/products?limit=1000'),
+    ('static_css', 'GET', '/static/css/style.css'),
+    ('api_quote_burst', 'POST', '/api/quote'),
+)
+
+# metric -> True when higher is worse; only these gate the exit status. Throughput
+# is reported but not gated: on sub-millisecond routes it swings with scheduler noise.
+CHECKED_METRICS = {'p50_ms': True, 'p95_ms': True, 'alloc_kb': True, 'bytes': True}
+# Differences smaller than these are noise, whatever the percentage
+ABSOLUTE_FLOOR = {'p50_ms': 0.25, 'p95_ms': 0.5, 'alloc_kb': 1, 'bytes': 64}
+# Tail latency swings with scheduler noise even on an idle box: p95 may regress by
+# this much on top of --threshold before it fails the run; p50 gets no margin
+NOISE_MARGIN = {'p95_ms': 0.25}
+
+
+# Run metadata that is expected to differ between the baseline and a run
+VOLATILE_META = ('timestamp', 'commit')
+
+
+def environment():
+    """What the numbers depend on besides the code: interpreter, libraries and machine"""
+    from importlib.metadata import PackageNotFoundError, version
+
+    meta = {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'platform': platform.platform(), 'machine': platform.machine(), 'cpus': os.cpu_count()}
+    for package in ('flask', 'werkzeug', 'jinja2', 'brotli', 'zstandard'):
+        try:
+            meta[package] = version(package)
+        except PackageNotFoundError:
+            meta[package] = None
+    try:
+        meta['commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                        text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        meta['commit'] = None
+    return meta
+
+
+def routes(catalog):
+    product = catalog.products[len(catalog.products) // 2]
+    category = catalog.categories[0].slug
+    return [(name, method, path.format(category=category, product_id=product.id)) for name, method, path in ROUTES]
+
+
+def summarize(latencies, elapsed, size, statuses):
+    latencies = sorted(latencies)
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(pct(0.50), 3),
+        'p95_ms': round(pct(0.95), 3),
+        'p99_ms': round(pct(0.99), 3),
+        'bytes': size,
+        'statuses': statuses,
+    }
+
+
+# Micro: in-process through the test client
+
+def _micro_get(site, client, path, requests, cold):
+    latencies = []
+    statuses = {}
+    size = 0
+    headers = {'Accept-Encoding': 'br, gzip'}
+    start = time.perf_counter()
+    for _ in range(requests):
+        if cold:
+            site.page_cache.invalidate()
+        t = time.perf_counter()
+        response = client.get(path, headers=headers)
+        size = len(response.get_data())
+        latencies.append(time.perf_counter() - t)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return summarize(latencies, time.perf_counter() - start, size, statuses)
+
+
+def _micro_allocations(site, client, method, path, requests, cold):
+    """Mean peak traced allocation per request, in KiB"""
+    tracemalloc.start()
+    peaks = []
+    try:
+        for _ in range(requests):
+            if cold:
+                site.page_cache.invalidate()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            if method == 'POST':
+                client.post(path, json=QUOTE)
+            else:
+                client.get(path, headers={'Accept-Encoding': 'br, gzip'})
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return round(sum(peaks) / len(peaks) / 1024, 1)
+
+
+def _micro_quote_burst(site, path, requests, threads):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    per_thread = max(1, requests // threads)
+
+    def worker():
+        client = site.app.test_client()
+        local, local_statuses = [], {}
+        for _ in range(per_thread):
+            t = time.perf_counter()
+            status = client.post(path, json=QUOTE).status_code
+            local.append(time.perf_counter() - t)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return summarize(latencies, time.perf_counter() - start, len(json.dumps(QUOTE)), statuses)
+
+
+def run_micro(catalog, tmp, args, only=None):
+    import app as site
+    import quotes
+    from catalog import set_catalog
+
+    set_catalog(catalog)
+    site.quote_store = quotes.QuoteStore(os.path.join(tmp, 'micro-quotes.db'))
+    client = site.app.test_client()
+    results = {}
+    try:
+        for name, method, path in routes(catalog):
+            if only is not None and name not in only:
+                continue
+            if method == 'POST':
+                result = _micro_quote_burst(site, path, args.requests, args.concurrency)
+            else:
+                for _ in range(args.warmup):
+                    client.get(path)
+                # Best of several rounds: scheduler noise only ever adds latency
+                result = min((_micro_get(site, client, path, args.requests, args.cold) for _ in range(args.rounds)),
+                             key=lambda r: r['p50_ms'])
+            result['alloc_kb'] = _micro_allocations(site, client, method, path, min(args.requests, 50), args.cold)
+            results[name] = result
+            print(_format(name, result))
+    finally:
+        site.quote_store.close()
+    return results
+
+
+# Macro: gunicorn over HTTP
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _start_gunicorn(tmp, catalog, args):
+    if shutil.which('gunicorn') is None:
+        raise SystemExit('macro mode needs gunicorn (pip install -r requirements.txt)')
+    catalog_path = os.path.join(tmp, 'catalog.json')
+    with open(catalog_path, 'w') as f:
+        json.dump([dict(p._asdict(), features=list(p.features)) for p in catalog.products], f)
+    port = _free_port()
+    env = dict(os.environ, CATALOG_PATH=catalog_path, QUOTES_DB_PATH=os.path.join(tmp, 'macro-quotes.db'),
+               JINJA_CACHE_DIR=os.path.join(tmp, 'jinja_cache'))
+    process = subprocess.Popen(
+        ['gunicorn', '--workers', str(args.workers), '--worker-class', 'gthread', '--threads', '4',
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'wsgi:app'],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'gunicorn exited with status {process.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/robots.txt')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit('gunicorn did not become ready within 60s')
+
+
+def _macro_route(port, method, path, requests, concurrency):
+    latencies = []
+    statuses = {}
+    sizes = []
+    lock = threading.Lock()
+    per_thread = max(1, requests // concurrency)
+    body = json.dumps(QUOTE) if method == 'POST' else None
+    headers = {'Accept-Encoding': 'br, gzip'}
+    if body:
+        headers['Content-Type'] = 'application/json'
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local, local_statuses, size = [], {}, 0
+        for _ in range(per_thread):
+            t = time.perf_counter()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            size = len(response.read())
+            local.append(time.perf_counter() - t)
+            local_statuses[response.status] = local_statuses.get(response.status, 0) + 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            sizes.append(size)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    workers = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return summarize(latencies, time.perf_counter() - start, max(sizes), statuses)
+
+
+def run_macro(catalog, tmp, args):
+    process, port = _start_gunicorn(tmp, catalog, args)
+    results = {}
+    try:
+        for name, method, path in routes(catalog):
+            if method == 'GET':
+                _macro_route(port, method, path, args.warmup * args.concurrency, args.concurrency)
+            result = _macro_route(port, method, path, args.requests, args.concurrency)
+            results[name] = result
+            print(_format(name, result))
+    finally:
+        process.terminate()
+        process.wait(30)
+    return results
+
+
+# Reporting and baseline comparison
+
+def _format(name, result):
+    alloc = f'{result["alloc_kb"]:8.1f} KiB' if 'alloc_kb' in result else ' ' * 12
+    return (f'  {name:24} {result["rps"]:9.1f} req/s  p50 {result["p50_ms"]:8.3f}  p95 {result["p95_ms"]:8.3f}  '
+            f'p99 {result["p99_ms"]:8.3f} ms {alloc} {result["bytes"]:9d} B  {result["statuses"]}')
+
+
+def compare(results, baseline, threshold):
+    """List of (mode, route, message) for the checked metrics regressing beyond threshold (a fraction)"""
+    regressions = []
+    for mode, routes_ in results.items():
+        if mode == 'meta':
+            continue
+        for name, result in routes_.items():
+            before = baseline.get(mode, {}).get(name)
+            if before is None:
+                continue
+            for metric, higher_is_worse in CHECKED_METRICS.items():
+                if metric not in result or metric not in before or not before[metric]:
+                    continue
+                old, new = before[metric], result[metric]
+                delta = (new - old) if higher_is_worse else (old - new)
+                if delta > ABSOLUTE_FLOOR[metric] and delta / old > threshold + NOISE_MARGIN.get(metric, 0):
+                    regressions.append((mode, name, f'{mode}/{name} {metric}: {old} -> {new} ({delta / old:+.0%})'))
+    return regressions
+
+
+def recheck(catalog, args, results, regressions):
+    """Measure the regressed micro routes again, keeping each latency's better value"""
+    flagged = sorted({name for mode, name, _ in regressions if mode == 'micro'})
+    if not flagged:
+        return False
+    print(f're-measuring {", ".join(flagged)}')
+    with tempfile.TemporaryDirectory() as tmp:
+        again = run_micro(catalog, tmp, args, only=flagged)
+    for name, result in again.items():
+        before = results['micro'][name]
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            before[metric] = min(before[metric], result[metric])
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=('micro', 'macro', 'both'), default='micro')
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=500, help='requests per route')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=3, help='micro rounds per route; the best one is kept')
+    parser.add_argument('--concurrency', type=int, default=16, help='client threads (macro, quote bursts)')
+    parser.add_argument('--workers', type=int, default=max(2, os.cpu_count() or 1), help='gunicorn workers')
+    parser.add_argument('--cold', action='store_true', help='purge the page cache before every request')
+    parser.add_argument('--output', default=None, help='write results as JSON')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write results to --baseline and exit 0')
+    parser.add_argument('--no-baseline', action='store_true', help='report only; skip the baseline comparison')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed regression, as a fraction')
+    parser.add_argument('--rechecks', type=int, default=1,
+                        help='times regressed micro routes are measured again before failing')
+    args = parser.parse_args()
+
+    catalog = synthetic_catalog(args.products)
+    results = {'meta': {
+        **environment(), 'mode': args.mode,
+        'products': args.products, 'requests': args.requests, 'concurrency': args.concurrency, 'cold': args.cold,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }}
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.mode in ('micro', 'both'):
+            print(f'micro (test client, {args.products} products)')
+            results['micro'] = run_micro(catalog, tmp, args)
+        if args.mode in ('macro', 'both'):
+            print(f'macro (gunicorn, {args.workers} workers, {args.concurrency} clients)')
+            results['macro'] = run_macro(catalog, tmp, args)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'baseline written to {args.baseline}')
+        return 0
+    if args.no_baseline:
+        return 0
+    if not os.path.exists(args.baseline):
+        # A gate that silently passes without a baseline is no gate
+        print(f'FAIL no baseline at {args.baseline}; record one with --save-baseline or pass --no-baseline')
+        return 2
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    for key, value in results['meta'].items():
+        recorded = baseline.get('meta', {}).get(key)
+        if key not in VOLATILE_META and recorded != value:
+            print(f'warning: baseline {key} was {recorded!r}, this run {value!r}; numbers may not be comparable')
+    regressions = compare(results, baseline, args.threshold)
+    # A regression that does not reproduce was noise; only micro routes are cheap enough to re-run
+    for _ in range(args.rechecks):
+        if not recheck(catalog, args, results, regressions):
+            break
+        regressions = compare(results, baseline, args.threshold)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+    for _, _, line in regressions:
+        print(f'REGRESSION {line}')
+    if regressions:
+        return 1
+    print(f'no regressions beyond {args.threshold:.0%} against {args.baseline}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
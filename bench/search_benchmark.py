@@ -0,0 +1,71 @@
+"""Search index build time, incremental update time and query latency.
+
+`cold` is the mean (and `max` the slowest) of --repeat runs with the index's
+result cache emptied before each, `cached` the mean once the result is cached.
+
+    python bench/search_benchmark.py [--products 50000] [--repeat 200]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import Catalog  # noqa: E402
+from search import SearchIndex  # noqa: E402
+from synthetic import synthetic_catalog  # noqa: E402
+
+QUERIES = (
+    ('rare exact', 'inoculant'),
+    ('common exact', 'organic'),
+    ('prefix', 'gran'),
+    ('typo', 'fertilzer'),
+    ('two terms', 'neem spray'),
+    ('two common terms', 'organic fertilizer'),
+    ('name + id', 'kelp 4711'),
+    ('category facet', 'humic'),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    catalog = synthetic_catalog(args.products)
+    start = time.perf_counter()
+    index = SearchIndex(catalog.products)
+    print(f'build: {len(catalog)} products in {(time.perf_counter() - start) * 1000:.0f} ms')
+
+    changed = list(catalog.products)
+    for i in range(0, 100):
+        changed[i] = changed[i]._replace(name=changed[i].name + ' Refill')
+    start = time.perf_counter()
+    index.update(catalog, Catalog(changed[:-50]))
+    print(f'incremental update (100 changed, 50 removed): {(time.perf_counter() - start) * 1000:.1f} ms')
+    # As wsgi.freeze_heap does after preloading: collections would otherwise scan the whole index
+    gc.collect()
+    gc.freeze()
+
+    print(f'{"query":18} {"text":20} {"hits":>7} {"cold":>10} {"max":>10} {"cached":>10}')
+    for label, query in QUERIES:
+        category = 'seeds' if label == 'category facet' else None
+        cold = []
+        for _ in range(args.repeat):
+            index._snapshot.results.clear()
+            start = time.perf_counter()
+            result = index.search(query, category)
+            cold.append((time.perf_counter() - start) * 1e6)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            index.search(query, category)
+        cached = (time.perf_counter() - start) / args.repeat * 1e6
+        print(f'{label:18} {query:20} {result.total:7d} {sum(cold) / len(cold):8.0f}us {max(cold):8.0f}us '
+              f'{cached:8.0f}us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Per-request SEO/JSON-LD cost and payload size, before and after precompilation.
+
+"Before" reproduces the original request path: rebuild the page SEO dict, rebuild
+the structured data with a full Organization copy embedded as every offer's
+seller, then json.dumps it. "After" is the precompiled lookup.
+
+    python bench/seo_benchmark.py [--products 10000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import seo  # noqa: E402
+from synthetic import synthetic_catalog  # noqa: E402
+
+
+def legacy_organization():
+    """The organization dict the original code rebuilt on every call"""
+    base_organization = {k: v for k, v in seo.ORGANIZATION.items() if k != '@id'}
+    base_organization['address'] = dict(base_organization['address'])
+    base_organization['contactPoint'] = dict(base_organization['contactPoint'])
+    base_organization['sameAs'] = list(base_organization['sameAs'])
+    return base_organization
+
+
+def legacy_structured_data(products):
+    """The original generate_structured_data('products') body, organization embedded per offer"""
+    base_organization = legacy_organization()
+    return {
+        "@context": "https://schema.org",
+        "@type": "ItemList",
+        "itemListElement": [
+            {
+                "@type": "Product",
+                "name": p.name,
+                "description": p.description,
+                "category": p.category,
+                "offers": {
+                    "@type": "Offer",
+                    "price": p.price,
+                    "priceCurrency": "USD",
+                    "availability": "https://schema.org/InStock",
+                    "seller": base_organization
+                }
+            }
+            for p in products
+        ]
+    }
+
+
+def legacy_product_detail(product):
+    """The original generate_structured_data('product_detail') body"""
+    data = seo.generate_structured_data('product_detail', product=product)
+    data['offers'] = dict(data['offers'], seller=legacy_organization())
+    return data
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    catalog = synthetic_catalog(args.products)
+
+    start = time.perf_counter()
+    compiled = seo.compile_seo(catalog)
+    compile_time = time.perf_counter() - start
+
+    product = catalog.products[len(catalog) // 2]
+    listing = catalog.page(None, 1)
+
+    cases = [
+        ('products listing (all items)',
+         lambda: (seo.generate_page_seo('products'), json.dumps(legacy_structured_data(catalog.products)))[1],
+         lambda: seo.serialize_jsonld(seo.generate_structured_data('products', products=catalog.products))),
+        ('products listing (one page)',
+         lambda: (seo.generate_page_seo('products'), json.dumps(legacy_structured_data(listing.items)))[1],
+         lambda: compiled.pages[('products', None, 1)].structured_data),
+        ('product detail',
+         lambda: (seo.generate_page_seo('product_detail', product=product),
+                  json.dumps(legacy_product_detail(product)))[1],
+         lambda: compiled.pages[('product_detail', product.id)].structured_data),
+    ]
+
+    print(f'catalog: {len(catalog)} products, compile: {compile_time * 1000:.1f} ms')
+    print(f'{"case":32} {"before":>12} {"after":>12} {"before bytes":>14} {"after bytes":>12}')
+    for name, before, after in cases:
+        before_time, before_body = timed(before, args.repeat if 'all' not in name else max(1, args.repeat // 10))
+        # The all-items "after" row measures serialization only, to compare payload size
+        after_time, after_body = timed(after, args.repeat if 'all' not in name else max(1, args.repeat // 10))
+        print(f'{name:32} {before_time * 1e6:10.1f}us {after_time * 1e6:10.1f}us '
+              f'{len(before_body.encode()):14,d} {len(after_body.encode()):12,d}')
+
+
+if __name__ == '__main__':
+    main()
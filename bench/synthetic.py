@@ -0,0 +1,35 @@
+"""Deterministic synthetic catalogs for benchmarks"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import Catalog, Product  # noqa: E402
+
+CATEGORIES = ('Fertilizers', 'Soil Care', 'Pest Control', 'Seeds', 'Irrigation')
+
+_ADJECTIVES = ('organic', 'premium', 'natural', 'slow', 'liquid', 'granular', 'bio', 'compost', 'mineral',
+               'certified', 'heirloom', 'hybrid', 'drip', 'neem', 'kelp', 'humic', 'potash', 'nitrogen')
+_NOUNS = ('fertilizer', 'conditioner', 'pesticide', 'seed', 'mix', 'blend', 'booster', 'spray', 'tonic',
+          'mulch', 'pellets', 'granules', 'emitter', 'tubing', 'repellent', 'inoculant', 'extract')
+_FEATURES = ('100% Organic', 'Slow Release', 'NPK Balanced', 'Chemical-Free', 'Fast Acting', 'OMRI Listed',
+             'Water Soluble', 'Pet Safe', 'Improves Drainage', 'Non-GMO', 'UV Resistant')
+
+
+def synthetic_catalog(count, seed=42):
+    rng = random.Random(seed)
+    products = []
+    for i in range(1, count + 1):
+        words = rng.sample(_ADJECTIVES, 2) + [rng.choice(_NOUNS)]
+        products.append(Product(
+            id=i,
+            name=' '.join(w.title() for w in words) + f' {i}',
+            description=f'{" ".join(rng.sample(_ADJECTIVES, 3))} {rng.choice(_NOUNS)} for sustainable farming, '
+                        f'batch {i % 97}.',
+            price=round(rng.uniform(5, 250), 2),
+            category=CATEGORIES[i % len(CATEGORIES)],
+            features=tuple(rng.sample(_FEATURES, 3)),
+            updated=1700000000.0 + (i % 365) * 86400,
+        ))
+    return Catalog(products)
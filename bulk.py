@@ -0,0 +1,235 @@
+"""NDJSON bulk API for dealer sync: streamed catalog export and streamed quote import.
+
+app.py routes /api/bulk/* here lazily, so this module loads on the first bulk request.
+"""
+import bisect
+import json
+import zlib
+from collections import deque
+from datetime import datetime, timezone
+
+from flask import abort, current_app, request, stream_with_context, url_for
+from werkzeug.http import parse_date
+
+from auth import require_token
+from catalog import get_catalog
+from quotes import QueueFull, quote_store, validate_quote
+
+NDJSON = 'application/x-ndjson'
+IMPORT_TYPES = (NDJSON, 'application/jsonl', 'application/x-jsonlines')
+
+DEFAULT_LIMIT = 5000
+MAX_LIMIT = 50000
+
+# Lines joined into one chunk before it is written (or compressed)
+CHUNK_LINES = 256
+
+# Import limits: a longer line is rejected, later lines are not read
+MAX_LINE_BYTES = 16 * 1024
+MAX_RECORDS = 50000
+
+# Quotes enqueued before the oldest one's commit is awaited; the writer commits
+# up to batch_size at once, so a window of one batch keeps it busy without
+# holding thousands of tickets per request
+WINDOW = 500
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+def product_record(product, base_url, category_slug):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'description': product.description,
+        'price': product.price,
+        'category': product.category,
+        'category_slug': category_slug,
+        'features': list(product.features),
+        'updated': datetime.fromtimestamp(product.updated, timezone.utc).isoformat(),
+        'url': f'{base_url}/products/{product.id}',
+    }
+
+
+def export_window(products, cursor, limit, since):
+    """(start index, stop index, count) of the next `limit` products after id `cursor` changed after `since`.
+
+    products is sorted by id, so the cursor is found by bisection and stays
+    valid when products are added or removed between pages.
+    """
+    start = bisect.bisect_right(products, cursor, key=lambda p: p.id) if cursor is not None else 0
+    if since is None:
+        stop = min(start + limit, len(products))
+        return start, stop, stop - start
+    count = 0
+    stop = start
+    while stop < len(products) and count < limit:
+        if int(products[stop].updated) > since:
+            count += 1
+        stop += 1
+    return start, stop, count
+
+
+def _export_lines(products, start, stop, since, base_url, slugs):
+    batch = []
+    for index in range(start, stop):
+        product = products[index]
+        if since is not None and int(product.updated) <= since:
+            continue
+        batch.append(_dumps(product_record(product, base_url, slugs[product.category])))
+        if len(batch) >= CHUNK_LINES:
+            yield ('\n'.join(batch) + '\n').encode('utf-8')
+            batch = []
+    if batch:
+        yield ('\n'.join(batch) + '\n').encode('utf-8')
+
+
+def gzip_stream(chunks):
+    """Gzip a chunk iterator incrementally, flushing after every chunk"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _result(line, outcome, ref):
+    result = {'line': line}
+    if ref is not None:
+        result['ref'] = ref
+    result.update(outcome)
+    return _dumps(result)
+
+
+def import_results(stream, store=quote_store):
+    """Yield one NDJSON result line per input line, in input order, then a summary line.
+
+    Lines are read one at a time, so memory stays bounded by the window of
+    quotes waiting for their commit, whatever the upload size.
+    """
+    pending = deque()  # (line number, ref, Ticket or a finished outcome dict)
+    counts = {'accepted': 0, 'rejected': 0}
+
+    def settle():
+        number, ref, outcome = pending.popleft()
+        if not isinstance(outcome, dict):
+            try:
+                outcome = {'ok': True, 'quote_id': outcome.wait()}
+            except Exception:
+                outcome = {'ok': False, 'error': 'Could not store this quote; retry it.'}
+        counts['accepted' if outcome['ok'] else 'rejected'] += 1
+        return _result(number, outcome, ref)
+
+    def ready():
+        outcome = pending[0][2]
+        return isinstance(outcome, dict) or outcome.done()
+
+    number = 0
+    while True:
+        raw = stream.readline(MAX_LINE_BYTES + 1)
+        if not raw:
+            break
+        if not raw.strip():
+            continue
+        number += 1
+        out = []
+        if number > MAX_RECORDS:
+            pending.append((number, None, {'ok': False, 'error': f'At most {MAX_RECORDS} records per request; '
+                                                                  'send the rest in another request.'}))
+            break
+        if len(raw) > MAX_LINE_BYTES and not raw.endswith(b'\n'):
+            while raw and not raw.endswith(b'\n'):
+                raw = stream.readline(MAX_LINE_BYTES + 1)
+            pending.append((number, None, {'ok': False, 'error': f'Line longer than {MAX_LINE_BYTES} bytes.'}))
+        else:
+            try:
+                data = json.loads(raw)
+            except ValueError:
+                data = None
+            ref = data.get('ref') if isinstance(data, dict) else None
+            ref = ref if isinstance(ref, (str, int)) and len(str(ref)) <= 100 else None
+            quote, errors = validate_quote(data) if data is not None else (None, {'_': 'Invalid JSON.'})
+            if errors:
+                pending.append((number, ref, {'ok': False, 'errors': errors}))
+            else:
+                while True:
+                    try:
+                        pending.append((number, ref, store.submit('quote', quote)))
+                        break
+                    except QueueFull:
+                        if not pending:
+                            pending.append((number, ref, {'ok': False, 'error': 'Busy; retry this quote.'}))
+                            break
+                        # Backpressure: wait for our own oldest quote before adding more
+                        out.append(settle())
+        while pending and (len(pending) >= WINDOW or ready()):
+            out.append(settle())
+        if out:
+            yield ('\n'.join(out) + '\n').encode('utf-8')
+
+    out = [settle() for _ in range(len(pending))]
+    out.append(_dumps({'summary': True, 'lines': number, **counts}))
+    yield ('\n'.join(out) + '\n').encode('utf-8')
+
+
+def _since():
+    """The `since` query parameter as whole POSIX seconds, or None; accepts seconds or an HTTP date.
+
+    The delta is part of the URL, not a request header, so each delta page is
+    its own cacheable resource and the next-page link can carry it.
+    """
+    value = request.args.get('since')
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value)
+    since = parse_date(value)
+    if since is None:
+        abort(400)
+    return int(since.timestamp())
+
+
+def export_products():
+    """GET /api/bulk/products: the catalog as NDJSON, `limit` products after `cursor` (a product id),
+    optionally only those changed after `since`. The next page, with the same `since`, is in the Link header."""
+    catalog = get_catalog()
+    last_modified = int(catalog.last_modified)
+    # If-Modified-Since only revalidates: it never changes which products a URL returns
+    modified_since = request.if_modified_since
+    if modified_since is not None and last_modified <= int(modified_since.timestamp()):
+        response = current_app.response_class(status=304)
+        response.last_modified = last_modified
+        return response
+    since = _since()
+    cursor = request.args.get('cursor', type=int)
+    limit = min(max(1, request.args.get('limit', DEFAULT_LIMIT, type=int)), MAX_LIMIT)
+
+    products = catalog.products
+    start, stop, count = export_window(products, cursor, limit, since)
+    base_url = request.url_root.rstrip('/')
+    chunks = _export_lines(products, start, stop, since, base_url,
+                           {category.name: category.slug for category in catalog.categories})
+    response = current_app.response_class(mimetype=NDJSON)
+    if request.accept_encodings['gzip']:
+        chunks = gzip_stream(chunks)
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.response = chunks
+    response.last_modified = last_modified
+    response.headers['X-Record-Count'] = str(count)
+    if stop < len(products):
+        next_url = url_for('bulk_products', cursor=products[stop - 1].id, limit=limit, since=since)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+
+@require_token('BULK_API_TOKEN')
+def import_quotes():
+    """POST /api/bulk/quotes: quotes as NDJSON, one JSON object per line; streams back one result
+    per line, then a summary. Needs Authorization: Bearer $BULK_API_TOKEN."""
+    if request.mimetype not in IMPORT_TYPES:
+        return current_app.response_class(_dumps({'success': False, 'message': f'Send {NDJSON}.'}) + '\n',
+                                          status=415, mimetype='application/json')
+    return current_app.response_class(stream_with_context(import_results(request.stream)), mimetype=NDJSON)
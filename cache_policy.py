@@ -0,0 +1,357 @@
+"""Per-route Cache-Control policies, personalization downgrades and surrogate-key purge"""
+import atexit
+import contextlib
+import json
+import logging
+import os
+import struct
+import threading
+import urllib.request
+from collections import namedtuple
+
+try:
+    import fcntl
+    import mmap
+except ImportError:  # Windows: the dev server is one process, there is nothing to share
+    fcntl = None
+
+from flask import g, request, session
+
+from process_local import ProcessLocal
+
+logger = logging.getLogger(__name__)
+
+# scope: 'public' (any cache), 'private' (browser only) or 'no-store'.
+# keys are surrogate keys; '{name}' placeholders are filled from the view args.
+CachePolicy = namedtuple('CachePolicy', 'scope max_age s_maxage stale_while_revalidate stale_if_error keys')
+
+SURROGATE_KEY_HEADER = 'Surrogate-Key'
+
+# Purges replayed from other processes stop at the caches of this process
+_purge_listeners = []
+_local_purge_listeners = []
+
+# Purges kept in the shared file; a process further behind drops its caches instead
+MAX_SHARED_PURGES = 256
+
+
+def public(max_age=300, s_maxage=None, stale_while_revalidate=None, stale_if_error=None, keys=()):
+    """Shareable response: browsers and CDNs may store it, tagged with surrogate keys"""
+    return CachePolicy('public', max_age, s_maxage, stale_while_revalidate, stale_if_error, tuple(keys))
+
+
+def private(max_age=0):
+    """Per-user response: only the browser may store it, revalidating after max_age"""
+    return CachePolicy('private', max_age, None, None, None, ())
+
+
+def no_store():
+    """Never stored anywhere"""
+    return CachePolicy('no-store', None, None, None, None, ())
+
+
+DEFAULT = public()
+NO_STORE = no_store()
+
+
+def cache_control(policy):
+    """Declare the cache policy of a view"""
+    def decorator(f):
+        f.cache_policy = policy
+        return f
+    return decorator
+
+
+def policy_for(app):
+    """The policy declared on the current request's view, or None"""
+    view = app.view_functions.get(request.endpoint)
+    return getattr(view, 'cache_policy', None)
+
+
+def surrogate_keys(policy):
+    view_args = request.view_args or {}
+    return [key.format(**view_args) for key in policy.keys]
+
+
+def personalized(response):
+    """True when the response may carry per-user state: session, CSRF token or flashed messages.
+
+    Flask-WTF keeps CSRF tokens and flash() keeps messages in the session, so
+    reading or writing either marks the session as accessed.
+    """
+    return session.accessed or 'csrf_token' in g or 'Set-Cookie' in response.headers
+
+
+def effective_policy(policy, response):
+    """Downgrade a declared policy to what is safe for this request and response"""
+    if request.method not in ('GET', 'HEAD') or response.status_code >= 500:
+        return NO_STORE
+    if policy.scope == 'public' and personalized(response):
+        # A cookie must never be replayed to another user; other per-user pages stay in the browser
+        return NO_STORE if 'Set-Cookie' in response.headers else private()
+    return policy
+
+
+def apply(app, response):
+    """Set Cache-Control and Surrogate-Key from the view's declared policy.
+
+    Views without a declared policy keep a Cache-Control they set themselves
+    (static files) and otherwise get DEFAULT. The result is then downgraded:
+    non-GET requests and server errors are never stored, and anything that
+    touched the session is never shared.
+    """
+    policy = policy_for(app)
+    if policy is None:
+        if response.cache_control.max_age is not None:
+            policy = public(response.cache_control.max_age)
+            policy = policy._replace(scope='private') if response.cache_control.private else policy
+        else:
+            policy = DEFAULT
+    declared = policy
+    policy = effective_policy(policy, response)
+
+    cc = response.cache_control
+    immutable = cc.immutable and policy is declared
+    cc.clear()
+    response.headers.pop(SURROGATE_KEY_HEADER, None)
+
+    if policy.scope == 'no-store':
+        cc.no_store = True
+        return response
+    if policy.scope == 'private':
+        cc.private = True
+        cc.max_age = policy.max_age
+        if not policy.max_age:
+            cc.no_cache = True
+        response.vary.add('Cookie')
+        return response
+
+    cc.public = True
+    cc.max_age = policy.max_age
+    if immutable:
+        cc.immutable = True
+    if policy.s_maxage is not None:
+        cc.s_maxage = policy.s_maxage
+    # Not exposed as properties by werkzeug's ResponseCacheControl
+    if policy.stale_while_revalidate:
+        cc['stale-while-revalidate'] = str(policy.stale_while_revalidate)
+    if policy.stale_if_error:
+        cc['stale-if-error'] = str(policy.stale_if_error)
+    keys = surrogate_keys(policy)
+    if keys:
+        response.headers[SURROGATE_KEY_HEADER] = ' '.join(keys)
+    return response
+
+
+def on_purge(listener, local=False):
+    """Register listener(keys), e.g. a CDN purge call, run on every purge().
+
+    A local listener clears a cache held by each process: it also gets the
+    keys purged by other processes sharing the purge file, and None when this
+    process missed some of them and must drop everything.
+    """
+    _purge_listeners.append(listener)
+    if local:
+        _local_purge_listeners.append(listener)
+    return listener
+
+
+def purge(*keys):
+    """Purge everything tagged with any of the surrogate keys, locally and in registered shared caches"""
+    keys = set(keys)
+    if _shared is not None and keys:
+        try:
+            _shared.publish(keys)
+        except OSError:
+            logger.exception('could not share the purge of %s with other processes', sorted(keys))
+    _notify(_purge_listeners, keys)
+    return keys
+
+
+def _notify(listeners, keys):
+    for listener in listeners:
+        try:
+            listener(keys)
+        except Exception:
+            logger.exception('surrogate key purge failed for %s', 'everything' if keys is None else sorted(keys))
+
+
+class SharedPurges:
+    """Purges shared by every process on the host through one small file.
+
+    The file starts with a generation number, read through a shared memory map
+    so the check before serving a cached entry costs no system call, followed
+    by the last MAX_SHARED_PURGES purges as JSON lines of [generation, keys].
+    publish() appends under an exclusive flock and bumps the generation; sync()
+    replays newer purges into this process's caches.
+    """
+
+    _HEADER = struct.Struct('<Q')
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        with self._flock(fcntl.LOCK_EX):
+            if os.fstat(self._fd).st_size < self._HEADER.size:
+                os.pwrite(self._fd, self._HEADER.pack(0), 0)
+                os.ftruncate(self._fd, self._HEADER.size)
+        self._map = mmap.mmap(self._fd, self._HEADER.size)
+        # Caches start empty: only purges published from now on concern them.
+        # A forked worker inherits this with the caches it was forked with.
+        self.seen = self.generation()
+        self._lock = ProcessLocal(threading.Lock)
+
+    def generation(self):
+        return self._HEADER.unpack_from(self._map)[0]
+
+    @contextlib.contextmanager
+    def _flock(self, operation):
+        fcntl.flock(self._fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _read(self):
+        """(generation, [[generation, keys], ...]); call with the file locked"""
+        size = os.fstat(self._fd).st_size
+        data = os.pread(self._fd, size, 0)
+        generation = self._HEADER.unpack_from(data)[0]
+        purges = [json.loads(line) for line in data[self._HEADER.size:].splitlines() if line]
+        return generation, purges
+
+    def publish(self, keys):
+        """Record a purge for the other processes; the caller purges its own caches"""
+        with self._lock.get(), self._flock(fcntl.LOCK_EX):
+            generation, purges = self._read()
+            purges = (purges + [[generation + 1, sorted(keys)]])[-MAX_SHARED_PURGES:]
+            body = ''.join(json.dumps(purge) + '\n' for purge in purges).encode()
+            os.pwrite(self._fd, body, self._HEADER.size)
+            os.ftruncate(self._fd, self._HEADER.size + len(body))
+            # Bumped last, so a process seeing the new generation finds its purge
+            os.pwrite(self._fd, self._HEADER.pack(generation + 1), 0)
+            if self.seen == generation:
+                self.seen = generation + 1
+        return generation + 1
+
+    def sync(self, listeners):
+        """Replay purges published by other processes since the last sync into listeners"""
+        if self.generation() == self.seen:
+            return
+        with self._lock.get():
+            if self.generation() == self.seen:
+                return
+            with self._flock(fcntl.LOCK_SH):
+                generation, purges = self._read()
+            if not purges or purges[0][0] > self.seen + 1:
+                keys = None
+            else:
+                keys = {key for published, purged in purges if published > self.seen for key in purged}
+            # Still holding the lock: no other thread serves an entry this purge drops
+            _notify(listeners, keys)
+            self.seen = generation
+
+
+_shared = None
+
+
+def share_purges(path):
+    """Share purges with the other processes (gunicorn workers) using the file at path"""
+    global _shared
+    if fcntl is None:
+        return None
+    try:
+        _shared = SharedPurges(path)
+    except OSError:
+        logger.exception('purges stay local to each process: cannot use %s', path)
+        _shared = None
+    return _shared
+
+
+def sync_purges():
+    """Apply purges made by other processes; call before serving an entry from a per-process cache"""
+    if _shared is not None:
+        _shared.sync(_local_purge_listeners)
+
+
+class _PurgeQueue:
+    """One process's keys waiting to be sent and the thread sending them"""
+
+    def __init__(self, run):
+        self.cond = threading.Condition()
+        self.pending = set()
+        self.sending = False
+        self.thread = threading.Thread(target=run, args=(self,), name='surrogate-purge', daemon=True)
+        self.thread.start()
+
+
+class RemotePurger:
+    """Purge listener that forwards keys to a shared cache from a background thread.
+
+    Calling it only records the keys, so purge() never waits on the network.
+    Keys purged while a request is in flight are merged into the next one, and
+    send(keys) gets at most max_keys keys per call.
+    """
+
+    def __init__(self, send, max_keys=256):
+        self.send = send
+        self.max_keys = max_keys
+        # Threads do not survive fork: each process starts its own sender on its first purge
+        self._queue = ProcessLocal(lambda: _PurgeQueue(self._run))
+
+    def __call__(self, keys):
+        queue = self._queue.get()
+        with queue.cond:
+            queue.pending.update(keys)
+            queue.cond.notify_all()
+
+    def _run(self, queue):
+        while True:
+            with queue.cond:
+                while not queue.pending:
+                    queue.cond.wait()
+                keys = sorted(queue.pending)
+                queue.pending.clear()
+                queue.sending = True
+            for start in range(0, len(keys), self.max_keys):
+                batch = keys[start:start + self.max_keys]
+                try:
+                    self.send(batch)
+                except Exception:
+                    logger.exception('surrogate key purge failed for %s', batch)
+            with queue.cond:
+                queue.sending = False
+                queue.cond.notify_all()
+
+    def flush(self, timeout=5.0):
+        """Wait until every recorded key has been sent; False on timeout"""
+        queue = self._queue.peek()
+        if queue is None:
+            return True
+        with queue.cond:
+            return queue.cond.wait_for(lambda: not queue.pending and not queue.sending, timeout)
+
+
+def http_purger(url_template, headers=None, timeout=5, max_keys=256):
+    """Purge listener that POSTs keys to a CDN purge API from a background thread.
+
+    Without a '{key}' placeholder every batch of keys is one POST with the keys
+    in a Surrogate-Key header (Fastly's batch purge); with one, each key is
+    POSTed to url_template.format(key=...) for APIs that purge one key at a time.
+    """
+    def send(keys):
+        if '{key}' in url_template:
+            posts = [(url_template.format(key=key), {}) for key in keys]
+        else:
+            posts = [(url_template, {SURROGATE_KEY_HEADER: ' '.join(keys)})]
+        for url, extra in posts:
+            req = urllib.request.Request(url, method='POST', headers={**(headers or {}), **extra})
+            with urllib.request.urlopen(req, timeout=timeout):
+                pass
+
+    purger = RemotePurger(send, max_keys)
+    atexit.register(purger.flush)
+    return purger
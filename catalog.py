@@ -0,0 +1,163 @@
+"""Product catalog loaded once into immutable, indexed records"""
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+PRODUCTS_PER_PAGE = 24
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'products.json')
+
+# `updated` is a POSIX timestamp; see load_catalog() for records without one
+Product = namedtuple('Product', 'id name description price category features updated')
+
+Page = namedtuple('Page', 'items category page per_page total pages')
+
+Category = namedtuple('Category', 'slug name count')
+
+
+def slugify(value):
+    """Turn a category name into a URL slug ('Soil Care' -> 'soil-care')"""
+    return re.sub(r'[^a-z0-9]+', '-', value.lower()).strip('-')
+
+
+def _parse_updated(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _make_product(row):
+    features = row.get('features') or ()
+    if isinstance(features, str):
+        features = json.loads(features)
+    return Product(
+        id=int(row['id']),
+        name=row['name'],
+        description=row['description'],
+        price=float(row['price']),
+        category=sys.intern(row['category']),
+        features=tuple(sys.intern(f) for f in features),
+        updated=_parse_updated(row.get('updated')),
+    )
+
+
+def _read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _read_sqlite(path):
+    """Read rows from a `products` table; `features` is a JSON array column"""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in conn.execute('SELECT * FROM products ORDER BY id')]
+    finally:
+        conn.close()
+
+
+class Catalog:
+    """Immutable product set indexed by id and by category slug"""
+
+    def __init__(self, products, source=None, mtime=0.0):
+        self.products = tuple(sorted(products, key=lambda p: p.id))
+        self.source = source
+        self.mtime = mtime
+        self.by_id = {p.id: p for p in self.products}
+        by_category = {}
+        names = {}
+        for product in self.products:
+            slug = slugify(product.category)
+            by_category.setdefault(slug, []).append(product)
+            names.setdefault(slug, product.category)
+        self.by_category = {slug: tuple(items) for slug, items in by_category.items()}
+        self.categories = tuple(
+            Category(slug, names[slug], len(self.by_category[slug])) for slug in sorted(names, key=names.get)
+        )
+        self.last_modified = max([mtime] + [p.updated for p in self.products])
+
+    def __len__(self):
+        return len(self.products)
+
+    def get(self, product_id):
+        return self.by_id.get(product_id)
+
+    def page(self, category=None, page=1, per_page=PRODUCTS_PER_PAGE):
+        """Return one page of products, optionally restricted to a category slug"""
+        items = self.by_category.get(category, ()) if category else self.products
+        total = len(items)
+        pages = max(1, -(-total // per_page))
+        page = min(max(1, page), pages)
+        start = (page - 1) * per_page
+        return Page(items[start:start + per_page], category, page, per_page, total, pages)
+
+
+def _dated(product, previous, default):
+    """Fill in a missing `updated`: unchanged since previous keeps its timestamp, anything else gets default"""
+    if product.updated is not None:
+        return product
+    before = previous.get(product.id) if previous is not None else None
+    if before is not None and before._replace(updated=None) == product:
+        return product._replace(updated=before.updated)
+    return product._replace(updated=default)
+
+
+def load_catalog(path=None, previous=None):
+    """Load a catalog from a JSON file or an SQLite database.
+
+    Records without an `updated` value get the file's mtime, except those
+    unchanged since the previous catalog, which keep their timestamp, so an
+    edit only dates (and purges) the products it touched.
+    """
+    path = path or os.environ.get('CATALOG_PATH', DEFAULT_CATALOG_PATH)
+    mtime = os.path.getmtime(path)
+    if path.endswith(('.db', '.sqlite', '.sqlite3')):
+        rows = _read_sqlite(path)
+    else:
+        rows = _read_json(path)
+    return Catalog([_dated(_make_product(row), previous, mtime) for row in rows], source=path, mtime=mtime)
+
+
+_catalog = None
+_lock = threading.Lock()
+_listeners = []
+
+
+def get_catalog():
+    """Return the shared catalog, loading it on first use"""
+    global _catalog
+    if _catalog is None:
+        with _lock:
+            if _catalog is None:
+                _catalog = load_catalog()
+    return _catalog
+
+
+def set_catalog(new_catalog):
+    """Swap in a new catalog and notify listeners with (old, new)"""
+    global _catalog
+    with _lock:
+        old, _catalog = _catalog, new_catalog
+    for listener in list(_listeners):
+        listener(old, new_catalog)
+    return new_catalog
+
+
+def reload_catalog(path=None):
+    return set_catalog(load_catalog(path, previous=_catalog))
+
+
+def on_change(listener):
+    """Register a callback run after the catalog is replaced; usable as a decorator"""
+    _listeners.append(listener)
+    return listener
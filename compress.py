@@ -0,0 +1,209 @@
+"""Response compression with a memoized cache of compressed variants"""
+import gzip
+import hashlib
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+from lru import LRUCache
+from metrics import timed
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses without a body to compress (206 bodies are byte ranges of the identity encoding)
+NO_BODY_STATUSES = (204, 206, 304)
+
+# Responses smaller than this are sent as-is; headers would eat the savings
+MIN_SIZE = 1024
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'text/javascript',
+    'application/javascript', 'application/json', 'application/ld+json',
+    'application/manifest+json', 'application/xml', 'image/svg+xml',
+}
+
+# File extensions written as precompressed siblings under static/
+STATIC_EXTENSIONS = ('.css', '.js', '.json', '.html', '.svg', '.txt', '.xml')
+
+# encoding -> (static sibling suffix, compress(data, best)); `best` is used for
+# bodies that are compressed once and reused, a cheaper level otherwise
+ENCODERS = OrderedDict()
+if zstandard is not None:
+    ENCODERS['zstd'] = ('.zst', lambda data, best: zstandard.ZstdCompressor(level=19 if best else 3).compress(data))
+if brotli is not None:
+    ENCODERS['br'] = ('.br', lambda data, best: brotli.compress(data, quality=11 if best else 4))
+ENCODERS['gzip'] = ('.gz', lambda data, best: gzip.compress(data, compresslevel=9 if best else 6, mtime=0))
+ENCODERS['deflate'] = (None, lambda data, best: zlib.compress(data, 9 if best else 6))
+
+
+# Compressed bodies keyed by (validator, encoding), bounded by their total bytes
+variants = LRUCache(32 * 1024 * 1024, sizeof=len)
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _record(encoding, bytes_in, bytes_out, cpu_seconds, cached):
+    with _stats_lock:
+        entry = _stats.setdefault(encoding, {
+            'responses': 0, 'cache_hits': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_seconds': 0.0,
+        })
+        entry['responses'] += 1
+        entry['cache_hits'] += cached
+        entry['bytes_in'] += bytes_in
+        entry['bytes_out'] += bytes_out
+        entry['cpu_seconds'] += cpu_seconds
+
+
+def stats():
+    """Per-encoding totals: CPU seconds spent compressing against bytes saved"""
+    with _stats_lock:
+        report = {}
+        for encoding, entry in _stats.items():
+            saved = entry['bytes_in'] - entry['bytes_out']
+            report[encoding] = dict(
+                entry,
+                bytes_saved=saved,
+                ms_per_mb_saved=(entry['cpu_seconds'] * 1000 / (saved / 1048576)) if saved > 0 else 0.0,
+            )
+        return report
+
+
+def negotiate():
+    """Pick the client's preferred supported encoding, or None for identity"""
+    return request.accept_encodings.best_match(list(ENCODERS))
+
+
+def compress(encoding, data, best=False):
+    """Compress data with an encoding, recording CPU time spent"""
+    start = time.thread_time()
+    body = ENCODERS[encoding][1](data, best)
+    _record(encoding, len(data), len(body), time.thread_time() - start, False)
+    return body
+
+
+def _static_variant(path, encoding):
+    """Body for a static file in the given encoding, from its precompressed sibling if present"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (path, stat.st_mtime_ns, encoding)
+    body = variants.get(key)
+    if body is not None:
+        _record(encoding, stat.st_size, len(body), 0.0, True)
+        return body
+    suffix = ENCODERS[encoding][0]
+    sibling = path + suffix if suffix else None
+    if sibling and os.path.exists(sibling) and os.path.getmtime(sibling) >= stat.st_mtime:
+        with open(sibling, 'rb') as f:
+            body = f.read()
+        _record(encoding, stat.st_size, len(body), 0.0, True)
+    else:
+        with open(path, 'rb') as f:
+            body = compress(encoding, f.read(), best=True)
+    variants.set(key, body)
+    return body
+
+
+@timed('compress')
+def compress_response(response, static_path=None):
+    """Compress an eligible response for the negotiated encoding.
+
+    Any status with a body qualifies, error pages included. Responses with an
+    ETag (page-cached pages, static files) and error pages are compressed once
+    per encoding and served from the variant cache afterwards. static_path is the
+    file behind a send_file response, whose precompressed sibling is preferred.
+    """
+    response.vary.add('Accept-Encoding')
+    if (response.status_code in NO_BODY_STATUSES or response.status_code < 200
+            or response.is_streamed and static_path is None
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    encoding = negotiate()
+    if encoding is None:
+        return response
+
+    etag, weak = response.get_etag()
+    if static_path is not None:
+        if os.path.getsize(static_path) < MIN_SIZE:
+            return response
+        body = _static_variant(static_path, encoding)
+        if body is None:
+            return response
+        response.direct_passthrough = False
+    else:
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+        if etag and not weak:
+            key = (etag, encoding)
+        elif response.status_code >= 400:
+            # Error pages have no ETag but repeat verbatim (bot scans hit the same 404)
+            key = (hashlib.sha1(data).hexdigest(), encoding)
+        else:
+            key = None
+        body = variants.get(key) if key else None
+        if body is None:
+            body = compress(encoding, data, best=key is not None)
+            if key:
+                variants.set(key, body)
+        else:
+            _record(encoding, len(data), len(body), 0.0, True)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        # A distinct validator per representation; page_cache matches the suffix
+        response.set_etag(f'{etag}-{encoding}', weak)
+        if static_path is not None and request.if_none_match:
+            # send_file compared If-None-Match with the identity ETag; compare the client's
+            # copy of this representation's ETag now (a 304 drops Content-Encoding and the body)
+            response.make_conditional(request)
+    return response
+
+
+def precompress_static(static_folder):
+    """Write .gz (and .br/.zst when available) siblings for compressible static files.
+
+    Siblings are only rewritten when older than their source. Returns the number
+    of files written; a read-only static folder is left alone.
+    """
+    written = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if not name.endswith(STATIC_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            if os.path.getsize(path) < MIN_SIZE:
+                continue
+            with open(path, 'rb') as f:
+                data = None
+                for encoding, (suffix, _) in ENCODERS.items():
+                    if suffix is None:
+                        continue
+                    sibling = path + suffix
+                    if os.path.exists(sibling) and os.path.getmtime(sibling) >= os.path.getmtime(path):
+                        continue
+                    if data is None:
+                        data = f.read()
+                    try:
+                        with open(sibling, 'wb') as out:
+                            out.write(compress(encoding, data, best=True))
+                    except OSError:
+                        return written
+                    written += 1
+    return written
@@ -0,0 +1,22 @@
+"""Forms; imported on first use so flask_wtf, wtforms and email_validator stay out of startup"""
+from flask_wtf import FlaskForm
+from wtforms import StringField, TextAreaField, SelectField, EmailField, TelField
+from wtforms.validators import DataRequired, Email, Length
+
+
+class ContactForm(FlaskForm):
+    name = StringField('Full Name', validators=[DataRequired(), Length(min=2, max=100)])
+    email = EmailField('Email Address', validators=[DataRequired(), Email()])
+    phone = TelField('Phone Number', validators=[Length(min=10, max=15)])
+    subject = SelectField('Subject', choices=[
+        ('general', 'General Inquiry'),
+        ('quote', 'Request Quote'),
+        ('support', 'Technical Support'),
+        ('partnership', 'Partnership Opportunity')
+    ], validators=[DataRequired()])
+    message = TextAreaField('Message', validators=[DataRequired(), Length(min=10, max=1000)])
+
+
+def preload():
+    """Import the whole validation stack now; the Email() validator imports email_validator on first call"""
+    import email_validator  # noqa: F401
@@ -0,0 +1,324 @@
+"""Static export: render every public route to files nginx can serve without Python.
+
+Only `flask freeze` (declared in app.py) imports this module.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from urllib.parse import urlsplit
+
+import click
+from flask import template_rendered, url_for
+from jinja2 import meta
+
+import compress
+import page_cache
+from catalog import get_catalog
+from seo import SEO_CONFIG
+from sitemaps import LASTMOD_TEMPLATES, STATIC_PAGES, get_sitemaps
+
+MANIFEST_NAME = '.freeze-manifest.json'
+NGINX_MAP_NAME = 'nginx-urls.map'
+
+# Bump when the output layout changes so the next build starts from scratch
+FREEZE_VERSION = 1
+
+# Extension for files whose URL has none (or has a query string)
+EXTENSIONS = {
+    'text/html': '.html',
+    'application/ld+json': '.jsonld',
+    'application/json': '.json',
+    'application/xml': '.xml',
+    'text/plain': '.txt',
+    'image/webp': '.webp',
+    'image/jpeg': '.jpg',
+}
+
+_IMAGE_URLS = re.compile(rb'/img/\d+/[^"\s,?]+(?:\?fm=\w+)?')
+_SITEMAP_URLS = re.compile(r'^/sitemap(?:_index|-\d+)?\.xml(?:\.gz)?$')
+
+# Set in the parent before the pool forks; workers render with their own test client
+_app = None
+_out_dir = None
+
+
+def output_path(url, mimetype):
+    """Relative file for a URL: '/about' -> 'about/index.html', '/products?page=2' -> 'products/index@page=2.html'"""
+    parts = urlsplit(url)
+    path = parts.path.lstrip('/')
+    ext = EXTENSIONS.get(mimetype, '')
+    if not path or path.endswith('/') or '.' not in path.rsplit('/', 1)[-1]:
+        path = path.rstrip('/') + '/index' if path else 'index'
+        path += f'@{parts.query}{ext}' if parts.query else ext
+    elif parts.query:
+        path += f'@{parts.query}{ext}'
+    return path
+
+
+def frozen_urls(app, catalog):
+    """Every URL of the public site; /contact, /search and the POST APIs stay dynamic"""
+    with app.test_request_context(base_url=SEO_CONFIG['site_url']):
+        urls = [url_for(endpoint) for endpoint in ('home', 'about', 'privacy_policy', 'terms_of_service', 'robots')]
+        urls.append(url_for('api_schema', page_type='organization'))
+        for category in [None] + [c.slug for c in catalog.categories]:
+            listing = catalog.page(category, 1)
+            for endpoint, args in (('products', {}), ('api_schema', {'page_type': 'products'})):
+                # Links come both with and without an explicit page=1
+                urls.append(url_for(endpoint, category=category, **args))
+                urls.extend(url_for(endpoint, category=category, page=page, **args)
+                            for page in range(1, listing.pages + 1))
+        urls.extend(url_for('product_detail', product_id=product.id) for product in catalog.products)
+
+        sitemaps = get_sitemaps(catalog, {page.endpoint: url_for(page.endpoint) for page in STATIC_PAGES})
+        urls.extend(('/sitemap.xml', '/sitemap_index.xml', '/sitemap_index.xml.gz'))
+        for number in range(1, sitemaps.count + 1):
+            urls.extend((f'/sitemap-{number}.xml', f'/sitemap-{number}.xml.gz'))
+    return list(dict.fromkeys(urls))
+
+
+def _digest(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()[:32]
+
+
+def code_fingerprint(app, manifest):
+    """Changes to any module or static asset can touch every page"""
+    modules = sorted(name for name in os.listdir(app.root_path) if name.endswith('.py'))
+    parts = [FREEZE_VERSION, json.dumps(manifest.hashed, sort_keys=True)]
+    for name in modules:
+        with open(os.path.join(app.root_path, name), 'rb') as f:
+            parts.extend((name, f.read()))
+    return _digest(*parts)
+
+
+def template_dependencies(env):
+    """(template -> source digest, template -> every template it extends or includes)"""
+    digests = {}
+    direct = {}
+    for name in env.list_templates(extensions=('html', 'xml', 'txt')):
+        source = env.loader.get_source(env, name)[0]
+        digests[name] = _digest(source)
+        direct[name] = {ref for ref in meta.find_referenced_templates(env.parse(source)) if ref}
+    closure = {}
+    for name in direct:
+        seen, stack = set(), [name]
+        while stack:
+            current = stack.pop()
+            if current not in seen:
+                seen.add(current)
+                stack.extend(direct.get(current, ()))
+        closure[name] = seen
+    return digests, closure
+
+
+def data_fingerprints(catalog, catalog_keys):
+    """Surrogate key -> digest of the data behind it"""
+    whole = _digest(*(repr(product) for product in catalog.products))
+    keys = {key: whole for key in catalog_keys}
+    keys.update((f'product-{product.id}', _digest(repr(product))) for product in catalog.products)
+    return keys
+
+
+def _write(relpath, body, mimetype):
+    path = os.path.join(_out_dir, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    files = [(path, body)]
+    if mimetype in compress.COMPRESSIBLE_TYPES and len(body) >= compress.MIN_SIZE:
+        files.extend((path + suffix, compress.compress(encoding, body, best=True))
+                     for encoding, (suffix, _) in compress.ENCODERS.items() if suffix)
+    for target, data in files:
+        tmp = f'{target}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, target)
+
+
+def _render_batch(urls):
+    """Runs in a pool worker: render URLs through the test client and write their files"""
+    client = _app.test_client()
+    results = []
+    for url in urls:
+        rendered = []
+
+        def record(sender, template, context, **extra):
+            rendered.append(template.name)
+
+        with template_rendered.connected_to(record, _app):
+            response = client.get(url, base_url=SEO_CONFIG['site_url'])
+        if response.status_code != 200 or 'Set-Cookie' in response.headers:
+            results.append({'url': url, 'error': f'HTTP {response.status_code}'})
+            continue
+        body = response.get_data()
+        relpath = output_path(url, response.mimetype)
+        _write(relpath, body, response.mimetype)
+        results.append({
+            'url': url,
+            'file': relpath,
+            'templates': rendered,
+            'keys': response.headers.get('Surrogate-Key', '').split(),
+            'etag': _digest(body),
+            'images': sorted({m.decode() for m in _IMAGE_URLS.findall(body)}) if response.mimetype == 'text/html'
+            else [],
+        })
+    return results
+
+
+def _init_worker():
+    # A fresh page cache so every page really renders and records its templates
+    page_cache.invalidate()
+
+
+def _render_all(urls, jobs):
+    # Imported here so the app does not load multiprocessing at startup
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    if not urls:
+        return []
+    if jobs <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        _init_worker()
+        return _render_batch(urls)
+    chunk = max(1, min(64, len(urls) // (jobs * 4) or 1))
+    batches = [urls[i:i + chunk] for i in range(0, len(urls), chunk)]
+    results = []
+    with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context('fork'), initializer=_init_worker) as pool:
+        for batch in pool.map(_render_batch, batches):
+            results.extend(batch)
+    return results
+
+
+def copy_static(app, manifest, out_dir):
+    """Copy static files under both their plain and fingerprinted names, with compressed siblings"""
+    copied = 0
+    for filename, hashed in manifest.hashed.items():
+        source = os.path.join(app.static_folder, filename)
+        for name in (filename, hashed):
+            for suffix in ('',) + tuple(s for s, _ in compress.ENCODERS.values() if s):
+                src = source + suffix
+                dest = os.path.join(out_dir, 'static', name + suffix)
+                if not os.path.exists(src):
+                    continue
+                if os.path.exists(dest) and os.path.getmtime(dest) >= os.path.getmtime(src):
+                    continue
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                shutil.copy2(src, dest)
+                copied += 1
+    return copied
+
+
+def _remove(out_dir, relpath):
+    for suffix in ('',) + tuple(s for s, _ in compress.ENCODERS.values() if s):
+        try:
+            os.remove(os.path.join(out_dir, relpath + suffix))
+        except FileNotFoundError:
+            pass
+
+
+def write_nginx_map(out_dir, pages):
+    """`map $request_uri $frozen { include nginx-urls.map; }` resolves query-string URLs to their files"""
+    lines = [f'"{url}" /{page["file"]};\n' for url, page in sorted(pages.items())]
+    with open(os.path.join(out_dir, NGINX_MAP_NAME), 'w') as f:
+        f.writelines(lines)
+
+
+def freeze(app, manifest, out_dir, jobs=None, force=False, catalog_keys=()):
+    """Render the site into out_dir, re-rendering only pages whose code, templates or data changed"""
+    global _app, _out_dir
+    start = time.perf_counter()
+    jobs = jobs or os.cpu_count() or 1
+    out_dir = os.path.abspath(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    previous = {}
+    if not force and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+
+    catalog = get_catalog()
+    code = code_fingerprint(app, manifest)
+    templates, closure = template_dependencies(app.jinja_env)
+    keys = data_fingerprints(catalog, catalog_keys)
+    if previous.get('code') != code:
+        previous = {}
+    old_pages = previous.get('pages', {})
+    old_templates = previous.get('templates', {})
+    old_keys = previous.get('keys', {})
+
+    def stale(url):
+        page = old_pages.get(url)
+        if page is None:
+            return True
+        if any(old_templates.get(name) != templates.get(name) for name in page['templates']):
+            return True
+        return any(old_keys.get(key) != keys.get(key) for key in page['keys'])
+
+    urls = frozen_urls(app, catalog)
+    todo = [url for url in urls if stale(url)]
+    _app, _out_dir = app, out_dir
+    results = _render_all(todo, jobs)
+
+    pages = {url: old_pages[url] for url in urls if url not in todo}
+    errors = []
+    images = set()
+    rendered = 0
+    for result in results:
+        if 'error' in result:
+            errors.append((result['url'], result['error']))
+            continue
+        names = result.pop('templates')
+        if _SITEMAP_URLS.match(result['url']):
+            # Sitemaps render no templates, but their <lastmod> dates come from template mtimes
+            names += LASTMOD_TEMPLATES
+        used = set()
+        for name in names:
+            used |= closure.get(name, {name})
+        result['templates'] = sorted(used)
+        images.update(result.pop('images'))
+        pages[result.pop('url')] = result
+        rendered += 1
+    # Derivative URLs are fingerprinted, so an existing file is always current
+    pages.update((url, old_pages[url]) for url in images if url in old_pages)
+    for result in _render_all(sorted(url for url in images if url not in old_pages), jobs):
+        if 'error' in result:
+            # Open Graph tags may name images that have not been added to static/ yet
+            if result['error'] != 'HTTP 404':
+                errors.append((result['url'], result['error']))
+            continue
+        pages[result['url']] = {'file': result['file'], 'templates': [], 'keys': [], 'etag': result['etag']}
+        rendered += 1
+
+    removed = [url for url in old_pages if url not in pages]
+    for url in removed:
+        _remove(out_dir, old_pages[url]['file'])
+
+    copied = copy_static(app, manifest, out_dir)
+    write_nginx_map(out_dir, pages)
+    with open(manifest_path, 'w') as f:
+        json.dump({'version': FREEZE_VERSION, 'code': code, 'templates': templates, 'keys': keys, 'pages': pages},
+                  f, indent=1, sort_keys=True)
+    return {
+        'pages': len(pages),
+        'rendered': rendered,
+        'skipped': len(urls) - len(todo),
+        'removed': len(removed),
+        'static_files': copied,
+        'errors': errors,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def main(app, manifest, out_dir, jobs=None, force=False, catalog_keys=()):
+    """`flask freeze`: freeze the site and report; exits 1 when a page failed to render"""
+    stats = freeze(app, manifest, out_dir, jobs, force, catalog_keys)
+    click.echo(f"{stats['rendered']} rendered, {stats['skipped']} unchanged, {stats['removed']} removed, "
+               f"{stats['static_files']} static files copied in {stats['seconds']:.1f}s -> {out_dir}")
+    for url, error in stats['errors']:
+        click.echo(f'failed: {url} ({error})', err=True)
+    if stats['errors']:
+        raise SystemExit(1)
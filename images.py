@@ -0,0 +1,228 @@
+"""Width-bucketed WebP/JPEG image derivatives, resized in a process pool and cached on disk"""
+import hashlib
+import os
+import threading
+from concurrent.futures import Future
+
+from flask import abort, redirect, request, send_file, url_for
+from markupsafe import Markup, escape
+from werkzeug.security import safe_join
+
+from assets import IMMUTABLE_MAX_AGE, fingerprint
+from process_local import ProcessLocal
+
+# Only these widths are rendered, so the cache cannot be flooded with arbitrary sizes
+WIDTHS = (320, 480, 640, 960, 1200, 1600, 1920)
+
+FORMATS = {'webp': ('image/webp', 'webp'), 'jpeg': ('image/jpeg', 'jpg')}
+QUALITY = {'webp': 80, 'jpeg': 82}
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# Bump when _resize() output changes so old derivatives are not reused
+PIPELINE_VERSION = 1
+
+# Derivatives of unhashed paths change whenever the source does
+LEGACY_MAX_AGE = 86400  # 1 day
+
+
+class ImageBusy(Exception):
+    """Raised when the resize queue is full; the view answers 503"""
+
+
+def _resize(source, dest, width, fmt, quality):
+    """Runs in a pool process: write a width-wide fmt derivative of source to dest"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        if fmt == 'jpeg' and image.mode != 'RGB':
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif fmt == 'webp' and image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        tmp = f'{dest}.{os.getpid()}.tmp'
+        if fmt == 'jpeg':
+            image.save(tmp, 'JPEG', quality=quality, optimize=True, progressive=True)
+        else:
+            image.save(tmp, 'WEBP', quality=quality, method=4)
+    os.replace(tmp, dest)
+    return dest
+
+
+class _ResizeState:
+    """One process's resize pool and in-flight resizes"""
+
+    def __init__(self):
+        self.pool = None
+        self.inflight = {}
+
+
+class ImageService:
+    """Serves /img/<width>/<path> derivatives of images under the static folder.
+
+    Derivatives are content addressed: the cache file name hashes the source
+    fingerprint, width, format and quality, so a changed source never serves a
+    stale derivative and every worker shares the same files. Concurrent misses
+    for one derivative share a single resize, and resizes run in a small
+    process pool with a bounded backlog.
+    """
+
+    def __init__(self, static_folder, cache_dir, manifest=None, max_workers=None, max_pending=64):
+        self.static_folder = static_folder
+        self.cache_dir = cache_dir
+        self.manifest = manifest
+        self.max_workers = max_workers or int(os.environ.get('IMAGE_WORKERS', 0)) or min(2, os.cpu_count() or 1)
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+        # Pools do not survive fork: each worker process starts its own, on its first resize
+        self._state = ProcessLocal(_ResizeState)
+
+    def source(self, filename):
+        """(absolute source path, is_fingerprinted) for a static filename, or (None, False)"""
+        fingerprinted = False
+        if self.manifest is not None:
+            filename, fingerprinted = self.manifest.resolve(filename)
+        if not filename.lower().endswith(SOURCE_EXTENSIONS):
+            return None, False
+        path = safe_join(self.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            return None, False
+        return path, fingerprinted
+
+    def _fingerprint(self, path):
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = self._fingerprints.get(path)
+        if cached is None or cached[0] != stamp:
+            cached = self._fingerprints[path] = (stamp, fingerprint(path, 32))
+        return cached[1]
+
+    def derivative(self, path, width, fmt):
+        """Path of the cached derivative, resizing it first if needed"""
+        quality = QUALITY[fmt]
+        key = hashlib.sha256(
+            f'{self._fingerprint(path)}:{width}:{fmt}:{quality}:{PIPELINE_VERSION}'.encode()
+        ).hexdigest()
+        dest = os.path.join(self.cache_dir, key[:2], f'{key}.{FORMATS[fmt][1]}')
+        if os.path.exists(dest):
+            return dest
+
+        inflight = self._state.get().inflight
+        with self._lock:
+            future = inflight.get(key)
+            owner = future is None
+            if owner:
+                if not self._pending.acquire(blocking=False):
+                    raise ImageBusy()
+                future = inflight[key] = Future()
+        if owner:
+            try:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                future.set_result(self._resize(path, dest, width, fmt, quality))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del inflight[key]
+                self._pending.release()
+        return future.result()
+
+    def _executor(self):
+        state = self._state.get()
+        with self._lock:
+            if state.pool is None:
+                # Only workers that resize pay for importing multiprocessing
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                state.pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+            return state.pool
+
+    def _resize(self, *args):
+        """Run _resize in the pool, replacing the pool once if a pool process died"""
+        from concurrent.futures.process import BrokenProcessPool
+        for attempt in range(2):
+            pool = self._executor()
+            try:
+                return pool.submit(_resize, *args).result()
+            except BrokenProcessPool:
+                # A killed child (OOM, segfault) breaks the pool for good; every
+                # later submit would fail until it is replaced
+                state = self._state.get()
+                with self._lock:
+                    if state.pool is pool:
+                        state.pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+                if attempt:
+                    raise
+
+    def negotiate(self):
+        """Explicit ?fm= wins; otherwise WebP for clients that accept it"""
+        fmt = request.args.get('fm')
+        if fmt in FORMATS:
+            return fmt, False
+        return ('webp' if 'image/webp' in request.accept_mimetypes else 'jpeg'), True
+
+    def url(self, filename, width, fmt=None):
+        filename = self.manifest.url_filename(filename) if self.manifest is not None else filename
+        url = f'{request.script_root}/img/{width}/{filename}'
+        return f'{url}?fm={fmt}' if fmt else url
+
+    def srcset(self, filename, widths=WIDTHS, fmt=None):
+        return ', '.join(f'{self.url(filename, width, fmt)} {width}w' for width in widths)
+
+    def responsive_image(self, filename, alt='', sizes='100vw', widths=WIDTHS, **attrs):
+        """<picture> with WebP and JPEG srcsets; empty when the source image does not exist"""
+        if self.source(filename)[0] is None:
+            return Markup('')
+        attributes = ''.join(f' {escape(name.rstrip("_").replace("_", "-"))}="{escape(value)}"'
+                             for name, value in attrs.items())
+        default = widths[len(widths) // 2]
+        return Markup(
+            f'<picture class="contents">'
+            f'<source type="image/webp" srcset="{escape(self.srcset(filename, widths, "webp"))}" sizes="{escape(sizes)}">'
+            f'<img src="{escape(self.url(filename, default, "jpeg"))}" '
+            f'srcset="{escape(self.srcset(filename, widths, "jpeg"))}" sizes="{escape(sizes)}" '
+            f'alt="{escape(alt)}" loading="lazy" decoding="async"{attributes}>'
+            f'</picture>'
+        )
+
+    def init_app(self, app):
+        """Register the /img/<width>/<path> route and the srcset template helpers"""
+        service = self
+
+        def image(width, filename):
+            path, fingerprinted = service.source(filename)
+            if path is None:
+                abort(404)
+            if width not in WIDTHS:
+                # Other widths redirect to the bucket that covers them, so the
+                # cache only ever holds the fixed sizes
+                bucket = next((bucket for bucket in WIDTHS if bucket >= width), WIDTHS[-1])
+                response = redirect(url_for('image', width=bucket, filename=filename, **request.args), 301)
+                response.cache_control.max_age = LEGACY_MAX_AGE
+                return response
+            fmt, negotiated = service.negotiate()
+            try:
+                derivative = service.derivative(path, width, fmt)
+            except ImageBusy:
+                response = app.response_class('Image service busy', status=503, mimetype='text/plain')
+                response.headers['Retry-After'] = '2'
+                return response
+            response = send_file(derivative, mimetype=FORMATS[fmt][0], etag=os.path.basename(derivative),
+                                 conditional=True)
+            if negotiated:
+                response.vary.add('Accept')
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE if fingerprinted else LEGACY_MAX_AGE
+            response.cache_control.immutable = fingerprinted or None
+            return response
+
+        app.add_url_rule('/img/<int:width>/<path:filename>', 'image', image)
+        app.add_template_global(self.responsive_image, 'responsive_image')
+        app.add_template_global(self.srcset, 'srcset')
+        app.add_template_global(self.url, 'image_url')
+        return self
@@ -0,0 +1,67 @@
+"""Thread-safe bounded LRU mapping shared by the page, fragment, compressed-variant and search-result caches"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Mapping that evicts least recently used entries once their total size exceeds max_size.
+
+    Each entry's size is sizeof(value), 1 by default, so max_size is an entry
+    count unless sizeof measures something else (bytes, for compressed bodies).
+    """
+
+    def __init__(self, max_size, sizeof=None):
+        self.max_size = max_size
+        self.size = 0
+        self._sizeof = sizeof
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _weigh(self, value):
+        return self._sizeof(value) if self._sizeof is not None else 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, touch=True):
+        """The value for key, or None; touch=False leaves its recency alone"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None and touch:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= self._weigh(old)
+            self._entries[key] = value
+            self.size += self._weigh(value)
+            while self.size > self.max_size and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= self._weigh(evicted)
+
+    def pop(self, key):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self.size -= self._weigh(value)
+            return value
+
+    def discard_where(self, predicate):
+        """Remove every entry for which predicate(key, value) is true; returns how many"""
+        with self._lock:
+            stale = [(key, value) for key, value in self._entries.items() if predicate(key, value)]
+            for key, value in stale:
+                del self._entries[key]
+                self.size -= self._weigh(value)
+            return len(stale)
+
+    def clear(self):
+        """Remove everything; returns how many entries there were"""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self.size = 0
+            return count
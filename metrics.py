@@ -0,0 +1,344 @@
+"""Per-request phase timing, Server-Timing headers and Prometheus metrics shared across workers.
+
+Everything is off unless METRICS=1 (histograms and /metrics, which needs
+Authorization: Bearer $METRICS_TOKEN) or SERVER_TIMING=1 (the response header)
+is set when the app starts. Disabled, timed() returns
+functions unchanged and phase() a shared no-op context manager.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+try:
+    import fcntl
+except ImportError:  # Windows: no gunicorn master retiring workers
+    fcntl = None
+
+from flask import before_render_template, g, request, template_rendered
+
+from auth import require_token
+from cache_policy import no_store
+from process_local import ProcessLocal
+
+ENABLED = os.environ.get('METRICS', '') in ('1', 'true', 'yes')
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '') in ('1', 'true', 'yes')
+TIMING = ENABLED or SERVER_TIMING
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'metrics')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Each worker rewrites its own file at most this often; /metrics sums every file
+FLUSH_INTERVAL = 1.0
+
+# Counts of workers that have exited, kept next to the live workers' files
+TOTALS_FILE = 'totals.json'
+
+_NOOP = nullcontext()
+
+
+class _Phase:
+    """A timed span of a request. Its phase is charged the time not spent in
+    phases nested inside it, so phases never overlap and sum to at most the total."""
+
+    __slots__ = ('name', 'start', 'nested', 'stack')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        try:
+            self.stack = g.get('_phase_stack')
+        except RuntimeError:  # outside an app context (boot, freeze, benchmarks)
+            self.stack = None
+        if self.stack is not None:
+            self.stack.append(self)
+        self.nested = 0.0
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        stack = self.stack
+        if stack is None or self not in stack:
+            return
+        elapsed = time.perf_counter() - self.start
+        # Spans left open by an exception (a render that raised) end with this one
+        while stack.pop() is not self:
+            pass
+        if stack:
+            stack[-1].nested += elapsed
+        phases = g._phases
+        phases[self.name] = phases.get(self.name, 0.0) + elapsed - self.nested
+
+
+def phase(name):
+    """Context manager adding the enclosed time to this request's `name` phase"""
+    return _Phase(name) if TIMING else _NOOP
+
+
+def timed(name):
+    """Decorator counting a function's time towards a request phase; a no-op when timing is off"""
+    def decorator(f):
+        if not TIMING:
+            return f
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with _Phase(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _histogram(buckets):
+    return {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+
+
+def _observe(histogram, bounds, value):
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            break
+    else:
+        i = len(bounds)
+    histogram['buckets'][i] += 1
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+
+def _merge(into, other):
+    for name, value in other.items():
+        if isinstance(value, dict):
+            _merge(into.setdefault(name, {}), value)
+        elif isinstance(value, list):
+            current = into.setdefault(name, [0] * len(value))
+            for i, v in enumerate(value):
+                current[i] += v
+        else:
+            into[name] = into.get(name, 0) + value
+
+
+class MetricsStore:
+    """Per-process counters, flushed to one JSON file per worker pid in a shared directory.
+
+    When a worker exits, the master folds its file into TOTALS_FILE (retire()),
+    so the directory holds one file per live worker and counters only go down
+    when it is cleared (reset(), at deploy).
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.environ.get('METRICS_DIR', DEFAULT_DIR)
+        self._lock = threading.Lock()
+        # Counters do not survive fork: each worker starts from its own file
+        self._data = ProcessLocal(self._load)
+        self._next_flush = 0.0
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'worker-{pid}.json')
+
+    def _load(self):
+        data = {'latency': {}, 'size': {}, 'status': {}, 'phases': {}}
+        try:
+            with open(self._path(os.getpid())) as f:
+                _merge(data, json.load(f))
+        except (OSError, ValueError):
+            pass
+        return data
+
+    def observe(self, route, status, seconds, size, phases):
+        data = self._data.get()
+        with self._lock:
+            latency = data['latency'].get(route)
+            if latency is None:
+                latency = data['latency'][route] = _histogram(LATENCY_BUCKETS)
+            _observe(latency, LATENCY_BUCKETS, seconds)
+            if size is not None:
+                sizes = data['size'].get(route)
+                if sizes is None:
+                    sizes = data['size'][route] = _histogram(SIZE_BUCKETS)
+                _observe(sizes, SIZE_BUCKETS, size)
+            statuses = data['status'].setdefault(route, {})
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            route_phases = data['phases'].setdefault(route, {})
+            for name, duration in phases.items():
+                route_phases[name] = route_phases.get(name, 0.0) + duration
+            due = time.monotonic() >= self._next_flush
+        if due:
+            self.flush()
+
+    def flush(self):
+        data = self._data.peek()
+        if data is None:
+            return
+        with self._lock:
+            payload = json.dumps(data, separators=(',', ':'))
+            self._next_flush = time.monotonic() + FLUSH_INTERVAL
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(payload)
+        os.replace(tmp, path)
+
+    def collect(self):
+        """Counters summed over every worker file"""
+        self.flush()
+        total = {'latency': {}, 'size': {}, 'status': {}, 'phases': {}}
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return total
+        for name in names:
+            if not (name.startswith('worker-') and name.endswith('.json') or name == TOTALS_FILE):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    _merge(total, json.load(f))
+            except (OSError, ValueError):
+                continue
+        return total
+
+    def retire(self, pid):
+        """Fold an exited worker's file into TOTALS_FILE; call from the master (gunicorn child_exit)"""
+        path = self._path(pid)
+        try:
+            with open(path) as f:
+                counts = json.load(f)
+        except FileNotFoundError:
+            return False
+        except ValueError:
+            counts = {}
+        totals_path = os.path.join(self.directory, TOTALS_FILE)
+        # Both masters retire workers during a USR2 deploy
+        with open(os.path.join(self.directory, '.totals.lock'), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            totals = {'latency': {}, 'size': {}, 'status': {}, 'phases': {}}
+            try:
+                with open(totals_path) as f:
+                    _merge(totals, json.load(f))
+            except (OSError, ValueError):
+                pass
+            _merge(totals, counts)
+            tmp = f'{totals_path}.tmp'
+            with open(tmp, 'w') as f:
+                f.write(json.dumps(totals, separators=(',', ':')))
+            os.replace(tmp, totals_path)
+            os.remove(path)
+        return True
+
+    def discard(self):
+        """Drop this process's unflushed counters, e.g. after warm-up requests"""
+        with self._lock:
+            self._data.reset()
+
+    def reset(self):
+        """Delete every worker file and the totals; call from the master before workers start"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.startswith('worker-') or name == TOTALS_FILE:
+                os.remove(os.path.join(self.directory, name))
+
+
+store = MetricsStore()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(name, histograms, bounds, label):
+    lines = []
+    for key, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(bounds + ('+Inf',), histogram['buckets']):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label}="{_label(key)}",le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{label}="{_label(key)}"}} {histogram["sum"]}')
+        lines.append(f'{name}_count{{{label}="{_label(key)}"}} {histogram["count"]}')
+    return lines
+
+
+def render_prometheus(data):
+    """Prometheus text exposition format"""
+    lines = [
+        '# HELP greenfarm_request_duration_seconds Time from request start to the end of after_request.',
+        '# TYPE greenfarm_request_duration_seconds histogram',
+    ]
+    lines += _histogram_lines('greenfarm_request_duration_seconds', data['latency'], LATENCY_BUCKETS, 'route')
+    lines += [
+        '# HELP greenfarm_response_size_bytes Response body size as sent (after compression).',
+        '# TYPE greenfarm_response_size_bytes histogram',
+    ]
+    lines += _histogram_lines('greenfarm_response_size_bytes', data['size'], SIZE_BUCKETS, 'route')
+    lines += ['# HELP greenfarm_responses_total Responses by route and status.',
+              '# TYPE greenfarm_responses_total counter']
+    for route, statuses in sorted(data['status'].items()):
+        for status, count in sorted(statuses.items()):
+            lines.append(f'greenfarm_responses_total{{route="{_label(route)}",status="{status}"}} {count}')
+    lines += ['# HELP greenfarm_phase_seconds_total Time spent in each request phase, excluding phases nested in it.',
+              '# TYPE greenfarm_phase_seconds_total counter']
+    for route, phases in sorted(data['phases'].items()):
+        for name, seconds in sorted(phases.items()):
+            lines.append(f'greenfarm_phase_seconds_total{{route="{_label(route)}",phase="{name}"}} {seconds}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Install the timing hooks and /metrics; call before registering other after_request hooks.
+
+    Flask runs after_request hooks in reverse order, so this one runs last and
+    its total covers every other hook.
+    """
+    if not TIMING:
+        return
+
+    @app.before_request
+    def start_timer():
+        g._request_start = time.perf_counter()
+        g._phases = {}
+        g._phase_stack = []
+
+    def render_started(sender, template, context, **extra):
+        _Phase('render').__enter__()
+
+    def render_finished(sender, template, context, **extra):
+        for span in reversed(g.get('_phase_stack') or ()):
+            if span.name == 'render':
+                span.__exit__(None, None, None)
+                break
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+    @app.after_request
+    def finish_timer(response):
+        start = g.get('_request_start')
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        phases = g._phases
+        if SERVER_TIMING:
+            timings = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in phases.items()]
+            timings.append(f'total;dur={total * 1000:.2f}')
+            response.headers['Server-Timing'] = ', '.join(timings)
+        if ENABLED:
+            store.observe(request.endpoint or 'unmatched', response.status_code, total,
+                          response.content_length, phases)
+        return response
+
+    if ENABLED:
+        @require_token('METRICS_TOKEN')
+        def metrics_view():
+            return app.response_class(render_prometheus(store.collect()), mimetype='text/plain; version=0.0.4')
+
+        metrics_view.cache_policy = no_store()
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
+        atexit.register(store.flush)
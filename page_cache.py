@@ -0,0 +1,149 @@
+"""In-process cache for rendered pages with ETag/304 revalidation"""
+import hashlib
+import threading
+import time
+from collections import namedtuple
+
+from flask import Response, make_response, request, session
+
+from cache_policy import on_purge, surrogate_keys, sync_purges
+from lru import LRUCache
+from metrics import timed
+
+# Headers that are recomputed per response and never replayed from the cache
+_SKIP_HEADERS = {'content-length', 'set-cookie', 'etag', 'cache-control', 'date'}
+
+CachedPage = namedtuple('CachedPage', 'endpoint keys body status headers etag expires stale_until')
+
+
+class PageCache:
+    """Size-bounded LRU of rendered responses, each entry expiring after its max_age.
+
+    Within an entry's stale-while-revalidate window one request re-renders it
+    while concurrent requests for the same page keep getting the stale copy.
+    """
+
+    def __init__(self, max_entries=512):
+        self._entries = LRUCache(max_entries)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @timed('cache')
+    def get(self, key):
+        """Return a usable entry, or None after claiming the key for re-rendering"""
+        sync_purges()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            now = time.monotonic()
+            if entry.expires <= now:
+                if entry.stale_until > now and key in self._refreshing:
+                    self.stale_hits += 1
+                    return entry
+                if entry.stale_until <= now:
+                    self._entries.pop(key)
+                self._refreshing.add(key)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    def release(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def set(self, key, entry):
+        self._entries.set(key, entry)
+
+    def invalidate(self, *endpoints):
+        """Purge cached pages for the given endpoints, or everything if none are given"""
+        if not endpoints:
+            return self._entries.clear()
+        return self._entries.discard_where(lambda key, entry: entry.endpoint in endpoints)
+
+    def purge_keys(self, keys):
+        """Purge cached pages tagged with any of the surrogate keys, or everything for None"""
+        if keys is None:
+            return self._entries.clear()
+        return self._entries.discard_where(lambda key, entry: not keys.isdisjoint(entry.keys))
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'stale_hits': self.stale_hits,
+                    'misses': self.misses}
+
+
+page_cache = PageCache()
+
+
+def _cache_key(vary_args):
+    view_args = tuple(sorted((request.view_args or {}).items()))
+    query = tuple(request.args.get(arg) for arg in vary_args)
+    return (request.endpoint, view_args, query)
+
+
+def _etag_matches(etag):
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return False
+    if if_none_match.star_tag or etag in if_none_match:
+        return True
+    # Compressed representations carry an encoding suffix on the same hash
+    return any(tag.startswith(etag + '-') for tag in if_none_match.as_set())
+
+
+def _finish(entry):
+    if _etag_matches(entry.etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry.body, status=entry.status, headers=entry.headers)
+    response.set_etag(entry.etag)
+    return response
+
+
+def serve(view, args, kwargs, policy, vary_args=()):
+    """Serve a GET view from the page cache, rendering and storing it on a miss.
+
+    Cache-Control itself is set later from the view's policy (cache_policy.apply).
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return make_response(view(*args, **kwargs))
+
+    key = _cache_key(vary_args)
+    entry = page_cache.get(key)
+    if entry is not None:
+        return _finish(entry)
+    try:
+        response = make_response(view(*args, **kwargs))
+        if (response.status_code != 200 or response.is_streamed or session.accessed
+                or 'Set-Cookie' in response.headers):
+            return response
+        body = response.get_data()
+        now = time.monotonic()
+        entry = CachedPage(
+            endpoint=request.endpoint,
+            keys=frozenset(surrogate_keys(policy)),
+            body=body,
+            status=response.status_code,
+            headers=[(k, v) for k, v in response.headers.items() if k.lower() not in _SKIP_HEADERS],
+            etag=hashlib.sha256(body).hexdigest()[:32],
+            expires=now + policy.max_age,
+            stale_until=now + policy.max_age + (policy.stale_while_revalidate or 0),
+        )
+        page_cache.set(key, entry)
+    finally:
+        page_cache.release(key)
+    return _finish(entry)
+
+
+def invalidate(*endpoints):
+    """Hook for content or catalog changes: drop the affected cached pages"""
+    return page_cache.invalidate(*endpoints)
+
+
+on_purge(page_cache.purge_keys, local=True)
@@ -0,0 +1,48 @@
+"""State that belongs to one process and is rebuilt lazily after a fork"""
+import os
+import threading
+import weakref
+
+
+class ProcessLocal:
+    """A value built by factory() on first use in each process.
+
+    Threads, process pools, locks held at fork time and in-memory counters do
+    not carry over to a forked worker. A worker calling get() gets its own
+    fresh value instead of the copy inherited from the master, and the master
+    never builds one unless it uses it.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._pid = None
+        self._value = None
+        if hasattr(os, 'register_at_fork'):
+            # The lock may have been held by another thread when the process forked.
+            # A weak reference, so the hook does not keep discarded instances alive.
+            ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: ref() is not None and ref()._after_fork())
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def get(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return self._value
+        with self._lock:
+            if self._pid != pid:
+                self._value = self._factory()
+                self._pid = pid
+            return self._value
+
+    def peek(self):
+        """The value if this process has built one, else None; never builds it"""
+        return self._value if self._pid == os.getpid() else None
+
+    def reset(self):
+        """Drop this process's value; the next get() builds a new one"""
+        with self._lock:
+            self._pid = None
+            self._value = None
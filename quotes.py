@@ -0,0 +1,240 @@
+"""Durable quote and contact request ingestion with group-committed writes"""
+import atexit
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from process_local import ProcessLocal
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'quotes.db')
+
+_EMAIL = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
+
+# field -> (required, max length); anything else in the payload is dropped
+QUOTE_FIELDS = {
+    'name': (True, 100),
+    'email': (True, 254),
+    'phone': (True, 20),
+    'company': (False, 200),
+    'farmSize': (False, 50),
+    'cropType': (False, 50),
+    'location': (False, 200),
+    'quantity': (False, 100),
+    'message': (False, 1000),
+    'selectedProduct': (False, 50),
+}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    created REAL NOT NULL,
+    payload TEXT NOT NULL
+)
+'''
+
+
+class QueueFull(Exception):
+    """Raised when the write queue is at capacity; callers answer 503"""
+
+
+def validate_quote(data):
+    """Return (quote, errors) for a decoded JSON quote request"""
+    if not isinstance(data, dict):
+        return None, {'_': 'Expected a JSON object.'}
+    quote = {}
+    errors = {}
+    for field, (required, max_length) in QUOTE_FIELDS.items():
+        value = data.get(field)
+        if value is None or value == '':
+            if required:
+                errors[field] = 'This field is required.'
+            continue
+        if not isinstance(value, (str, int, float)):
+            errors[field] = 'Invalid value.'
+            continue
+        value = str(value).strip()
+        if required and not value:
+            errors[field] = 'This field is required.'
+        elif len(value) > max_length:
+            errors[field] = f'Must be at most {max_length} characters.'
+        else:
+            quote[field] = value
+    if 'email' in quote and not _EMAIL.match(quote['email']):
+        errors['email'] = 'Invalid email address.'
+    return (None, errors) if errors else (quote, {})
+
+
+def format_quote_id(row_id, created):
+    return f"QT-{time.gmtime(created).tm_year}-{row_id:06d}"
+
+
+class Ticket:
+    """Handle for one enqueued request; wait() returns its id once committed"""
+
+    __slots__ = ('kind', 'payload', 'created', 'quote_id', 'error', '_done')
+
+    def __init__(self, kind, payload):
+        self.kind = kind
+        self.payload = payload
+        self.created = time.time()
+        self.quote_id = None
+        self.error = None
+        self._done = threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=10.0):
+        if not self._done.wait(timeout):
+            raise TimeoutError('quote was not committed in time')
+        if self.error is not None:
+            raise self.error
+        return self.quote_id
+
+
+class QuoteStore:
+    """SQLite (WAL) store fed by one background writer thread per process.
+
+    Requests are enqueued in memory and committed in batches: the writer takes
+    everything queued (up to batch_size), inserts it in one transaction and
+    fsyncs once, then wakes every waiting request. IDs come from an
+    AUTOINCREMENT key, so they are unique and increasing across processes.
+    A request is only acknowledged after its batch commits, so anything a
+    client saw as accepted survives a crash; SQLite replays the WAL on open.
+    """
+
+    def __init__(self, path=None, max_queue=5000, batch_size=500, max_wait=0.002):
+        self.path = path or os.environ.get('QUOTES_DB_PATH', DEFAULT_DB_PATH)
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        # Threads do not survive fork: each worker process gets its own queue and writer
+        self._queue = ProcessLocal(lambda: queue.Queue(maxsize=max_queue))
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.committed = 0
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # FULL fsyncs the WAL on every commit; batching keeps that to one per group
+        conn.execute('PRAGMA synchronous=FULL')
+        conn.execute(_SCHEMA)
+        return conn
+
+    def _ensure_started(self):
+        """This process's queue, starting its writer first if needed.
+
+        A writer restarted in the same process (after its thread died) keeps
+        the queue and everything in it; a forked worker starts a fresh one.
+        """
+        pending = self._queue.get()
+        # A thread inherited through fork is never alive in the child
+        if self._thread is not None and self._thread.is_alive():
+            return pending
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                conn = self._connect()
+                check = conn.execute('PRAGMA quick_check').fetchone()[0]
+                if check != 'ok':
+                    raise sqlite3.DatabaseError(f'quote store failed integrity check: {check}')
+                self._thread = threading.Thread(target=self._run, args=(conn, pending), name='quote-writer',
+                                                daemon=True)
+                self._thread.start()
+        return pending
+
+    def submit(self, kind, payload):
+        """Enqueue a request without blocking; raises QueueFull under backpressure"""
+        pending = self._ensure_started()
+        ticket = Ticket(kind, payload)
+        try:
+            pending.put_nowait(ticket)
+        except queue.Full:
+            raise QueueFull() from None
+        return ticket
+
+    def depth(self):
+        pending = self._queue.peek()
+        return pending.qsize() if pending is not None else 0
+
+    def _take_batch(self, pending):
+        batch = [pending.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(pending.get_nowait())
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _run(self, conn, pending):
+        while True:
+            batch = self._take_batch(pending)
+            stop = None in batch
+            tickets = [ticket for ticket in batch if ticket is not None]
+            if tickets:
+                self._commit(conn, tickets)
+            if stop:
+                conn.close()
+                return
+
+    def _commit(self, conn, tickets):
+        # A payload that cannot be serialized fails alone instead of its whole batch
+        rows, failed = [], []
+        for ticket in tickets:
+            try:
+                rows.append((ticket.kind, ticket.created, json.dumps(ticket.payload, separators=(',', ':'))))
+            except (TypeError, ValueError) as e:
+                ticket.error = e
+                failed.append(ticket)
+        if failed:
+            tickets = [ticket for ticket in tickets if ticket.error is None]
+            for ticket in failed:
+                ticket._done.set()
+        if not tickets:
+            return
+        ids = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for row in rows:
+                ids.append(conn.execute('INSERT INTO requests (kind, created, payload) VALUES (?, ?, ?)', row).lastrowid)
+            conn.execute('COMMIT')
+        except Exception as e:
+            # Anything escaping here would kill the writer and strand every queued ticket
+            try:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+            for ticket in tickets:
+                ticket.error = e
+                ticket._done.set()
+            return
+        self.batches += 1
+        self.committed += len(tickets)
+        for ticket, row_id in zip(tickets, ids):
+            ticket.quote_id = format_quote_id(row_id, ticket.created)
+            ticket._done.set()
+
+    def close(self, timeout=10.0):
+        """Flush queued requests and stop the writer"""
+        pending = self._queue.peek()
+        if pending is not None and self._thread is not None and self._thread.is_alive():
+            pending.put(None)
+            self._thread.join(timeout)
+
+
+quote_store = QuoteStore()
+atexit.register(quote_store.close)
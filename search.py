@@ -0,0 +1,518 @@
+"""In-memory inverted index over the product catalog"""
+import copy
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, namedtuple
+from itertools import islice
+from operator import attrgetter
+
+from catalog import get_catalog, on_change, slugify
+from lru import LRUCache
+
+# Per-field term weights (BM25F-style: weighted term frequencies)
+FIELD_WEIGHTS = (('name', 3.0), ('category', 2.0), ('features', 1.5), ('description', 1.0))
+
+K1 = 1.2
+B = 0.75
+
+# Query-term expansion weights relative to an exact match
+PREFIX_WEIGHT = 0.9
+FUZZY_WEIGHT = 0.7
+MAX_PREFIX_TERMS = 32
+MIN_FUZZY_LENGTH = 4
+
+# Results kept per snapshot for repeated queries; a new snapshot starts empty
+MAX_CACHED_RESULTS = 1024
+
+# Longer queries are cut: every token costs a posting-list walk
+MAX_QUERY_LENGTH = 200
+MAX_QUERY_TOKENS = 8
+
+# Postings with at least this many documents keep a bitmap of them; smaller
+# ones build theirs per query, which costs less than storing one per term
+BITMAP_MIN_DOCS = 256
+
+# Scores use the document count and average length of the last full build;
+# updates rebuild from scratch once either moves further than this from them
+REBUILD_DRIFT = 0.1
+
+# Ranked-list entries read per turn when combining several query tokens
+TA_BLOCK = 16
+
+# A posting is re-sorted, rather than patched doc by doc, once an update
+# changes more than 1/REPOST_FRACTION of its documents
+REPOST_FRACTION = 8
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+SearchResult = namedtuple('SearchResult', 'query items total facets category page per_page pages')
+
+# weights: doc -> saturated term frequency, so a document's score is idf * weights[doc];
+# ranked: the docs by weight, best first, ties by id; bits: bitmap of the docs' slots, or None
+Posting = namedtuple('Posting', 'idf weights ranked bits')
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+def _deletes(term):
+    """Every variant of term with one character removed"""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a, b):
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        return sum(x != y for x, y in zip(a, b)) == 1
+    if len(a) > len(b):
+        a, b = b, a
+    for i in range(len(b)):
+        if a == b[:i] + b[i + 1:]:
+            return True
+    return False
+
+
+def _term_freqs(product):
+    """(term -> field-weighted frequency, weighted length) of one product"""
+    tf = Counter()
+    length = 0.0
+    for field, weight in FIELD_WEIGHTS:
+        value = getattr(product, field)
+        tokens = tokenize(' '.join(value) if isinstance(value, tuple) else value)
+        for token in tokens:
+            tf[token] += weight
+        length += weight * len(tokens)
+    return tf, length
+
+
+def _bitmap(slots):
+    """An int with bit `slot` set for every slot"""
+    if not slots:
+        return 0
+    top = max(slots)
+    if len(slots) * 8 < top:
+        buffer = bytearray((top >> 3) + 1)
+        for slot in slots:
+            buffer[slot >> 3] |= 1 << (slot & 7)
+        return int.from_bytes(buffer, 'little')
+    # Dense: one byte per slot is faster to fill, and base-2 parsing is linear
+    digits = bytearray(b'0') * (top + 1)
+    for slot in slots:
+        digits[slot] = 49  # '1'
+    digits.reverse()
+    return int(digits, 2)
+
+
+def _idf(df, n):
+    return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+
+def _posting(weights, slots, n):
+    """A term's posting from doc -> weight, whose keys must be in id order"""
+    # sorted() is stable, so equal weights stay in id order
+    ranked = sorted(weights, key=weights.__getitem__, reverse=True)
+    bits = _bitmap([slots[doc] for doc in weights]) if len(weights) >= BITMAP_MIN_DOCS else None
+    return Posting(_idf(len(weights), n), weights, ranked, bits)
+
+
+def _repost(posting, weights, removed, added, old_slots, slots, n):
+    """posting without the `removed` docs and with the `added` ones, whose weights are in `weights`"""
+    if (len(removed) + len(added)) * REPOST_FRACTION > len(posting.ranked):
+        return _posting(dict(sorted(weights.items())), slots, n)
+    old = posting.weights
+    ranked = list(posting.ranked)
+    for doc in removed:
+        del ranked[bisect_left(ranked, (-old[doc], doc), key=lambda d: (-old[d], d))]
+    for doc in added:
+        insort(ranked, doc, key=lambda d: (-weights[d], d))
+    bits = None
+    if len(weights) >= BITMAP_MIN_DOCS and posting.bits is not None:
+        bits = posting.bits
+        for doc in removed:
+            bits &= ~(1 << old_slots[doc])
+        for doc in added:
+            bits |= 1 << slots[doc]
+    elif len(weights) >= BITMAP_MIN_DOCS:
+        bits = _bitmap([slots[doc] for doc in weights])
+    return Posting(_idf(len(weights), n), weights, ranked, bits)
+
+
+def _stream(posting, weight):
+    """(score, doc) for every doc of a posting, best first"""
+    ranked = posting.ranked
+    return zip(map((weight * posting.idf).__mul__, map(posting.weights.__getitem__, ranked)), ranked)
+
+
+def _best_first(item):
+    return -item[0], item[1]
+
+
+def _unique(items):
+    seen = set()
+    for item in items:
+        if item[1] not in seen:
+            seen.add(item[1])
+            yield item
+
+
+def _ranked(expansions):
+    """(score, doc) for every document one query token matches, best first, ties by id.
+
+    A document matching several expansions comes first, and only, with the best of their scores.
+    """
+    if len(expansions) == 1:
+        return _stream(*expansions[0])
+    return _unique(heapq.merge(*(_stream(posting, weight) for posting, weight in expansions), key=_best_first))
+
+
+def _top_sum(matches, k, accept=None):
+    """The k documents with the best summed score over every token's matches (threshold algorithm).
+
+    The tokens' ranked lists are read in turns, a block at a time, and each
+    newly seen document is scored in full. Reading stops once the k-th best sum
+    beats what an unseen document could still reach, the sum of the scores last
+    read, or when one list runs out, since every match has then been seen.
+    """
+    streams = [_ranked(expansions) for expansions in matches]
+    # Per token, what _stream multiplies each weight by, and the weight lookup
+    lookups = [[(weight * posting.idf, posting.weights.get) for posting, weight in expansions]
+               for expansions in matches]
+    frontier = [None] * len(streams)
+    seen = set()
+    best = []  # (score, -doc) min-heap: the worst kept document on top
+    while True:
+        for i, stream in enumerate(streams):
+            block = list(islice(stream, TA_BLOCK))
+            for own, doc in block:
+                if doc in seen:
+                    continue
+                seen.add(doc)
+                if accept is not None and not accept(doc):
+                    continue
+                total = 0.0
+                for j, lookup in enumerate(lookups):
+                    if j == i:
+                        score = own
+                    else:
+                        # The token's score for doc: its best expansion, as _ranked computes it
+                        score = None
+                        for factor, get in lookup:
+                            value = get(doc)
+                            if value is not None and (score is None or factor * value > score):
+                                score = factor * value
+                        if score is None:
+                            break
+                    total += score
+                else:
+                    if len(best) < k:
+                        heapq.heappush(best, (total, -doc))
+                    elif (total, -doc) > best[0]:
+                        heapq.heapreplace(best, (total, -doc))
+            if len(block) < TA_BLOCK:
+                return [-doc for _, doc in sorted(best, reverse=True)]
+            frontier[i] = block[-1]
+        if len(best) == k:
+            worst, doc = best[0]
+            bound = sum(score for score, _ in frontier)
+            # An unseen document reaching the bound exactly has a larger id than every frontier document
+            if worst > bound or (worst == bound and -doc <= max(item[1] for item in frontier)):
+                return [-doc for _, doc in sorted(best, reverse=True)]
+
+
+class _Snapshot:
+    """One immutable version of the index; patched() returns a new one sharing untouched postings"""
+
+    def __init__(self):
+        self.docs = {}
+        self.doc_len = {}
+        self.total_len = 0.0
+        self.slots = {}
+        self.next_slot = 0
+        self.doc_category = {}
+        self.category_names = {}
+        self.category_bits = {}
+        self.postings = {}
+        self.deletes = {}
+        self.terms = []
+        self.n = 0
+        self.avg_len = 1.0
+        self.results = LRUCache(MAX_CACHED_RESULTS)
+
+    # Indexing
+
+    @classmethod
+    def build(cls, products):
+        snapshot = cls()
+        products = sorted(products, key=attrgetter('id'))
+        freqs = [_term_freqs(product) for product in products]
+        snapshot.n = len(products)
+        if products:
+            snapshot.avg_len = sum(length for _, length in freqs) / len(products) or 1.0
+        category_slots = {}
+        weights = {}
+        for slot, (product, (tf, length)) in enumerate(zip(products, freqs)):
+            snapshot._place(product, slot, length)
+            category_slots.setdefault(snapshot.doc_category[product.id], []).append(slot)
+            norm = snapshot._norm(length)
+            for term, freq in tf.items():
+                weights.setdefault(term, {})[product.id] = freq * (K1 + 1) / (freq + norm)
+        snapshot.next_slot = len(products)
+        snapshot.category_bits = {slug: _bitmap(slots) for slug, slots in category_slots.items()}
+        snapshot.postings = {term: _posting(term_weights, snapshot.slots, snapshot.n)
+                             for term, term_weights in weights.items()}
+        for term in snapshot.postings:
+            if len(term) >= MIN_FUZZY_LENGTH:
+                for variant in _deletes(term):
+                    snapshot.deletes.setdefault(variant, set()).add(term)
+        snapshot.terms = sorted(snapshot.postings)
+        return snapshot
+
+    def _norm(self, length):
+        return K1 * (1 - B + B * length / self.avg_len)
+
+    def _place(self, product, slot, length):
+        slug = slugify(product.category)
+        self.docs[product.id] = product
+        self.doc_len[product.id] = length
+        self.total_len += length
+        self.slots[product.id] = slot
+        self.doc_category[product.id] = slug
+        self.category_names[slug] = product.category
+
+    def patched(self, removed, added):
+        """A new snapshot without the `removed` ids and with the `added` products; self is unchanged.
+
+        Only the postings of the terms those products contain are copied and re-sorted.
+        """
+        new = copy.copy(self)
+        new.results = LRUCache(MAX_CACHED_RESULTS)
+        new.docs = dict(self.docs)
+        new.doc_len = dict(self.doc_len)
+        new.slots = dict(self.slots)
+        new.doc_category = dict(self.doc_category)
+        new.category_names = dict(self.category_names)
+        new.category_bits = category_bits = dict(self.category_bits)
+        touched = {}  # term -> (new doc -> weight, docs taken out, docs put in)
+
+        def changes(term):
+            if term not in touched:
+                posting = self.postings.get(term)
+                touched[term] = (dict(posting.weights) if posting is not None else {}, [], [])
+            return touched[term]
+
+        released = {}
+        for product_id in removed:
+            product = new.docs.pop(product_id)
+            new.total_len -= new.doc_len.pop(product_id)
+            slot = released[product_id] = new.slots.pop(product_id)
+            category_bits[new.doc_category.pop(product_id)] &= ~(1 << slot)
+            for term in _term_freqs(product)[0]:
+                weights, gone, _ = changes(term)
+                if weights.pop(product_id, None) is not None:
+                    gone.append(product_id)
+        for product in added:
+            # A changed product keeps its slot, so bitmaps do not grow with every edit
+            slot = released.pop(product.id, None)
+            if slot is None:
+                slot = new.next_slot
+                new.next_slot += 1
+            tf, length = _term_freqs(product)
+            new._place(product, slot, length)
+            slug = new.doc_category[product.id]
+            category_bits[slug] = category_bits.get(slug, 0) | 1 << slot
+            norm = new._norm(length)
+            for term, freq in tf.items():
+                weights, _, arrived = changes(term)
+                weights[product.id] = freq * (K1 + 1) / (freq + norm)
+                arrived.append(product.id)
+
+        new.postings = postings = dict(self.postings)
+        new.deletes = deletes = dict(self.deletes)
+        terms_changed = False
+        for term, (weights, gone, arrived) in touched.items():
+            posting = postings.get(term)
+            if not weights:
+                if posting is not None:
+                    terms_changed = True
+                    del postings[term]
+                    for variant in _deletes(term):
+                        remaining = deletes.get(variant, set()) - {term}
+                        if remaining:
+                            deletes[variant] = remaining
+                        else:
+                            deletes.pop(variant, None)
+            elif posting is None:
+                terms_changed = True
+                if len(term) >= MIN_FUZZY_LENGTH:
+                    for variant in _deletes(term):
+                        deletes[variant] = deletes.get(variant, set()) | {term}
+                postings[term] = _posting(dict(sorted(weights.items())), new.slots, new.n)
+            else:
+                postings[term] = _repost(posting, weights, gone, arrived, self.slots, new.slots, new.n)
+        if terms_changed:
+            new.terms = sorted(postings)
+        return new
+
+    def drifted(self):
+        """Whether the document count, average length or unused slots moved past REBUILD_DRIFT"""
+        n = len(self.docs)
+        if not n:
+            return self.n != 0
+        limit = REBUILD_DRIFT * max(self.n, 1)
+        return (abs(n - self.n) > limit or self.next_slot - n > limit
+                or abs(self.total_len / n - self.avg_len) > REBUILD_DRIFT * self.avg_len)
+
+    # Querying
+
+    def expand(self, token, prefix):
+        expansions = {}
+        if token in self.postings:
+            expansions[token] = 1.0
+        if prefix and len(token) >= 2:
+            start = bisect_left(self.terms, token)
+            for term in self.terms[start:start + MAX_PREFIX_TERMS]:
+                if not term.startswith(token):
+                    break
+                expansions.setdefault(term, PREFIX_WEIGHT)
+        if not expansions and len(token) >= MIN_FUZZY_LENGTH:
+            candidates = set(self.deletes.get(token, ()))
+            for variant in _deletes(token):
+                if variant in self.postings:
+                    candidates.add(variant)
+                candidates.update(self.deletes.get(variant, ()))
+            for term in candidates:
+                if term in self.postings and _within_one_edit(token, term):
+                    expansions[term] = FUZZY_WEIGHT
+        return expansions
+
+    def _bits(self, expansions):
+        """Bitmap of the slots of every document one query token matches"""
+        bits = 0
+        sparse = []
+        for posting, _ in expansions:
+            if posting.bits is None:
+                sparse.extend(posting.weights)
+            else:
+                bits |= posting.bits
+        if sparse:
+            slots = self.slots
+            bits |= _bitmap([slots[doc] for doc in sparse])
+        return bits
+
+    def search(self, query, category, page, per_page):
+        tokens = tokenize((query or '')[:MAX_QUERY_LENGTH])
+        # The last token is a prefix only if the user typed it last
+        prefix = len(tokens) <= MAX_QUERY_TOKENS
+        tokens = tokens[:MAX_QUERY_TOKENS]
+        if not tokens:
+            return SearchResult(query, (), 0, (), category, 1, per_page, 1)
+        key = (tuple(tokens), prefix, category, page, per_page)
+        result = self.results.get(key)
+        if result is None:
+            result = self._search(tokens, prefix, category, page, per_page)
+            self.results.set(key, result)
+        return result._replace(query=query)
+
+    def _search(self, tokens, prefix, category, page, per_page):
+        matches = []
+        for i, token in enumerate(tokens):
+            expansions = self.expand(token, prefix and i == len(tokens) - 1)
+            if not expansions:
+                return SearchResult(None, (), 0, (), category, 1, per_page, 1)
+            matches.append([(self.postings[term], weight) for term, weight in expansions.items()])
+
+        bits = self._bits(matches[0])
+        for expansions in matches[1:]:
+            bits &= self._bits(expansions)
+        counts = [(slug, (bits & category_bits).bit_count()) for slug, category_bits in self.category_bits.items()]
+        names = self.category_names
+        facets = tuple((slug, names[slug], count)
+                       for slug, count in sorted(counts, key=lambda item: (-item[1], item[0])) if count)
+        total = (bits & self.category_bits.get(category, 0)).bit_count() if category else bits.bit_count()
+
+        pages = max(1, -(-total // per_page))
+        page = min(max(1, page), pages)
+        end = page * per_page
+        top = self._top(matches, category, end) if total else []
+        docs = self.docs
+        items = tuple(docs[doc] for doc in top[end - per_page:])
+        return SearchResult(None, items, total, facets, category, page, per_page, pages)
+
+    def _top(self, matches, category, k):
+        doc_category = self.doc_category
+        if len(matches) == 1:
+            # One token: its ranked list is the result order, so read until the page is filled
+            ranked = _ranked(matches[0])
+            if category:
+                ranked = (item for item in ranked if doc_category[item[1]] == category)
+            return [doc for _, doc in islice(ranked, k)]
+        accept = (lambda doc: doc_category[doc] == category) if category else None
+        return _top_sum(matches, k, accept)
+
+
+class SearchIndex:
+    """Inverted index with prefix matching, one-edit typo tolerance, category facets and BM25 ranking.
+
+    Posting lists are scored and sorted when they are built, and large ones
+    carry a bitmap of their documents: a query reads only the top of the lists
+    it needs, and counts its total and facets with integer AND and popcount.
+    Updates build a new immutable snapshot, sharing the postings they did not
+    touch, and swap it in; queries read the current snapshot without a lock.
+    """
+
+    def __init__(self, products=()):
+        self._lock = threading.Lock()
+        self._snapshot = _Snapshot.build(products)
+
+    def update(self, old_catalog, new_catalog):
+        """Apply the difference between two catalogs"""
+        old = old_catalog.by_id if old_catalog is not None else {}
+        new = new_catalog.by_id
+        with self._lock:
+            snapshot = self._snapshot
+            added = [product for product_id, product in new.items() if old.get(product_id) != product]
+            removed = {product_id for product_id in old if product_id not in new}
+            removed.update(product.id for product in added)
+            removed = [product_id for product_id in removed if product_id in snapshot.docs]
+            if len(added) + len(removed) > REBUILD_DRIFT * len(snapshot.docs):
+                snapshot = _Snapshot.build(new_catalog.products)
+            else:
+                snapshot = snapshot.patched(removed, added)
+                if snapshot.drifted():
+                    snapshot = _Snapshot.build(snapshot.docs.values())
+            self._snapshot = snapshot
+
+    def expand(self, token, prefix):
+        """(term, weight) pairs a query token matches: exact, prefix and one-edit fuzzy"""
+        return self._snapshot.expand(token, prefix)
+
+    def search(self, query, category=None, page=1, per_page=24):
+        """Rank products matching every query token; the last token also matches as a prefix"""
+        return self._snapshot.search(query, category, page, per_page)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Return the shared search index, building it from the catalog on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SearchIndex(get_catalog().products)
+    return _index
+
+
+@on_change
+def _update_index(old, new):
+    if _index is not None:
+        _index.update(old, new)
@@ -0,0 +1,361 @@
+"""SEO metadata and JSON-LD structured data"""
+import json
+import threading
+from collections import namedtuple
+
+from catalog import get_catalog, on_change
+from metrics import timed
+
+# SEO Configuration
+SEO_CONFIG = {
+    'site_name': 'GreenFarm - Premium Organic Solutions',
+    'site_description': 'Leading provider of premium organic farming solutions, fertilizers, and sustainable agriculture products. Transform your farm with our eco-friendly, scientifically-proven organic solutions.',
+    'site_url': 'https://greenfarm.com',
+    'site_author': 'GreenFarm Team',
+    'site_keywords': 'organic farming, organic fertilizer, sustainable agriculture, bio pesticides, soil conditioner, farm solutions, eco-friendly farming, organic products, agricultural supplies, green farming',
+    'twitter_handle': '@greenfarm',
+    'facebook_page': 'GreenFarmOfficial',
+    'company_address': '123 Farm Road, Green Valley, CA 90210',
+    'company_phone': '+1 (555) 123-4567',
+    'company_email': 'info@greenfarm.com'
+}
+
+# Open Graph images are served as /img/ derivatives at the width social cards use
+OG_IMAGE_WIDTH = 1200
+
+# SEO Helper Functions
+@timed('seo')
+def generate_page_seo(page_type, **kwargs):
+    """Generate SEO metadata for different page types"""
+    seo_data = {
+        'site_name': SEO_CONFIG['site_name'],
+        'site_url': SEO_CONFIG['site_url'],
+        'twitter_handle': SEO_CONFIG['twitter_handle'],
+        'facebook_page': SEO_CONFIG['facebook_page']
+    }
+    
+    if page_type == 'home':
+        seo_data.update({
+            'title': 'GreenFarm - Premium Organic Farming Solutions | Sustainable Agriculture',
+            'description': 'Transform your farm with GreenFarm\'s premium organic fertilizers, bio pesticides, and sustainable agriculture solutions. Trusted by farmers worldwide for eco-friendly, high-yield farming.',
+            'keywords': 'organic farming, organic fertilizer, sustainable agriculture, bio pesticides, soil conditioner, eco-friendly farming, premium organic solutions',
+            'canonical_url': SEO_CONFIG['site_url'],
+            'og_image': f"{SEO_CONFIG['site_url']}/img/{OG_IMAGE_WIDTH}/images/greenfarm-hero.jpg",
+            'page_type': 'website'
+        })
+    elif page_type == 'about':
+        seo_data.update({
+            'title': 'About GreenFarm - Leading Organic Agriculture Company | Our Story',
+            'description': 'Learn about GreenFarm\'s mission to revolutionize agriculture through sustainable, organic farming solutions. Discover our commitment to environmental stewardship and farmer success.',
+            'keywords': 'about greenfarm, organic agriculture company, sustainable farming mission, agricultural innovation, environmental stewardship',
+            'canonical_url': f"{SEO_CONFIG['site_url']}/about",
+            'og_image': f"{SEO_CONFIG['site_url']}/img/{OG_IMAGE_WIDTH}/images/greenfarm-about.jpg",
+            'page_type': 'article'
+        })
+    elif page_type == 'products':
+        seo_data.update({
+            'title': 'Organic Farming Products | Premium Fertilizers & Bio Pesticides - GreenFarm',
+            'description': 'Explore GreenFarm\'s comprehensive range of organic farming products including premium fertilizers, bio pesticides, and soil conditioners. Boost your crop yield naturally.',
+            'keywords': 'organic farming products, organic fertilizers, bio pesticides, soil conditioners, natural farming solutions, agricultural products',
+            'canonical_url': f"{SEO_CONFIG['site_url']}/products",
+            'og_image': f"{SEO_CONFIG['site_url']}/img/{OG_IMAGE_WIDTH}/images/greenfarm-products.jpg",
+            'page_type': 'product'
+        })
+    elif page_type == 'contact':
+        seo_data.update({
+            'title': 'Contact GreenFarm - Get Expert Agricultural Consultation | Organic Farming Support',
+            'description': 'Contact GreenFarm for expert agricultural consultation and support. Get personalized organic farming solutions and technical guidance from our experienced team.',
+            'keywords': 'contact greenfarm, agricultural consultation, organic farming support, expert advice, farming guidance',
+            'canonical_url': f"{SEO_CONFIG['site_url']}/contact",
+            'og_image': f"{SEO_CONFIG['site_url']}/img/{OG_IMAGE_WIDTH}/images/greenfarm-contact.jpg",
+            'page_type': 'article'
+        })
+    elif page_type == 'privacy_policy':
+        seo_data.update({
+            'title': 'Privacy Policy - GreenFarm | Data Protection & Privacy',
+            'description': 'Read GreenFarm\'s privacy policy to understand how we protect your personal information and data. Learn about our commitment to your privacy and security.',
+            'keywords': 'privacy policy, data protection, greenfarm privacy, personal information security',
+            'canonical_url': f"{SEO_CONFIG['site_url']}/privacy-policy"
+        })
+    elif page_type == 'terms_of_service':
+        seo_data.update({
+            'title': 'Terms of Service - GreenFarm | User Agreement & Conditions',
+            'description': 'Read GreenFarm\'s terms of service and user agreement. Understand the terms and conditions for using our organic farming products and services.',
+            'keywords': 'terms of service, user agreement, greenfarm terms, service conditions',
+            'canonical_url': f"{SEO_CONFIG['site_url']}/terms-of-service"
+        })
+    elif page_type == 'search':
+        query = kwargs.get('query')
+        seo_data.update({
+            'title': f"Search results for \"{query}\" | GreenFarm" if query else 'Search Products | GreenFarm',
+            'description': 'Search GreenFarm\'s organic fertilizers, soil conditioners and bio pesticides.',
+            'keywords': 'search organic farming products, greenfarm products',
+            'canonical_url': f"{SEO_CONFIG['site_url']}/search",
+            'robots': 'noindex, follow',
+            'page_type': 'website'
+        })
+    elif page_type == 'product_detail':
+        product = kwargs.get('product')
+        if product:
+            seo_data.update({
+                'title': f"{product.name} - Premium {product.category} | GreenFarm Organic Solutions",
+                'description': f"{product.description} Premium {product.category.lower()} from GreenFarm. {', '.join(product.features)}. Order now for sustainable farming success.",
+                'keywords': f"{product.name.lower()}, {product.category.lower()}, organic {product.category.lower()}, {', '.join([f.lower() for f in product.features])}",
+                'canonical_url': f"{SEO_CONFIG['site_url']}/products/{product.id}",
+                'og_image': f"{SEO_CONFIG['site_url']}/img/{OG_IMAGE_WIDTH}/images/products/{product.id}.jpg",
+                'page_type': 'product',
+                'product_id': product.id,
+                'product_price': product.price,
+                'product_currency': 'USD'
+            })
+    
+    return seo_data
+
+ORGANIZATION_ID = f"{SEO_CONFIG['site_url']}/#organization"
+
+# Built once; product offers refer to it by @id instead of embedding a copy each
+ORGANIZATION = {
+    "@context": "https://schema.org",
+    "@type": "Organization",
+    "@id": ORGANIZATION_ID,
+    "name": "GreenFarm",
+    "url": SEO_CONFIG['site_url'],
+    "logo": f"{SEO_CONFIG['site_url']}/static/images/greenfarm-logo.png",
+    "description": SEO_CONFIG['site_description'],
+    "address": {
+        "@type": "PostalAddress",
+        "streetAddress": "123 Farm Road",
+        "addressLocality": "Green Valley",
+        "addressRegion": "CA",
+        "postalCode": "90210",
+        "addressCountry": "US"
+    },
+    "contactPoint": {
+        "@type": "ContactPoint",
+        "telephone": SEO_CONFIG['company_phone'],
+        "contactType": "customer service",
+        "email": SEO_CONFIG['company_email']
+    },
+    "sameAs": [
+        f"https://twitter.com/{SEO_CONFIG['twitter_handle']}",
+        f"https://facebook.com/{SEO_CONFIG['facebook_page']}"
+    ]
+}
+
+# Reference to the Organization node emitted on every page by seo_head.html
+ORGANIZATION_REF = {"@id": ORGANIZATION_ID}
+
+@timed('seo')
+def generate_structured_data(page_type, **kwargs):
+    """Generate JSON-LD structured data for SEO"""
+    base_organization = ORGANIZATION
+    
+    if page_type == 'home':
+        return {
+            "@context": "https://schema.org",
+            "@type": "WebSite",
+            "name": SEO_CONFIG['site_name'],
+            "url": SEO_CONFIG['site_url'],
+            "description": SEO_CONFIG['site_description'],
+            "publisher": base_organization,
+            "potentialAction": {
+                "@type": "SearchAction",
+                "target": f"{SEO_CONFIG['site_url']}/search?q={{search_term_string}}",
+                "query-input": "required name=search_term_string"
+            }
+        }
+    elif page_type == 'products':
+        products = kwargs.get('products', [])
+        products_data = []
+        for product in products:
+            products_data.append({
+                "@type": "Product",
+                "name": product.name,
+                "description": product.description,
+                "category": product.category,
+                "offers": {
+                    "@type": "Offer",
+                    "price": product.price,
+                    "priceCurrency": "USD",
+                    "availability": "https://schema.org/InStock",
+                    "seller": ORGANIZATION_REF
+                }
+            })
+        
+        return {
+            "@context": "https://schema.org",
+            "@type": "ItemList",
+            "itemListElement": products_data
+        }
+    elif page_type == 'product_detail':
+        product = kwargs.get('product')
+        if product:
+            return {
+                "@context": "https://schema.org",
+                "@type": "Product",
+                "name": product.name,
+                "description": product.description,
+                "category": product.category,
+                "brand": {
+                    "@type": "Brand",
+                    "name": "GreenFarm"
+                },
+                "offers": {
+                    "@type": "Offer",
+                    "price": product.price,
+                    "priceCurrency": "USD",
+                    "availability": "https://schema.org/InStock",
+                    "seller": ORGANIZATION_REF
+                }
+            }
+    elif page_type == 'contact':
+        return {
+            "@context": "https://schema.org",
+            "@type": "ContactPage",
+            "mainEntity": base_organization
+        }
+    
+    return base_organization
+
+
+# Precompiled SEO payloads
+CompiledPage = namedtuple('CompiledPage', 'seo structured_data')
+
+STATIC_PAGE_TYPES = ('home', 'about', 'contact', 'privacy_policy', 'terms_of_service')
+
+# Legal pages have never carried a page-level JSON-LD block
+_NO_STRUCTURED_DATA = ('privacy_policy', 'terms_of_service')
+
+
+def serialize_jsonld(data):
+    """Compact JSON-LD that is safe to inline inside a <script> element"""
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).replace('</', '<\\/')
+
+
+def _with_organization(data):
+    """Standalone document for the schema API: the node plus the Organization it references"""
+    node = {k: v for k, v in data.items() if k != '@context'}
+    organization = {k: v for k, v in ORGANIZATION.items() if k != '@context'}
+    return {"@context": "https://schema.org", "@graph": [organization, node]}
+
+
+class CompiledSeo:
+    """SEO dicts and serialized JSON-LD for every page type, built once per catalog.
+
+    Pages are keyed by page type for static pages, ('products', category, page)
+    for listings and ('product_detail', product_id) for product pages. Schema
+    API payloads are stored as encoded bytes under 'organization' and
+    ('products', category, page).
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.pages = {}
+        self.schemas = {}
+        for page_type in STATIC_PAGE_TYPES:
+            data = None if page_type in _NO_STRUCTURED_DATA else generate_structured_data(page_type)
+            self.pages[page_type] = CompiledPage(
+                generate_page_seo(page_type), serialize_jsonld(data) if data else None
+            )
+        self.schemas['organization'] = serialize_jsonld(generate_structured_data('home')).encode('utf-8')
+
+        listing_seo = generate_page_seo('products')
+        for category in (None,) + tuple(c.slug for c in catalog.categories):
+            for page in range(1, catalog.page(category).pages + 1):
+                data = _listing_data(catalog, category, page)
+                self.pages[('products', category, page)] = CompiledPage(listing_seo, serialize_jsonld(data))
+                self.schemas[('products', category, page)] = serialize_jsonld(_with_organization(data)).encode('utf-8')
+
+        for product in catalog.products:
+            self.pages[('product_detail', product.id)] = CompiledPage(
+                generate_page_seo('product_detail', product=product),
+                serialize_jsonld(generate_structured_data('product_detail', product=product)),
+            )
+
+
+_compiled = None
+_lock = threading.Lock()
+
+
+def compile_seo(catalog):
+    """Build and install the SEO payloads for a catalog"""
+    global _compiled
+    compiled = CompiledSeo(catalog)
+    _compiled = compiled
+    return compiled
+
+
+def get_compiled():
+    """Return the compiled SEO payloads, compiling them for the current catalog on first use"""
+    if _compiled is None:
+        with _lock:
+            if _compiled is None:
+                compile_seo(get_catalog())
+    return _compiled
+
+
+def _listing_data(catalog, category, page):
+    return generate_structured_data('products', products=catalog.page(category, page).items)
+
+
+def build_page(catalog, key):
+    """One page's CompiledPage straight from the catalog, or None if the page does not exist"""
+    if key in STATIC_PAGE_TYPES:
+        data = None if key in _NO_STRUCTURED_DATA else generate_structured_data(key)
+        return CompiledPage(generate_page_seo(key), serialize_jsonld(data) if data else None)
+    if isinstance(key, tuple) and key[0] == 'products':
+        _, category, page = key
+        if category is not None and category not in catalog.by_category:
+            return None
+        if not 1 <= page <= catalog.page(category).pages:
+            return None
+        return CompiledPage(generate_page_seo('products'), serialize_jsonld(_listing_data(catalog, category, page)))
+    if isinstance(key, tuple) and key[0] == 'product_detail':
+        product = catalog.get(key[1])
+        if product is None:
+            return None
+        return CompiledPage(generate_page_seo('product_detail', product=product),
+                            serialize_jsonld(generate_structured_data('product_detail', product=product)))
+    return None
+
+
+def build_schema(catalog, key):
+    """One schema API payload straight from the catalog, or None if it does not exist"""
+    if key == 'organization':
+        return serialize_jsonld(generate_structured_data('home')).encode('utf-8')
+    page = build_page(catalog, key) if isinstance(key, tuple) and key[0] == 'products' else None
+    if page is None:
+        return None
+    return serialize_jsonld(_with_organization(_listing_data(catalog, key[1], key[2]))).encode('utf-8')
+
+
+def _current():
+    """The compiled payloads if they were built from the live catalog, else None, and that catalog.
+
+    set_catalog() swaps the catalog before the recompile listener has finished,
+    so for that window lookups are answered from the new catalog directly.
+    """
+    compiled = get_compiled()
+    catalog = get_catalog()
+    return (compiled if compiled.catalog is catalog else None), catalog
+
+
+@timed('seo')
+def page_seo(key):
+    """Precompiled (seo, structured_data) for a page key, or None if it does not exist"""
+    compiled, catalog = _current()
+    page = compiled.pages.get(key) if compiled is not None else None
+    return page if page is not None else build_page(catalog, key)
+
+
+@timed('seo')
+def schema_payload(key):
+    """Precompiled JSON-LD bytes for the schema API, or None if it does not exist"""
+    compiled, catalog = _current()
+    payload = compiled.schemas.get(key) if compiled is not None else None
+    return payload if payload is not None else build_schema(catalog, key)
+
+
+@on_change
+def _recompile(old, new):
+    compile_seo(new)
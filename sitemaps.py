@@ -0,0 +1,147 @@
+"""Streaming sitemap index and child sitemaps for the catalog"""
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+# Limit from the sitemaps.org protocol
+MAX_URLS_PER_SITEMAP = 50000
+
+# URLs rendered per yielded chunk; keeps memory flat without a write per <url>
+_BATCH = 1000
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# Templates whose edits change every rendered page
+_LAYOUT_TEMPLATES = ('base.html', 'seo_head.html', 'quote_modal.html')
+
+StaticPage = namedtuple('StaticPage', 'endpoint template changefreq priority uses_catalog')
+
+STATIC_PAGES = (
+    StaticPage('home', 'index.html', 'weekly', '1.0', False),
+    StaticPage('about', 'about.html', 'monthly', '0.8', False),
+    StaticPage('products', 'products.html', 'weekly', '0.9', True),
+    StaticPage('contact', 'contact.html', 'monthly', '0.7', False),
+    StaticPage('privacy_policy', 'privacy_policy.html', 'yearly', '0.3', False),
+    StaticPage('terms_of_service', 'terms_of_service.html', 'yearly', '0.3', False),
+)
+
+# Every template whose mtime feeds a <lastmod>; a frozen sitemap depends on them
+LASTMOD_TEMPLATES = _LAYOUT_TEMPLATES + tuple(page.template for page in STATIC_PAGES)
+
+_URLSET_OPEN = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+_URLSET_CLOSE = '</urlset>\n'
+_INDEX_OPEN = '<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+_INDEX_CLOSE = '</sitemapindex>\n'
+
+
+@lru_cache(maxsize=4096)
+def w3c_date(timestamp):
+    """Format a POSIX timestamp as a W3C date; products mostly share a few mtimes"""
+    return time.strftime('%Y-%m-%d', time.gmtime(timestamp))
+
+
+def _template_mtime(name):
+    return os.path.getmtime(os.path.join(TEMPLATE_DIR, name))
+
+
+class SitemapSet:
+    """All sitemap URLs for one catalog, split into numbered child sitemaps.
+
+    static_paths maps each STATIC_PAGES endpoint to its URL path; the scheme and
+    host are supplied per request so one set serves every host name.
+    """
+
+    def __init__(self, catalog, static_paths):
+        self.catalog = catalog
+        layout_mtime = max(_template_mtime(name) for name in _LAYOUT_TEMPLATES)
+        self.static = []
+        for page in STATIC_PAGES:
+            lastmod = max(layout_mtime, _template_mtime(page.template))
+            if page.uses_catalog:
+                lastmod = max(lastmod, catalog.last_modified)
+            self.static.append((escape(static_paths[page.endpoint]), lastmod, page.changefreq, page.priority))
+        self.total = len(self.static) + len(catalog)
+        self.count = max(1, -(-self.total // MAX_URLS_PER_SITEMAP))
+        self.chunk_last_modified = [
+            max(entry[1] for entry in self._entries('', *self.chunk_range(number)))
+            for number in range(1, self.count + 1)
+        ]
+        self.last_modified = max(self.chunk_last_modified)
+        self._gzipped = {}
+        self._lock = threading.Lock()
+
+    def _entries(self, base_url, start, stop):
+        """Yield (loc, lastmod, changefreq, priority) for URL positions [start, stop)"""
+        static_count = len(self.static)
+        for path, lastmod, changefreq, priority in self.static[start:stop]:
+            yield (f'{base_url}{path}', lastmod, changefreq, priority)
+        products = self.catalog.products[max(0, start - static_count):max(0, stop - static_count)]
+        for product in products:
+            yield (f'{base_url}/products/{product.id}', product.updated, 'weekly', '0.6')
+
+    def chunk_range(self, number):
+        start = (number - 1) * MAX_URLS_PER_SITEMAP
+        return start, min(start + MAX_URLS_PER_SITEMAP, self.total)
+
+    def etag(self, name):
+        key = f'{name}:{self.total}:{self.last_modified}'
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+    def generate_urlset(self, base_url, number):
+        """Stream one child sitemap as text chunks"""
+        base_url = escape(base_url)
+        yield _URLSET_OPEN
+        batch = []
+        start, stop = self.chunk_range(number)
+        for loc, lastmod, changefreq, priority in self._entries(base_url, start, stop):
+            batch.append(
+                f'  <url>\n    <loc>{loc}</loc>\n    <lastmod>{w3c_date(lastmod)}</lastmod>\n'
+                f'    <changefreq>{changefreq}</changefreq>\n    <priority>{priority}</priority>\n  </url>\n'
+            )
+            if len(batch) >= _BATCH:
+                yield ''.join(batch)
+                batch = []
+        if batch:
+            yield ''.join(batch)
+        yield _URLSET_CLOSE
+
+    def generate_index(self, base_url, suffix='.xml.gz'):
+        """Stream the sitemap index pointing at every child sitemap"""
+        base_url = escape(base_url)
+        yield _INDEX_OPEN
+        for number in range(1, self.count + 1):
+            yield (f'  <sitemap>\n    <loc>{base_url}/sitemap-{number}{suffix}</loc>\n'
+                   f'    <lastmod>{w3c_date(self.chunk_last_modified[number - 1])}</lastmod>\n  </sitemap>\n')
+        yield _INDEX_CLOSE
+
+    def gzipped(self, name, chunks):
+        """Gzip a sitemap once and keep the bytes for this catalog generation (at most count + 1 files)"""
+        body = self._gzipped.get(name)
+        if body is None:
+            with self._lock:
+                body = self._gzipped.get(name)
+                if body is None:
+                    body = gzip.compress(''.join(chunks).encode('utf-8'), compresslevel=9, mtime=0)
+                    self._gzipped[name] = body
+        return body
+
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def get_sitemaps(catalog, static_paths):
+    """Return the SitemapSet for the catalog, rebuilding it after a catalog swap"""
+    global _current
+    sitemaps = _current
+    if sitemaps is None or sitemaps.catalog is not catalog:
+        with _current_lock:
+            sitemaps = _current
+            if sitemaps is None or sitemaps.catalog is not catalog:
+                sitemaps = _current = SitemapSet(catalog, static_paths)
+    return sitemaps
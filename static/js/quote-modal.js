@@ -0,0 +1,91 @@
+// Quote request modal component (templates/quote_modal.html)
+document.addEventListener('alpine:init', () => {
+    Alpine.data('quoteModal', () => ({
+        quoteModalOpen: false,
+        selectedProduct: 'organic-fertilizer',
+        formData: {
+            name: '',
+            email: '',
+            phone: '',
+            company: '',
+            farmSize: '',
+            cropType: '',
+            location: '',
+            quantity: '',
+            message: ''
+        },
+        resetForm() {
+            this.formData = {
+                name: '',
+                email: '',
+                phone: '',
+                company: '',
+                farmSize: '',
+                cropType: '',
+                location: '',
+                quantity: '',
+                message: ''
+            };
+            this.selectedProduct = 'organic-fertilizer';
+        },
+        validateForm() {
+            if (!this.formData.name.trim()) {
+                alert('Please enter your full name.');
+                return false;
+            }
+            if (!this.formData.email.trim()) {
+                alert('Please enter your email address.');
+                return false;
+            }
+            if (!this.formData.phone.trim()) {
+                alert('Please enter your phone number.');
+                return false;
+            }
+            // Email validation
+            const emailRegex = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
+            if (!emailRegex.test(this.formData.email)) {
+                alert('Please enter a valid email address.');
+                return false;
+            }
+            return true;
+        },
+        submitQuote() {
+            if (!this.validateForm()) {
+                return;
+            }
+
+            fetch('/api/quote', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    ...this.formData,
+                    selectedProduct: this.selectedProduct
+                })
+            })
+                .then((response) => response.json())
+                .then((result) => {
+                    if (!result.success) {
+                        alert(result.message);
+                        return;
+                    }
+                    // Show success message
+                    alert('🌱 Thank you for your quote request! Our agricultural experts will contact you within 24 hours with a customized solution for your farming needs. Your reference is ' + result.quote_id + '.');
+
+                    // Close modal and reset form
+                    this.closeModal();
+                    this.resetForm();
+                })
+                .catch(() => alert('An error occurred while sending your request. Please try again.'));
+        },
+        openModal() {
+            this.quoteModalOpen = true;
+            // Prevent body scroll when modal is open
+            document.body.style.overflow = 'hidden';
+        },
+        closeModal() {
+            this.quoteModalOpen = false;
+            // Restore body scroll when modal is closed
+            document.body.style.overflow = 'auto';
+        }
+    }));
+});
@@ -0,0 +1,151 @@
+"""Jinja bytecode cache, eager template compilation, compile-time HTML minification and fragment caching"""
+import os
+import re
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+from cache_policy import on_purge, sync_purges
+from lru import LRUCache
+
+# Bump when minify() changes so cached bytecode built from older output is ignored
+MINIFY_VERSION = 1
+
+# Left-to-right tokenizer: HTML comments, blocks whose content is whitespace
+# sensitive, and Jinja tags (kept verbatim so string literals are untouched)
+_TOKENS = re.compile(
+    r'(?P<comment><!--.*?-->)'
+    r'|(?P<verbatim><(?P<tag>pre|script|textarea|style)\b.*?</(?P=tag)\s*>)'
+    r'|(?P<jinja>\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\})',
+    re.S | re.I,
+)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _collapse(text):
+    # Keep one newline where there was one: Alpine attributes may hold `//` comments
+    return _WHITESPACE.sub(lambda m: '\n' if '\n' in m.group() else ' ', text)
+
+
+def minify(source):
+    """Strip HTML comments and collapse whitespace outside <pre>, <script>, <textarea> and <style>"""
+    out = []
+    pos = 0
+    for match in _TOKENS.finditer(source):
+        out.append(_collapse(source[pos:match.start()]))
+        token = match.group()
+        if match.group('comment'):
+            # Conditional comments and comments wrapping template logic stay
+            if token.startswith('<!--[if') or '{%' in token or '{{' in token:
+                out.append(token)
+        else:
+            out.append(token)
+        pos = match.end()
+    out.append(_collapse(source[pos:]))
+    return ''.join(out)
+
+
+class HtmlMinifyExtension(Extension):
+    """Minify .html templates once, before they are compiled"""
+
+    def preprocess(self, source, name, filename=None):
+        if name and name.endswith('.html'):
+            return minify(source)
+        return source
+
+
+class FragmentCache(LRUCache):
+    """LRU of rendered template fragments keyed by (name, *vary values)"""
+
+    def __init__(self, max_entries=256):
+        super().__init__(max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        sync_purges()
+        body = super().get(key)
+        # Unlocked counters: an occasional lost increment is fine for stats
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def invalidate(self, *names):
+        """Drop every variant of the named fragments, or everything if none are given"""
+        if not names:
+            return self.clear()
+        return self.discard_where(lambda key, body: key[0] in names)
+
+    def purge_keys(self, keys):
+        """Surrogate-key purge listener: a fragment's name is its key; None drops everything"""
+        if keys is None:
+            return self.clear()
+        return self.invalidate(*keys) if keys else 0
+
+    def stats(self):
+        return {'entries': len(self), 'hits': self.hits, 'misses': self.misses}
+
+
+fragment_cache = FragmentCache()
+on_purge(fragment_cache.purge_keys, local=True)
+
+
+class FragmentCacheExtension(Extension):
+    """`{% cache 'name', vary... %}...{% endcache %}` renders the body once per distinct key.
+
+    The body must only depend on the values in the key. Caching is skipped
+    while templates auto-reload (debug), so edits show up immediately.
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=fragment_cache)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cached', [nodes.Tuple(parts, 'load')]), [], [], body) \
+            .set_lineno(lineno)
+
+    def _cached(self, key, caller):
+        if self.environment.auto_reload:
+            return caller()
+        cache = self.environment.fragment_cache
+        body = cache.get(key)
+        if body is None:
+            body = caller()
+            cache.set(key, body)
+        return body
+
+
+def bytecode_cache(directory):
+    """On-disk bytecode cache shared by every worker and kept across restarts"""
+    os.makedirs(directory, exist_ok=True)
+    return FileSystemBytecodeCache(directory, pattern=f'__greenfarm_m{MINIFY_VERSION}_%s.cache')
+
+
+def configure(app, cache_dir=None):
+    """Install the minifier, fragment cache and bytecode cache; call before app.jinja_env is first used"""
+    cache_dir = cache_dir or os.environ.get('JINJA_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+    app.jinja_options = dict(
+        app.jinja_options,
+        bytecode_cache=bytecode_cache(cache_dir),
+        extensions=list(app.jinja_options.get('extensions', ())) + [HtmlMinifyExtension, FragmentCacheExtension],
+    )
+
+
+def precompile(app):
+    """Compile every template now instead of on the first request that needs it"""
+    env = app.jinja_env
+    names = env.list_templates(extensions=('html', 'xml', 'txt'))
+    for name in names:
+        env.get_template(name)
+    return len(names)
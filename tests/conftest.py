@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep databases and caches out of instance/; set before the app is imported
+_tmp = tempfile.mkdtemp(prefix='greenfarm-tests-')
+os.environ.setdefault('QUOTES_DB_PATH', os.path.join(_tmp, 'quotes.db'))
+os.environ.setdefault('JINJA_CACHE_DIR', os.path.join(_tmp, 'jinja_cache'))
+os.environ.setdefault('METRICS_DIR', os.path.join(_tmp, 'metrics'))
+os.environ.setdefault('IMAGE_CACHE_DIR', os.path.join(_tmp, 'img_cache'))
+os.environ.setdefault('PURGE_STATE_PATH', os.path.join(_tmp, 'purges'))
+
+import app as app_module  # noqa: E402
+import catalog  # noqa: E402
+import page_cache  # noqa: E402
+from catalog import Catalog, Product  # noqa: E402
+
+
+def make_catalog(count, updated=1700000000.0, categories=('Fertilizers', 'Soil Care')):
+    return Catalog([
+        Product(id=i, name=f'Product {i}', description=f'Organic product number {i}.', price=10.0 + i,
+                category=categories[i % len(categories)], features=('Organic',), updated=updated)
+        for i in range(1, count + 1)
+    ])
+
+
+@pytest.fixture
+def app():
+    return app_module.app
+
+
+@pytest.fixture
+def client(app):
+    page_cache.invalidate()
+    return app.test_client()
+
+
+@pytest.fixture
+def small_catalog():
+    """Install a 50-product catalog for the test and restore the previous one afterwards"""
+    previous = catalog.get_catalog()
+    installed = catalog.set_catalog(make_catalog(50))
+    yield installed
+    catalog.set_catalog(previous)
@@ -0,0 +1,33 @@
+import re
+
+import app as app_module
+from assets import IMMUTABLE_MAX_AGE, LEGACY_MAX_AGE, fingerprint, hashed_name
+
+manifest = app_module.asset_manifest
+
+
+def test_rendered_pages_link_fingerprinted_assets(client, app):
+    html = client.get('/about').get_data(as_text=True)
+    digest = fingerprint(f'{app.static_folder}/css/style.css')
+    assert f'/static/css/style.{digest}.css' in html
+    assert '/static/css/style.css"' not in html
+    assert re.search(r'/static/js/quote-modal\.[0-9a-f]{10}\.js', html)
+
+
+def test_fingerprinted_url_is_immutable(client):
+    response = client.get(f"/static/{manifest.url_filename('css/base.css')}")
+    assert response.status_code == 200
+    assert response.cache_control.max_age == IMMUTABLE_MAX_AGE == 31536000
+    assert response.cache_control.immutable
+    assert response.cache_control.public
+
+
+def test_legacy_path_gets_short_ttl(client):
+    response = client.get('/static/css/base.css')
+    assert response.status_code == 200
+    assert response.cache_control.max_age == LEGACY_MAX_AGE == 300
+    assert not response.cache_control.immutable
+
+
+def test_unknown_hash_is_not_found(client):
+    assert client.get(f"/static/{hashed_name('css/base.css', '0123456789')}").status_code == 404
@@ -0,0 +1,20 @@
+import pytest
+
+ENDPOINTS = [
+    ('CACHE_PURGE_TOKEN', '/admin/purge', {'json': {'keys': ['pages']}}),
+    ('BULK_API_TOKEN', '/api/bulk/quotes', {'data': b'', 'content_type': 'application/x-ndjson'}),
+]
+
+
+@pytest.mark.parametrize('env_var,path,body', ENDPOINTS)
+def test_token_endpoints(client, monkeypatch, env_var, path, body):
+    monkeypatch.delenv(env_var, raising=False)
+    assert client.post(path, **body).status_code == 404
+    monkeypatch.setenv(env_var, 's3cret')
+    assert client.post(path, **body).status_code == 403
+    assert client.post(path, headers={'Authorization': 'Bearer wrong'}, **body).status_code == 403
+    assert client.post(path, headers={'Authorization': 'Bearer s3crét'}, **body).status_code == 403
+    response = client.post(path, headers={'Authorization': 'Bearer s3cret'}, **body)
+    response.close()  # the bulk import streams; closing pops its request context
+    assert response.status_code == 200
+    assert 'no-store' in response.headers['Cache-Control']
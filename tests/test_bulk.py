@@ -0,0 +1,107 @@
+import io
+import json
+
+import pytest
+
+import bulk
+import catalog
+from conftest import make_catalog
+
+BASE = 1700000000
+
+
+@pytest.fixture
+def delta_catalog():
+    """50 products, of which ids 10, 20, 30, 40 and 50 changed an hour after the rest"""
+    previous = catalog.get_catalog()
+    products = make_catalog(50, updated=float(BASE)).products
+    changed = [product._replace(updated=float(BASE + 3600)) if product.id % 10 == 0 else product
+               for product in products]
+    installed = catalog.set_catalog(catalog.Catalog(changed))
+    yield installed
+    catalog.set_catalog(previous)
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def _next(response):
+    link = response.headers.get('Link')
+    return link[1:link.index('>')] if link else None
+
+
+def test_delta_pages_carry_since(client, delta_catalog):
+    url = f'/api/bulk/products?limit=15&since={BASE}'
+    ids = []
+    while url:
+        response = client.get(url, headers={'Accept-Encoding': 'identity'})
+        assert response.status_code == 200
+        records = _lines(response)
+        assert response.headers['X-Record-Count'] == str(len(records))
+        ids.extend(record['id'] for record in records)
+        url = _next(response)
+        if url:
+            assert f'since={BASE}' in url
+    assert ids == [10, 20, 30, 40, 50]
+
+
+def test_delta_is_a_url_not_a_header(client, delta_catalog):
+    # If-Modified-Since before the change revalidates to a full page, never a delta
+    response = client.get('/api/bulk/products?limit=100', headers={
+        'Accept-Encoding': 'identity', 'If-Modified-Since': 'Tue, 14 Nov 2023 22:13:20 GMT'})
+    assert response.status_code == 200
+    assert len(_lines(response)) == 50
+    # After the last change it is a 304
+    response = client.get('/api/bulk/products', headers={'If-Modified-Since': 'Wed, 15 Nov 2023 00:00:00 GMT'})
+    assert response.status_code == 304
+
+
+def test_since_accepts_http_date_and_rejects_garbage(client, delta_catalog):
+    response = client.get('/api/bulk/products?since=Tue, 14 Nov 2023 22:13:20 GMT',
+                          headers={'Accept-Encoding': 'identity'})
+    assert [record['id'] for record in _lines(response)] == [10, 20, 30, 40, 50]
+    assert client.get('/api/bulk/products?since=yesterday').status_code == 400
+
+
+class _Ticket:
+    def __init__(self, quote_id=None, error=None):
+        self.quote_id = quote_id
+        self.error = error
+
+    def done(self):
+        return True
+
+    def wait(self):
+        if self.error is not None:
+            raise self.error
+        return self.quote_id
+
+
+class _Store:
+    def __init__(self):
+        self.count = 0
+
+    def submit(self, kind, quote):
+        self.count += 1
+        if quote['name'] == 'Broken':
+            return _Ticket(error=RuntimeError('disk full'))
+        return _Ticket(quote_id=f'QT-2026-{self.count:06d}')
+
+
+def test_import_results_in_order_with_summary():
+    quote = {'name': 'Ada', 'email': 'ada@example.com', 'phone': '5551234567'}
+    upload = '\n'.join([
+        json.dumps({**quote, 'ref': 'A-1'}),
+        'not json',
+        '',
+        json.dumps({**quote, 'email': 'nope', 'ref': 'A-3'}),
+        json.dumps({**quote, 'name': 'Broken'}),
+    ]).encode()
+    results = [json.loads(line) for chunk in bulk.import_results(io.BytesIO(upload), store=_Store())
+               for line in chunk.decode().splitlines()]
+    assert results[0] == {'line': 1, 'ref': 'A-1', 'ok': True, 'quote_id': 'QT-2026-000001'}
+    assert results[1]['line'] == 2 and results[1]['ok'] is False
+    assert results[2]['ref'] == 'A-3' and 'email' in results[2]['errors']
+    assert results[3] == {'line': 4, 'ok': False, 'error': 'Could not store this quote; retry it.'}
+    assert results[4] == {'summary': True, 'lines': 4, 'accepted': 1, 'rejected': 3}
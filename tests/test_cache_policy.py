@@ -0,0 +1,81 @@
+import threading
+import time
+
+import cache_policy
+from cache_policy import RemotePurger, http_purger
+
+
+def test_remote_purge_does_not_block_and_batches():
+    sent = []
+    release = threading.Event()
+
+    def send(keys):
+        sent.append(keys)
+        release.wait(5)
+
+    purger = RemotePurger(send, max_keys=3)
+    start = time.perf_counter()
+    purger({'a'})
+    while not sent:
+        time.sleep(0.001)
+    # Purged while the first POST is in flight: merged into the next ones
+    for key in ('b', 'c', 'd', 'e'):
+        purger({key})
+    assert time.perf_counter() - start < 1
+    release.set()
+    assert purger.flush(5)
+    assert sent == [['a'], ['b', 'c', 'd'], ['e']]
+
+
+def test_http_purger_sends_keys_in_one_request(monkeypatch):
+    requests = []
+
+    class Response:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    def urlopen(req, timeout):
+        requests.append((req.full_url, req.get_method(), dict(req.header_items())))
+        return Response()
+
+    monkeypatch.setattr(cache_policy.urllib.request, 'urlopen', urlopen)
+    purger = http_purger('https://cdn.example/purge', {'Fastly-Key': 't0ken'})
+    purger({'product-2', 'product-1', 'products'})
+    assert purger.flush(5)
+    assert requests == [('https://cdn.example/purge', 'POST',
+                         {'Fastly-key': 't0ken', 'Surrogate-key': 'product-1 product-2 products'})]
+
+    per_key = http_purger('https://cdn.example/purge/{key}')
+    per_key({'a', 'b'})
+    assert per_key.flush(5)
+    assert [url for url, _, _ in requests[1:]] == ['https://cdn.example/purge/a', 'https://cdn.example/purge/b']
+
+
+def test_shared_purges_replay_other_processes(tmp_path):
+    path = str(tmp_path / 'purges')
+    worker, other = cache_policy.SharedPurges(path), cache_policy.SharedPurges(path)
+    replayed = []
+    other.publish({'product-1'})
+    other.publish({'product-2', 'products'})
+    worker.sync([replayed.append])
+    worker.sync([replayed.append])
+    assert replayed == [{'product-1', 'product-2', 'products'}]
+    # Its own purges were applied when it made them
+    worker.publish({'pages'})
+    worker.sync([replayed.append])
+    assert len(replayed) == 1
+
+
+def test_shared_purges_drop_everything_when_too_far_behind(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_policy, 'MAX_SHARED_PURGES', 2)
+    path = str(tmp_path / 'purges')
+    worker, other = cache_policy.SharedPurges(path), cache_policy.SharedPurges(path)
+    for key in ('a', 'b', 'c'):
+        other.publish({key})
+    replayed = []
+    worker.sync([replayed.append])
+    assert replayed == [None]
+    assert worker.seen == other.generation() == 3
@@ -0,0 +1,114 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+import catalog
+from catalog import Catalog, load_catalog
+from conftest import make_catalog
+
+ROWS = [
+    {'id': 2, 'name': 'Kelp Tonic', 'description': 'Seaweed extract.', 'price': '12.50', 'category': 'Soil Care',
+     'features': ['Organic'], 'updated': '2024-03-01T12:00:00Z'},
+    {'id': 1, 'name': 'Neem Spray', 'description': 'Pest control.', 'price': 9, 'category': 'Pest Control',
+     'features': ['Organic', 'Ready to Use'], 'updated': None},
+]
+
+MARCH_1 = 1709294400.0
+
+
+def _write_json(path, rows, mtime):
+    path.write_text(json.dumps(rows))
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def _write_sqlite(path, rows, mtime):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, description TEXT, price REAL, '
+                 'category TEXT, features TEXT, updated TEXT)')
+    conn.executemany('INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?)', [
+        (row['id'], row['name'], row['description'], row['price'], row['category'], json.dumps(row['features']),
+         row['updated']) for row in rows])
+    conn.commit()
+    conn.close()
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+@pytest.mark.parametrize('write, name', ((_write_json, 'products.json'), (_write_sqlite, 'products.db')))
+def test_load_catalog(tmp_path, write, name):
+    loaded = load_catalog(write(tmp_path / name, ROWS, 1700000000))
+    assert [product.id for product in loaded.products] == [1, 2]
+    neem, kelp = loaded.products
+    assert kelp.price == 12.5
+    assert kelp.updated == MARCH_1
+    assert neem.features == ('Organic', 'Ready to Use')
+    # No `updated`: the file's mtime on a first load
+    assert neem.updated == 1700000000
+    assert loaded.last_modified == MARCH_1
+
+
+@pytest.mark.parametrize('write, name', ((_write_json, 'products.json'), (_write_sqlite, 'products.db')))
+def test_unchanged_products_keep_their_timestamp(tmp_path, write, name):
+    rows = [dict(row, id=i, updated=None) for i, row in enumerate(ROWS * 2, 1)]
+    first = load_catalog(write(tmp_path / name, rows, 1700000000))
+
+    rows[2]['price'] = 99
+    (tmp_path / name).unlink()
+    second = load_catalog(write(tmp_path / name, rows, 1800000000), previous=first)
+    assert [product.updated for product in second.products] == [1700000000, 1700000000, 1800000000, 1700000000]
+    assert [product.id for product in second.products if product != first.get(product.id)] == [3]
+
+
+def test_reload_changes_only_edited_products(tmp_path, small_catalog):
+    seen = []
+    catalog.on_change(lambda old, new: seen.append({p.id for p in new.products if p != old.get(p.id)}))
+    try:
+        rows = [dict(row, updated=None) for row in ROWS]
+        path = _write_json(tmp_path / 'products.json', rows, 1700000000)
+        catalog.reload_catalog(path)
+        rows[0]['name'] = 'Kelp Tonic Plus'
+        _write_json(tmp_path / 'products.json', rows, 1800000000)
+        catalog.reload_catalog(path)
+    finally:
+        catalog._listeners.pop()
+    assert seen[1] == {2}
+
+
+def test_indexes():
+    products = make_catalog(10)
+    assert products.get(3).name == 'Product 3'
+    assert products.get(11) is None
+    assert [c.slug for c in products.categories] == ['fertilizers', 'soil-care']
+    assert [p.id for p in products.by_category['fertilizers']] == [2, 4, 6, 8, 10]
+    assert all(p.category == 'Soil Care' for p in products.by_category['soil-care'])
+
+
+@pytest.mark.parametrize('category, page, expected_page, ids, pages', (
+    (None, 1, 1, [1, 2, 3, 4], 3),
+    (None, 3, 3, [9, 10], 3),
+    (None, 0, 1, [1, 2, 3, 4], 3),
+    (None, 99, 3, [9, 10], 3),
+    ('soil-care', 2, 2, [9], 2),
+    ('no-such-category', 5, 1, [], 1),
+))
+def test_page_bounds(category, page, expected_page, ids, pages):
+    listing = make_catalog(10).page(category, page, per_page=4)
+    assert listing.page == expected_page
+    assert [p.id for p in listing.items] == ids
+    assert listing.pages == pages
+    assert listing.total == (10 if category is None else len(make_catalog(10).by_category.get(category, ())))
+
+
+def test_empty_catalog_has_one_empty_page():
+    listing = Catalog([]).page()
+    assert (listing.items, listing.total, listing.pages, listing.page) == ((), 0, 1, 1)
+
+
+def test_product_detail(client, small_catalog):
+    response = client.get('/products/7')
+    assert response.status_code == 200
+    assert b'Product 7' in response.data
+    assert client.get('/products/9999').status_code == 404
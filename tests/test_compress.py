@@ -0,0 +1,21 @@
+import gzip
+
+import compress
+
+
+def test_error_pages_are_compressed_and_cached(client):
+    response = client.get('/no-such-page', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 404
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'</html>' in gzip.decompress(response.data)
+
+    hits = compress.stats()['gzip']['cache_hits']
+    client.get('/another-missing-page', headers={'Accept-Encoding': 'gzip'})
+    assert compress.stats()['gzip']['cache_hits'] == hits + 1
+
+
+def test_not_modified_is_not_compressed(client):
+    etag = client.get('/about').headers['ETag']
+    response = client.get('/about', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert 'Content-Encoding' not in response.headers
@@ -0,0 +1,34 @@
+import json
+import os
+
+import app as app_module
+import freeze
+
+
+def _freeze(app, out_dir):
+    return freeze.freeze(app, app_module.asset_manifest, str(out_dir), jobs=1,
+                         catalog_keys=app_module.CATALOG_SURROGATE_KEYS)
+
+
+def test_sitemaps_depend_on_lastmod_templates(app, small_catalog, tmp_path, monkeypatch):
+    stats = _freeze(app, tmp_path)
+    assert not stats['errors']
+    with open(os.path.join(tmp_path, freeze.MANIFEST_NAME)) as f:
+        pages = json.load(f)['pages']
+    for url in ('/sitemap.xml', '/sitemap-1.xml.gz', '/sitemap_index.xml'):
+        assert {'base.html', 'about.html', 'privacy_policy.html'} <= set(pages[url]['templates'])
+
+    # Editing a page template re-renders the sitemaps with it, not only the page
+    dependencies = freeze.template_dependencies
+
+    def edited(env):
+        digests, closure = dependencies(env)
+        return {**digests, 'privacy_policy.html': 'edited'}, closure
+
+    monkeypatch.setattr(freeze, 'template_dependencies', edited)
+    rendered = []
+    render_all = freeze._render_all
+    monkeypatch.setattr(freeze, '_render_all', lambda urls, jobs: rendered.extend(urls) or render_all(urls, jobs))
+    _freeze(app, tmp_path)
+    assert {'/privacy-policy', '/sitemap.xml', '/sitemap-1.xml', '/sitemap_index.xml.gz'} <= set(rendered)
+    assert '/about' not in rendered
@@ -0,0 +1,53 @@
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from flask import Flask
+
+from images import ImageService
+
+PIL = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def service(tmp_path):
+    static = tmp_path / 'static'
+    (static / 'images').mkdir(parents=True)
+    PIL.new('RGB', (800, 400), (40, 120, 40)).save(static / 'images' / 'field.jpg')
+    service = ImageService(str(static), str(tmp_path / 'cache'), max_workers=1)
+    yield service
+    state = service._state.peek()
+    if state is not None and state.pool is not None:
+        state.pool.shutdown()
+
+
+@pytest.fixture
+def client(service):
+    app = Flask(__name__)
+    service.init_app(app)
+    return app.test_client()
+
+
+def test_other_widths_redirect_to_a_bucket(client):
+    response = client.get('/img/500/images/field.jpg?fm=webp')
+    assert response.status_code == 301
+    assert response.headers['Location'] == '/img/640/images/field.jpg?fm=webp'
+    assert client.get('/img/5000/images/field.jpg').headers['Location'] == '/img/1920/images/field.jpg'
+    assert client.get('/img/500/images/missing.jpg').status_code == 404
+
+
+def test_broken_pool_is_replaced(service):
+    class BrokenPool:
+        shut_down = False
+
+        def submit(self, *args):
+            raise BrokenProcessPool('a child process terminated abruptly')
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shut_down = True
+
+    broken = service._state.get().pool = BrokenPool()
+    path = service.derivative(service.source('images/field.jpg')[0], 320, 'jpeg')
+    assert broken.shut_down
+    assert service._state.get().pool is not broken
+    with PIL.open(path) as image:
+        assert image.width == 320
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+import import_budget  # noqa: E402
+
+
+def test_startup_skips_deferred_modules():
+    process = subprocess.run(
+        [sys.executable, '-c', 'import sys, app; print("\\n".join(sys.modules))'],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    loaded = {name.split('.')[0] for name in process.stdout.split()}
+    assert loaded.isdisjoint(import_budget.DEFERRED), sorted(loaded & set(import_budget.DEFERRED))
+
+
+def test_import_within_budget():
+    # Best of several fresh interpreters: noise only ever adds time
+    import_budget.measure('app')
+    own = min(import_budget.measure('app')[0] for _ in range(5)) - min(
+        import_budget.measure(import_budget.FRAMEWORK)[0] for _ in range(5))
+    assert own / 1000 <= import_budget.DEFAULT_BUDGET_MS
@@ -0,0 +1,23 @@
+from lru import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+
+def test_bounded_by_sizeof():
+    cache = LRUCache(10, sizeof=len)
+    cache.set('a', b'12345')
+    cache.set('b', b'1234')
+    cache.set('a', b'123')  # replacing an entry re-weighs it
+    assert cache.size == 7
+    cache.set('c', b'123456')
+    assert cache.get('b') is None and cache.size == 9
+    assert cache.discard_where(lambda key, value: key == 'c') == 1
+    assert cache.size == 3 and len(cache) == 1
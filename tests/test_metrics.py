@@ -0,0 +1,88 @@
+import os
+import time
+
+import pytest
+from flask import Flask, render_template_string
+
+import metrics
+
+
+@pytest.fixture
+def timed_app(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, 'TIMING', True)
+    monkeypatch.setattr(metrics, 'SERVER_TIMING', True)
+    monkeypatch.setattr(metrics, 'ENABLED', True)
+    monkeypatch.setattr(metrics, 'store', metrics.MetricsStore(str(tmp_path)))
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.after_request
+    def after(response):
+        with metrics.phase('after_request'):
+            time.sleep(0.01)
+            with metrics.phase('compress'):
+                time.sleep(0.02)
+        return response
+
+    @app.route('/page')
+    def page():
+        with metrics.phase('seo'):
+            time.sleep(0.01)
+        return render_template_string('{{ wait() }}', wait=lambda: time.sleep(0.01) or '')
+
+    return app
+
+
+def _timings(response):
+    timings = {}
+    for item in response.headers['Server-Timing'].split(', '):
+        name, duration = item.split(';dur=')
+        timings[name] = float(duration)
+    return timings
+
+
+def test_nested_phases_do_not_overlap(timed_app):
+    timings = _timings(timed_app.test_client().get('/page'))
+    assert timings['compress'] >= 20
+    # after_request is charged only its own 10 ms, not compress's 20 ms as well
+    assert 10 <= timings['after_request'] < 20
+    assert timings['render'] >= 10
+    phases = sum(duration for name, duration in timings.items() if name != 'total')
+    assert phases <= timings['total']
+
+
+def test_metrics_needs_token(timed_app, monkeypatch):
+    client = timed_app.test_client()
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+    assert client.get('/metrics').status_code == 404
+    monkeypatch.setenv('METRICS_TOKEN', 'scrape')
+    assert client.get('/metrics').status_code == 403
+    client.get('/page')
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape'})
+    assert response.status_code == 200
+    assert 'greenfarm_phase_seconds_total{route="page",phase="compress"}' in response.get_data(as_text=True)
+
+
+def test_exited_workers_fold_into_totals(tmp_path):
+    store = metrics.MetricsStore(str(tmp_path))
+    pids = []
+    for status in (200, 404, 200):
+        pid = os.fork()
+        if pid == 0:
+            # A worker: count one request, flush and exit
+            store.observe('page', status, 0.002, 100, {})
+            store.flush()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        pids.append(pid)
+    before = metrics.MetricsStore(str(tmp_path)).collect()
+    assert before['status'] == {'page': {'200': 2, '404': 1}}
+
+    for pid in pids:
+        assert store.retire(pid)
+    assert not store.retire(pids[0])
+    assert sorted(os.listdir(tmp_path)) == ['.totals.lock', metrics.TOTALS_FILE]
+    assert metrics.MetricsStore(str(tmp_path)).collect() == before
+
+    store.reset()
+    assert metrics.MetricsStore(str(tmp_path)).collect()['status'] == {}
@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import cache_policy
+import page_cache
+from templating import fragment_cache
+
+
+def test_cached_page_revalidates_with_304(client):
+    first = client.get('/about')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    hits = page_cache.page_cache.hits
+
+    second = client.get('/about', headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b''
+    assert page_cache.page_cache.hits == hits + 1
+
+
+def test_compressed_etag_still_revalidates(client):
+    first = client.get('/about', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert client.get('/about', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+
+@pytest.mark.parametrize('path', ('/static/css/base.css', '/static/css/style.css'))
+def test_compressed_static_etag_still_revalidates(client, path):
+    first = client.get(path, headers={'Accept-Encoding': 'gzip'})
+    assert first.status_code == 200
+    assert first.headers['Content-Encoding'] == 'gzip'
+    etag = first.headers['ETag']
+    assert etag.endswith('-gzip"')
+    revalidated = client.get(path, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag,
+                                            'If-Modified-Since': first.headers['Last-Modified']})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert 'Content-Encoding' not in revalidated.headers
+    # Another representation's tag does not match
+    assert client.get(path, headers={'Accept-Encoding': 'deflate', 'If-None-Match': etag}).status_code == 200
+
+
+def test_surrogate_key_purge_drops_tagged_pages(client):
+    client.get('/about')
+    client.get('/products')
+    assert page_cache.page_cache.stats()['entries'] == 2
+
+    cache_policy.purge('pages')
+    assert page_cache.page_cache.stats()['entries'] == 1
+
+    misses = page_cache.page_cache.misses
+    assert client.get('/about').status_code == 200
+    assert page_cache.page_cache.misses == misses + 1
+
+
+def test_purge_in_another_process_reaches_this_one(client):
+    client.get('/about')
+    assert page_cache.page_cache.stats()['entries'] == 1
+
+    # Another worker handles POST /admin/purge
+    subprocess.run([sys.executable, '-c', 'import sys, cache_policy; '
+                    'cache_policy.share_purges(sys.argv[1]); cache_policy.purge("pages", "nav")',
+                    os.environ['PURGE_STATE_PATH']], check=True, cwd=os.path.dirname(cache_policy.__file__))
+
+    misses, fragment_misses = page_cache.page_cache.misses, fragment_cache.misses
+    assert client.get('/about').status_code == 200
+    assert page_cache.page_cache.misses == misses + 1
+    # The nav fragment was re-rendered too
+    assert fragment_cache.misses > fragment_misses
+
+
+def test_invalidate_by_endpoint(client):
+    client.get('/about')
+    assert page_cache.invalidate('about') == 1
+    assert page_cache.invalidate('about') == 0
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from process_local import ProcessLocal
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_child_builds_its_own_value():
+    local = ProcessLocal(lambda: {'pid': os.getpid()})
+    parent = local.get()
+    assert local.get() is parent
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        ok = local.peek() is None and local.get()['pid'] == os.getpid() and local.get() is not parent
+        os.write(write, b'1' if ok else b'0')
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b'1'
+    assert local.get() is parent
+
+
+def test_reset_rebuilds():
+    built = []
+    local = ProcessLocal(lambda: built.append(1) or len(built))
+    assert local.peek() is None
+    assert local.get() == 1
+    local.reset()
+    assert local.get() == 2
@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+import app as app_module
+from quotes import QuoteStore, Ticket
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = QuoteStore(path=str(tmp_path / 'quotes.db'))
+    yield store
+    store.close()
+
+
+def test_unserializable_payload_fails_alone(store):
+    bad = store.submit('quote', {'name': object()})
+    good = store.submit('quote', {'name': 'Ada'})
+    with pytest.raises(TypeError):
+        bad.wait()
+    assert good.wait().startswith('QT-')
+    assert store.submit('quote', {'name': 'Grace'}).wait().startswith('QT-')
+
+
+def test_unexpected_commit_error_fails_batch_and_writer_survives(store, monkeypatch):
+    commit = store._commit
+
+    def failing_commit(conn, tickets):
+        monkeypatch.setattr(store, '_commit', commit)
+        commit(_FailingInserts(conn), tickets)
+
+    monkeypatch.setattr(store, '_commit', failing_commit)
+    with pytest.raises(RuntimeError):
+        store.submit('quote', {'name': 'Ada'}).wait()
+    assert store._thread.is_alive()
+    assert store.submit('quote', {'name': 'Ada'}).wait().startswith('QT-')
+
+
+def test_writer_restart_keeps_queued_tickets(store):
+    store.submit('quote', {'name': 'Ada'}).wait()
+    # Stop the writer, then queue a ticket before the next submit restarts it
+    queued = store._queue.get()
+    queued.put(None)
+    store._thread.join(5)
+    stranded = Ticket('quote', {'name': 'Grace'})
+    queued.put_nowait(stranded)
+    assert store.submit('quote', {'name': 'Linus'}).wait().startswith('QT-')
+    assert store._queue.get() is queued
+    assert stranded.wait().startswith('QT-')
+
+
+def test_contact_store_error_keeps_form(client, app, monkeypatch):
+    class Failed:
+        def wait(self):
+            raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setitem(app.config, 'WTF_CSRF_ENABLED', False)
+    monkeypatch.setattr(app_module.quote_store, 'submit', lambda kind, payload: Failed())
+    response = client.post('/contact', data={
+        'name': 'Ada Lovelace', 'email': 'ada@example.com', 'phone': '5551234567',
+        'subject': 'general', 'message': 'Please call me back.',
+    })
+    assert response.status_code == 500
+    body = response.get_data(as_text=True)
+    assert 'An error occurred' in body
+    assert 'Please call me back.' in body
+
+
+class _FailingInserts:
+    """A connection whose INSERTs raise something other than sqlite3.Error"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, sql, *args):
+        if sql.startswith('INSERT'):
+            raise RuntimeError('unexpected failure')
+        return self._conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
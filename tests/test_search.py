@@ -0,0 +1,137 @@
+import math
+import random
+
+import pytest
+
+import search
+from catalog import Catalog, Product, slugify
+from search import SearchIndex
+
+WORDS = ('organic', 'neem', 'kelp', 'humic', 'spray', 'seed', 'seeds', 'fertilizer', 'fertilizers', 'mulch',
+         'granular', 'granules', 'drip', 'tonic')
+CATEGORIES = ('Fertilizers', 'Soil Care', 'Pest Control')
+
+QUERIES = ('organic', 'gran', 'fertilzer', 'neem spray', 'organic fertilizer', 'kelp seed drip', 'seed 17',
+           'humic humic', 'nothing', 'organic nothing')
+
+
+def _catalog(count, seed=7, start=1):
+    """Few words and short texts, so many products tie on score"""
+    rng = random.Random(seed)
+    return Catalog([
+        Product(id=i, name=' '.join(rng.sample(WORDS, 2)) + f' {i}', description=' '.join(rng.sample(WORDS, 3)),
+                price=1.0, category=rng.choice(CATEGORIES), features=tuple(rng.sample(WORDS, 1)), updated=0.0)
+        for i in range(start, start + count)
+    ])
+
+
+def _reference(index, products, query, category=None, page=1, per_page=5):
+    """(ids on the page, total, facets) by scoring every product against every token"""
+    snapshot = index._snapshot
+    n, avg_len = snapshot.n, snapshot.avg_len
+    freqs = {product.id: search._term_freqs(product) for product in products}
+    df = {}
+    for tf, _ in freqs.values():
+        for term in tf:
+            df[term] = df.get(term, 0) + 1
+    tokens = search.tokenize(query)
+    scored = []
+    for product in products:
+        tf, length = freqs[product.id]
+        total = 0.0
+        for i, token in enumerate(tokens):
+            best = None
+            for term, weight in index.expand(token, i == len(tokens) - 1).items():
+                if term in tf:
+                    idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                    saturated = tf[term] * (search.K1 + 1) / (
+                        tf[term] + search.K1 * (1 - search.B + search.B * length / avg_len))
+                    score = weight * idf * saturated
+                    best = score if best is None or score > best else best
+            if best is None:
+                break
+            total += best
+        else:
+            scored.append((-total, product.id, slugify(product.category)))
+    counts = {}
+    for _, _, slug in scored:
+        counts[slug] = counts.get(slug, 0) + 1
+    facets = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    ranked = [doc for _, doc, slug in sorted(scored) if not category or slug == category]
+    page = min(page, max(1, -(-len(ranked) // per_page)))
+    return ranked[(page - 1) * per_page:page * per_page], len(ranked), facets
+
+
+def _check(index, products, query, category=None, page=1, per_page=5):
+    result = index.search(query, category, page, per_page)
+    ids, total, facets = _reference(index, products, query, category, page, per_page)
+    assert [product.id for product in result.items] == ids, query
+    assert result.total == total, query
+    assert [(slug, count) for slug, _, count in result.facets] == facets, query
+
+
+@pytest.fixture(params=(1, search.BITMAP_MIN_DOCS), ids=('bitmaps', 'sparse'))
+def bitmap_min_docs(request, monkeypatch):
+    """Every posting keeps a bitmap, or (in these small catalogs) nearly none does"""
+    monkeypatch.setattr(search, 'BITMAP_MIN_DOCS', request.param)
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_matches_brute_force(query, bitmap_min_docs):
+    catalog = _catalog(600)
+    index = SearchIndex(catalog.products)
+    for page in (1, 3):
+        _check(index, catalog.products, query, page=page)
+    _check(index, catalog.products, query, category='soil-care')
+    _check(index, catalog.products, query, per_page=200)
+
+
+def test_incremental_update_matches_brute_force(bitmap_min_docs):
+    old = _catalog(600)
+    index = SearchIndex(old.products)
+    rng = random.Random(11)
+    products = [product._replace(name=f'{product.name} kelp') if rng.random() < 0.03 else product
+                for product in old.products if product.id % 97]
+    products.extend(_catalog(10, seed=12, start=1000).products)
+    new = Catalog(products)
+    index.update(old, new)
+    assert index._snapshot.n == len(old)  # patched: scores keep the build's document count
+    for query in QUERIES:
+        _check(index, new.products, query)
+        _check(index, new.products, query, category='pest-control', page=2)
+
+
+def test_large_update_rebuilds():
+    old = _catalog(600)
+    index = SearchIndex(old.products)
+    new = Catalog(old.products[:400])
+    index.update(old, new)
+    assert index._snapshot.n == 400
+    _check(index, new.products, 'organic fertilizer')
+
+
+def test_update_swaps_snapshots():
+    old = _catalog(100)
+    index = SearchIndex(old.products)
+    before = index._snapshot
+    first = before.search('kelp', None, 1, 100)
+    index.update(old, Catalog([product for product in old.products if product.id != first.items[0].id]))
+    assert before.search('kelp', None, 1, 100) == first
+    assert index.search('kelp', per_page=100).total == first.total - 1
+
+
+def test_expansions():
+    index = SearchIndex(_catalog(50).products)
+    assert index.expand('gran', True) == {'granular': search.PREFIX_WEIGHT, 'granules': search.PREFIX_WEIGHT}
+    assert index.expand('gran', False) == {}
+    assert index.expand('fertilzer', False) == {'fertilizer': search.FUZZY_WEIGHT}
+    assert index.expand('seed', True) == {'seed': 1.0, 'seeds': search.PREFIX_WEIGHT}
+
+
+def test_long_queries_are_cut():
+    index = SearchIndex(_catalog(200).products)
+    typed = ['organic'] * (search.MAX_QUERY_TOKENS - 1) + ['gran']
+    assert index.search(' '.join(typed)).total > 0
+    # Past the token limit the query is cut, and a cut token is not a prefix
+    assert index.search(' '.join(typed + ['kelp'])).total == 0
+    assert index.search(' '.join(typed + ['kelp']) + ' x' * 500).query.startswith('organic')
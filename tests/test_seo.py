@@ -0,0 +1,26 @@
+import catalog
+import seo
+from conftest import make_catalog
+
+
+def test_page_seo_answers_from_new_catalog_before_recompile(small_catalog, monkeypatch, client):
+    # Simulate the window between the catalog swap and the recompile listener
+    monkeypatch.setattr(catalog, '_listeners', [])
+    compiled = seo.get_compiled()
+    catalog.set_catalog(make_catalog(120))
+    assert seo.get_compiled() is compiled
+
+    page = seo.page_seo(('product_detail', 99))
+    assert page is not None and 'Product 99' in page.seo['title']
+    assert seo.page_seo(('products', None, 5)) is not None
+    assert seo.page_seo(('product_detail', 500)) is None
+    assert seo.schema_payload(('products', None, 5)).startswith(b'{')
+
+    assert client.get('/products/99').status_code == 200
+    assert client.get('/products?page=5').status_code == 200
+
+
+def test_page_seo_uses_compiled_payloads_for_live_catalog(small_catalog):
+    compiled = seo.get_compiled()
+    assert compiled.catalog is small_catalog
+    assert seo.page_seo(('product_detail', 1)) is compiled.pages[('product_detail', 1)]
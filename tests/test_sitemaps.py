@@ -0,0 +1,29 @@
+import gzip
+
+from seo import SEO_CONFIG
+
+
+def test_sitemap_locs_use_canonical_host_whatever_the_host_header(client, small_catalog):
+    body = client.get('/sitemap-1.xml', base_url='http://evil.example"<x>').get_data(as_text=True)
+    assert 'evil.example' not in body
+    assert f'<loc>{SEO_CONFIG["site_url"]}/products/1</loc>' in body
+
+
+def test_gzipped_sitemaps_are_cached_once_per_file(client, small_catalog, app):
+    import app as app_module
+    for host in ('http://a.example', 'http://b.example', 'http://c.example'):
+        response = client.get('/sitemap-1.xml.gz', base_url=host)
+        assert 'a.example' not in gzip.decompress(response.data).decode()
+    with app.test_request_context():
+        assert list(app_module._sitemaps()._gzipped) == ['1.xml.gz']
+
+
+def test_index_points_at_gzipped_children(client, small_catalog):
+    for path in ('/sitemap.xml', '/sitemap_index.xml', '/sitemap_index.xml.gz'):
+        body = client.get(path).data
+        if path.endswith('.gz'):
+            body = gzip.decompress(body)
+        assert f'<loc>{SEO_CONFIG["site_url"]}/sitemap-1.xml.gz</loc>'.encode() in body
+    child = client.get('/sitemap-1.xml.gz')
+    assert child.mimetype == 'application/gzip'
+    assert gzip.decompress(child.data) == client.get('/sitemap-1.xml').data
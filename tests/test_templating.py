@@ -0,0 +1,100 @@
+import os
+
+import pytest
+from flask import Flask
+from jinja2 import DictLoader, Environment
+
+import cache_policy
+import templating
+from templating import FragmentCacheExtension, fragment_cache, minify
+
+FRAGMENT = "{% cache 'nav', section %}<nav>{{ render(section) }}</nav>{% endcache %}"
+
+
+@pytest.fixture
+def renders():
+    """Sections the fragment body rendered, in order"""
+    fragment_cache.clear()
+    yield []
+    fragment_cache.clear()
+
+
+def _env(auto_reload=False):
+    return Environment(loader=DictLoader({'page.html': FRAGMENT}), extensions=[FragmentCacheExtension],
+                       auto_reload=auto_reload)
+
+
+def _render(env, renders, section):
+    return env.get_template('page.html').render(section=section, render=lambda s: renders.append(s) or s)
+
+
+def test_fragment_renders_once_per_key(renders):
+    env = _env()
+    assert _render(env, renders, 'shop') == '<nav>shop</nav>'
+    assert _render(env, renders, 'shop') == '<nav>shop</nav>'
+    assert _render(env, renders, 'blog') == '<nav>blog</nav>'
+    assert renders == ['shop', 'blog']
+    assert fragment_cache.get(('nav', 'shop')) == '<nav>shop</nav>'
+
+
+def test_surrogate_key_purge_drops_fragment(renders):
+    env = _env()
+    _render(env, renders, 'shop')
+    cache_policy.purge('footer')
+    _render(env, renders, 'shop')
+    assert renders == ['shop']
+    cache_policy.purge('nav')
+    _render(env, renders, 'shop')
+    assert renders == ['shop', 'shop']
+
+
+def test_auto_reload_bypasses_cache(renders):
+    env = _env(auto_reload=True)
+    _render(env, renders, 'shop')
+    _render(env, renders, 'shop')
+    assert renders == ['shop', 'shop']
+    assert len(fragment_cache) == 0
+
+
+def test_minify_collapses_whitespace_and_drops_comments():
+    assert minify('<div>\n    <p>a   b</p>  <!-- note -->\n</div>') == '<div>\n<p>a b</p> \n</div>'
+    assert minify('<!--[if IE]><p>old</p><![endif]-->') == '<!--[if IE]><p>old</p><![endif]-->'
+    assert minify('<!-- {{ debug }} -->') == '<!-- {{ debug }} -->'
+
+
+@pytest.mark.parametrize('block', (
+    '<pre>\n  indented\n    code  </pre>',
+    '<script>\n  if (a  <  b) {\n    go();  // keep\n  }\n</script>',
+    '<textarea name="m">\n  line one\n\n  line two</textarea>',
+    '<style>\n  a  { color: red; }\n</style>',
+))
+def test_minify_keeps_whitespace_sensitive_blocks(block):
+    assert minify(f'<div>  {block}  </div>') == f'<div> {block} </div>'
+
+
+def test_minify_keeps_jinja_tags_verbatim():
+    source = "<p>  {{ 'a   b' ~ name }}  {% if x  ==  'c   d' %}y{% endif %}  {# two   spaces #}</p>"
+    assert minify(source) == "<p> {{ 'a   b' ~ name }} {% if x  ==  'c   d' %}y{% endif %} {# two   spaces #}</p>"
+
+
+def test_second_configure_loads_templates_from_bytecode_cache(tmp_path):
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    (templates / 'hello.html').write_text('<p>\n    Hello   {{ name }}\n</p>')
+    cache_dir = tmp_path / 'jinja_cache'
+
+    def configured():
+        app = Flask(__name__, template_folder=str(templates))
+        templating.configure(app, cache_dir=str(cache_dir))
+        return app
+
+    assert configured().jinja_env.get_template('hello.html').render(name='Ada') == '<p>\nHello Ada\n</p>'
+    assert os.listdir(cache_dir)
+
+    env = configured().jinja_env
+
+    def compile_again(*args, **kwargs):
+        raise AssertionError('template compiled instead of loaded from the bytecode cache')
+
+    env.compile = compile_again
+    assert env.get_template('hello.html').render(name='Ada') == '<p>\nHello Ada\n</p>'
@@ -0,0 +1,29 @@
+import json
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Importing wsgi warms the caches and freezes the heap, so it runs in its own interpreter
+REPORT = '''
+import gc, json, wsgi
+print(json.dumps({
+    'stats': wsgi.stats,
+    'paths': wsgi.warm_paths(wsgi.app, wsgi.get_catalog()),
+    'frozen': gc.get_freeze_count(),
+    'again': wsgi.warm(wsgi.app)['failed'],
+}))
+'''
+
+
+def test_import_warms_every_route_and_freezes_the_heap():
+    process = subprocess.run([sys.executable, '-c', REPORT], cwd=ROOT, capture_output=True, text=True, check=True)
+    report = json.loads(process.stdout.splitlines()[-1])
+    assert report['stats']['failed'] == []
+    assert report['again'] == []
+    assert any(path.startswith('/products?category=') for path in report['paths'])
+    assert any(path.startswith('/sitemap-') for path in report['paths'])
+    # Every path but the sitemaps and robots.txt is page-cached
+    assert report['stats']['pages'] >= len([path for path in report['paths']
+                                            if 'sitemap' not in path and path != '/robots.txt'])
+    assert report['frozen'] > 0
@@ -0,0 +1,88 @@
+"""Production entry point: `gunicorn wsgi:app`, with settings from gunicorn.conf.py.
+
+Importing this module does the work workers would otherwise repeat on their
+first requests. It loads the catalog, compiles the SEO payloads and the search
+index, builds the sitemaps, and renders and compresses the hot pages into the
+page cache. With preload_app the gunicorn master imports it once and every
+forked worker shares those objects copy-on-write.
+"""
+import gc
+import logging
+import time
+
+from flask import url_for
+
+import bulk  # noqa: F401  app.py loads it on the first bulk request; preloaded, workers share it
+import forms
+import metrics
+import page_cache
+from app import app
+from catalog import get_catalog
+from search import get_index as get_search_index
+from seo import SEO_CONFIG, get_compiled
+from sitemaps import STATIC_PAGES, get_sitemaps
+
+logger = logging.getLogger('gunicorn.error')
+
+# Pages rendered before fork; product listings add every category's first page
+WARM_PATHS = ('/', '/about', '/products', '/privacy-policy', '/terms-of-service', '/robots.txt',
+              '/api/schema/organization', '/api/schema/products', '/sitemap.xml', '/sitemap_index.xml.gz')
+
+# Identity, plus what browsers send, so the compressed variant they negotiate is cached too
+WARM_ENCODINGS = ('identity', 'gzip, deflate, br, zstd')
+
+
+def warm_paths(app, catalog):
+    paths = list(WARM_PATHS)
+    paths.extend(f'/products?category={category.slug}' for category in catalog.categories)
+    with app.test_request_context():
+        sitemaps = get_sitemaps(catalog, {page.endpoint: url_for(page.endpoint) for page in STATIC_PAGES})
+    paths.extend(f'/sitemap-{number}.xml.gz' for number in range(1, sitemaps.count + 1))
+    return paths
+
+
+def warm(app):
+    """Build every shared structure and prime the page cache; returns stats for the log"""
+    start = time.perf_counter()
+    catalog = get_catalog()
+    get_compiled()
+    get_search_index()
+    # app.py defers the form stack for cold starts; a preloading master shares it instead
+    forms.preload()
+
+    client = app.test_client()
+    base_url = SEO_CONFIG['site_url']
+    failed = []
+    for path in warm_paths(app, catalog):
+        for accept_encoding in WARM_ENCODINGS:
+            response = client.get(path, base_url=base_url, headers={'Accept-Encoding': accept_encoding})
+            response.close()
+            if response.status_code != 200:
+                failed.append(path)
+                break
+
+    # Warm-up requests are not traffic
+    metrics.store.discard()
+    return {
+        'pages': page_cache.page_cache.stats()['entries'],
+        'failed': failed,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def freeze_heap():
+    """Move everything allocated so far out of the collector's reach.
+
+    A collection writes to every tracked object's header, which would copy the
+    shared pages into each worker; frozen objects are never scanned.
+    """
+    gc.collect()
+    gc.freeze()
+    return gc.get_freeze_count()
+
+
+stats = warm(app)
+logger.info('warmed %d cached pages in %.2fs', stats['pages'], stats['seconds'])
+for path in stats['failed']:
+    logger.warning('warm-up request failed: %s', path)
+freeze_heap()